@@ -7,6 +7,28 @@ from socket import AF_INET, SOCK_STREAM, socket
 from openai import OpenAI
 from rich.logging import RichHandler
 
+from mnk_bits import TIC_TAC_TOE
+from metrics import PORT, registry
+from move_cache import MoveCache
+from protocol import (
+    GAME_OVER,
+    Frame,
+    FrameDecoder,
+    Kind,
+    LineDecoder,
+    State,
+    Status,
+    decode_board,
+    decode_seat,
+    decode_state,
+    encode_move,
+    encode_text,
+    greet,
+    make_state,
+)
+from render import symbol
+from speculation import Speculator
+
 level = logging.DEBUG
 
 logging.basicConfig(
@@ -28,11 +50,32 @@ class Message:
     msg: str
     recieved: datetime
     action: str | None = None
+    boards: list | None = None
+    turn: int | None = None
+    legal: list | None = None
+    status: Status | None = None
 
     @classmethod
     def from_bytes(cls, msg: bytes):
         return cls(msg=msg.decode(), recieved=datetime.now())
 
+    @classmethod
+    def from_board(cls, text: bytes, boards: list, turn: int):
+        return cls.from_state(text, make_state(boards, turn, Status.PLAYING))
+
+    @classmethod
+    def from_state(cls, text: bytes, state: State):
+        # Put the board back into words for the model
+        msg = f"{text.decode()}Current board:\n{TIC_TAC_TOE.render(state.boards)}\n"
+        return cls(
+            msg=msg,
+            recieved=datetime.now(),
+            boards=state.boards,
+            turn=state.turn,
+            legal=state.moves(),
+            status=state.status,
+        )
+
     def __str__(self):
         return self.msg
 
@@ -43,11 +86,26 @@ class Bot:
     conn: socket
     name: str = "Boty McBotterson"
     messages: list = field(default_factory=list)
+    seat: int | None = None
+    cache: MoveCache | None = None
+    speculator: Speculator | None = None
     _model: str = "gpt-4"
+    _decoder: FrameDecoder | None = None
+    _board: State | None = None
 
-    def _ask_gpt(self, msg: Message) -> str | None:
-        answer = None
-        prompt = f"""
+    def _prompt(self, msg: Message) -> str:
+        if msg.boards is not None:
+            # We already know the board, no need to make the model read it
+            me = symbol(self.seat)
+            return (
+                f"You are {me} in tic tac toe, get 3 {me}'s in a row, column "
+                "or diagonal.\nPositions are 1 to 9 from top left to bottom "
+                f"right.\n{TIC_TAC_TOE.render(msg.boards)}\n"
+                f"Free positions: {', '.join(map(str, msg.legal))}\n"
+                "Respond with Action: <position>"
+            )
+
+        return f"""
                 Your name is: {self.name} and your a tic tac toe bot, you're playing at the letter a on the board
                 You've just been given the following message:
                 {msg.msg}
@@ -80,12 +138,9 @@ class Bot:
                   |   |
                 Action: 7
                 """
-        completion = self.gpt.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model=self._model,
-            # response_format={"type": "json_object"},
-        )
-        content = completion.choices[0].message.content
+
+    def _parse(self, content: str) -> str | None:
+        answer = None
         if content.startswith("Action:"):
             answer = content.split("Action:")[1].strip()
             if answer.lower() == "none":
@@ -93,10 +148,69 @@ class Bot:
 
         return answer
 
+    def _ask_gpt(self, msg: Message) -> str | None:
+        registry.inc("completions")
+        with registry.time("gpt"):
+            completion = self.gpt.chat.completions.create(
+                messages=[{"role": "user", "content": self._prompt(msg)}],
+                model=self._model,
+                # response_format={"type": "json_object"},
+            )
+        return self._parse(completion.choices[0].message.content)
+
+    @property
+    def binary(self) -> bool:
+        if self.seat is not None:
+            return True
+        return self._decoder is not None and not isinstance(self._decoder, LineDecoder)
+
+    def _my_turn(self, msg: Message) -> bool:
+        return msg.boards is not None and msg.turn == self.seat
+
+    def _legal(self, msg: Message, action: str | None) -> bool:
+        if msg.boards is None or not action or not action.isdigit():
+            return False
+        position = int(action)
+        taken = 0
+        for board in msg.boards:
+            taken |= board
+        return 1 <= position <= 9 and not taken >> (position - 1) & 1
+
+    def _without_model(self, msg: Message) -> tuple:
+        # The state often settles it, returns (decided, action)
+        if msg.boards is None:
+            # Every turn comes with a board once we're on the binary protocol,
+            # bare text is just news ("Invalid move by ...") then and never
+            # asks for a move
+            return self.binary, None
+        if msg.status != Status.PLAYING or not self._my_turn(msg):
+            return True, None
+        if len(msg.legal) == 1:
+            return True, str(msg.legal[0])
+        return False, None
+
     def decide_action(self) -> str | None:
         # We need to decide what to do with the message
-        logger.info(f"Received:\n{self.messages[-1]}\n")
-        action = self._ask_gpt(self.messages[-1])
+        msg = self.messages[-1]
+        logger.info(f"Received:\n{msg}\n")
+        decided, action = self._without_model(msg)
+        if decided:
+            return action
+
+        cacheable = self.cache is not None and self._my_turn(msg)
+        if cacheable and (position := self.cache.get(msg.boards, self.seat)):
+            logger.info(f"Cached move {position} {self.cache.stats()}")
+            return str(position)
+
+        action = None
+        if self.speculator is not None and self._my_turn(msg):
+            if future := self.speculator.take(tuple(msg.boards)):
+                action = future.result()
+                logger.info(f"Speculated move {action}")
+        if not self._legal(msg, action):
+            action = self._ask_gpt(msg)
+        if cacheable and self._legal(msg, action):
+            self.cache.put(msg.boards, self.seat, int(action))
 
         # if action:
         #     listen = input(
@@ -110,15 +224,88 @@ class Bot:
     def from_socket(cls, conn: socket, name: str, gpt: OpenAI):
         return cls(conn=conn, name=name, gpt=gpt)
 
+    def receive(self) -> Message | None:
+        # XXX: Blocks until we get a whole frame
+        while (frame := self._decoder.next_frame()) is None:
+            if not self._decoder.recv_into(self.conn):
+                raise ConnectionResetError("Server hung up")
+
+        return self._handle(frame)
+
+    def _handle(self, frame: Frame) -> Message | None:
+        kind, payload = frame
+        match kind:
+            case Kind.SEAT:
+                self.seat = decode_seat(payload)
+            case Kind.STATE:
+                # The turn announcement follows as text
+                self._board = decode_state(payload)
+            case Kind.BOARD:
+                boards, turn = decode_board(payload)
+                status = Status.OVER if turn == GAME_OVER else Status.PLAYING
+                self._board = make_state(boards, turn, status)
+            case Kind.TEXT if self._board is not None:
+                state, self._board = self._board, None
+                return Message.from_state(payload, state)
+            case Kind.TEXT:
+                return Message.from_bytes(payload)
+        return None
+
+    def send(self, action: str) -> None:
+        if action.isdigit():
+            self.conn.sendall(encode_move(int(action)))
+        else:
+            self.conn.sendall(encode_text(action))
+
     def play(self):
+        self._decoder = greet(self.conn, self.name)
         while True:
-            # XXX: Blocks until we get a message
-            msg = Message.from_bytes(self.conn.recv(1024))
+            msg = self.receive()
             if msg:
                 self.messages.append(msg)
-                action = self.decide_action()
+                with registry.time("decide"):
+                    action = self.decide_action()
                 if action:
-                    self.conn.send(action.encode())
+                    self.send(action)
+                self._think_ahead(msg, action)
+
+    def _think_ahead(self, msg: Message, action: str | None) -> None:
+        if self.speculator is None or not self._my_turn(msg):
+            return
+        if not self._legal(msg, action):
+            return
+        boards = list(msg.boards)
+        boards[self.seat] |= 1 << (int(action) - 1)
+        # That was the last move, there's nothing coming to think about
+        if TIC_TAC_TOE.won(boards[self.seat]) or TIC_TAC_TOE.cat(boards):
+            return
+        self._speculate(boards)
+
+    def _speculate(self, boards: list) -> None:
+        # Think about every reply the next player could make while they
+        # think about it themselves, that's only useful if we're up after them
+        opponent = (self.seat + 1) % len(boards)
+        if (opponent + 1) % len(boards) != self.seat:
+            return
+
+        taken = 0
+        for board in boards:
+            taken |= board
+        situations = {}
+        for position in range(1, 10):
+            mask = 1 << (position - 1)
+            if taken & mask:
+                continue
+            after = list(boards)
+            after[opponent] |= mask
+            if TIC_TAC_TOE.won(after[opponent]) or TIC_TAC_TOE.cat(after):
+                continue
+            if self.cache is not None and self.cache.contains(after, self.seat):
+                continue
+            text = f"{self.name}'s turn\n".encode()
+            situations[tuple(after)] = Message.from_board(text, after, self.seat)
+
+        self.speculator.speculate(situations)
 
 
 if __name__ == "__main__":
@@ -132,9 +319,17 @@ if __name__ == "__main__":
     organization = config["TTT"]["ORGANIZATION"]
     gpt = OpenAI(api_key=api_key, organization=organization)
 
+    # Next to the server's metrics, if it's on the same box
+    registry.serve(PORT + 1)
     client = socket(AF_INET, SOCK_STREAM)
     client.connect((host, port))
     bot = Bot.from_socket(client, name, gpt)
-    bot.play()
-
-    client.close()
+    bot.cache = MoveCache()
+    bot.speculator = Speculator(bot._ask_gpt, max_outstanding=4)
+    try:
+        bot.play()
+    finally:
+        logger.info(f"Move cache: {bot.cache.stats()}")
+        bot.speculator.close()
+        bot.cache.close()
+        client.close()
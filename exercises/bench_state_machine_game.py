@@ -0,0 +1,58 @@
+import logging
+from random import Random
+from string import ascii_lowercase
+from time import perf_counter
+from typing import List
+
+from state_machine_game import Action, Game, Message, Player
+
+
+def _words(n: int, rnd: Random) -> List[str]:
+    return ["".join(rnd.choices(ascii_lowercase, k=8)) for _ in range(n)]
+
+
+def benchmark(players: int, guesses: int, sample: int = 10_000) -> dict:
+    # Grow a game to `players` confirmed players and `guesses` distinct guesses,
+    # then time `sample` more of each kind of action on top of that
+    rnd = Random(0)
+    game = Game("supermarket").simulate()
+    next(game)
+    everybody = [Player(f"player {n}", tires=guesses) for n in range(players)]
+    for player in everybody:
+        game.send(Action(player, Message.REQUEST))
+        game.send(Action(player, Message.CONFIRM))
+    for word in _words(guesses, rnd):
+        game.send(
+            Action(rnd.choice(everybody), Message.GUESS.with_data({"word": word}))
+        )
+
+    timings = {}
+    newcomers = [Player(f"newcomer {n}") for n in range(sample)]
+    started = perf_counter()
+    for player in newcomers:
+        game.send(Action(player, Message.REQUEST))
+    timings["request"] = (perf_counter() - started) / sample
+
+    started = perf_counter()
+    for player in newcomers:
+        game.send(Action(player, Message.CONFIRM))
+    timings["confirm"] = (perf_counter() - started) / sample
+
+    # with_data hands back the shared GUESS member, so send each one right away
+    words = _words(sample, rnd)
+    started = perf_counter()
+    for player, word in zip(newcomers, words):
+        game.send(Action(player, Message.GUESS.with_data({"word": word})))
+    timings["guess"] = (perf_counter() - started) / sample
+    return timings
+
+
+if __name__ == "__main__":
+    logging.getLogger("state_machine_game").setLevel(logging.WARNING)
+    print(f"{'players':>8} {'guesses':>10}  request  confirm    guess (µs per action)")
+    for players, guesses in [(1_000, 10_000), (10_000, 100_000), (100_000, 1_000_000)]:
+        timings = benchmark(players, guesses)
+        print(
+            f"{players:>8,} {guesses:>10,} "
+            + " ".join(f"{timings[kind] * 1e6:8.2f}" for kind in timings)
+        )
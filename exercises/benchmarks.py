@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from random import Random
+from statistics import median
+from threading import Event, Thread
+from timeit import Timer
+from typing import Callable, Dict, List
+
+import tic_tac_toe_bits as bits
+from bench_state_machine_game import benchmark as state_machine_benchmark
+from protocol import Kind, State, Status, decode_seat, decode_state, encode_move, greet
+from render import render_board
+from socket_game_selectors import GuessServer
+from tic_tac_toe_bits_async import Lobby
+from tic_tac_toe_bits_sockets import Game, Player, Rules
+from word_game_server import WordGameServer
+
+# name -> function returning {benchmark name: seconds per operation samples}
+SUITE: Dict[str, Callable[[int], Dict[str, List[float]]]] = {}
+
+
+def register(fn):
+    SUITE[fn.__name__] = fn
+    return fn
+
+
+def _time(fn: Callable, repeat: int, ops: int = 1) -> List[float]:
+    # autorange picks a loop count that takes at least 0.2s
+    timer = Timer(fn)
+    number, _ = timer.autorange()
+    return [t / number / ops for t in timer.repeat(repeat, number)]
+
+
+def _boards(n: int = 1000) -> List[List[int]]:
+    # Random legal-ish positions, the same ones every run
+    rnd = Random(0)
+    boards = []
+    for _ in range(n):
+        free = list(range(1, 10))
+        rnd.shuffle(free)
+        board = [0, 0]
+        for turn, pos in enumerate(free[: rnd.randint(0, 9)]):
+            board[turn % 2] |= 1 << (pos - 1)
+        boards.append(board)
+    return boards
+
+
+@register
+def bitboards(repeat: int) -> Dict[str, List[float]]:
+    boards = _boards()
+    n = len(boards)
+    tuples = [tuple(b) for b in boards]
+    open_centre = [b for b in boards if not (b[0] | b[1]) & 16]
+    return {
+        "bits.won": _time(lambda: [bits.won(b[0]) for b in boards], repeat, n),
+        "bits.cat": _time(lambda: [bits.cat(b) for b in boards], repeat, n),
+        "bits.move": _time(
+            # move updates the boards it's given, so hand it copies
+            lambda: [bits.move(list(b), 5, 0) for b in open_centre],
+            repeat,
+            len(open_centre),
+        ),
+        "bits.render": _time(lambda: [render_board(b) for b in tuples], repeat, n),
+        "bits.render_uncached": _time(
+            lambda: [render_board.__wrapped__(b) for b in tuples], repeat, n
+        ),
+    }
+
+
+@register
+def rules(repeat: int) -> Dict[str, List[float]]:
+    boards = _boards()
+    n = len(boards)
+    listed = Rules(bits.winning_positions)
+    swept = Rules()
+    game = Game(listed, _players=[Player(None, None, "a"), Player(None, None, "b")])
+
+    def moves():
+        for board in boards:
+            game._players[0]._board, game._players[1]._board = board
+            try:
+                game._move(5, board[0])
+            except ValueError:
+                pass
+
+    def resolve():
+        for board in boards:
+            game._players[0]._board, game._players[1]._board = board
+            game._won_or_cat(game._players[0])
+
+    return {
+        "rules.won": _time(lambda: [listed.won(b[0]) for b in boards], repeat, n),
+        "rules.won_swept": _time(lambda: [swept.won(b[0]) for b in boards], repeat, n),
+        "rules.cat": _time(lambda: [listed.cat(b) for b in boards], repeat, n),
+        "game._move": _time(moves, repeat, n),
+        "game._won_or_cat": _time(resolve, repeat, n),
+    }
+
+
+@register
+def state_machine(repeat: int) -> Dict[str, List[float]]:
+    runs = [state_machine_benchmark(1_000, 10_000, 5_000) for _ in range(repeat)]
+    return {f"state_machine.{kind}": [run[kind] for run in runs] for kind in runs[0]}
+
+
+def _readline(conn: socket.socket, buffer: bytearray) -> bytes:
+    while (end := buffer.find(b"\n")) == -1:
+        chunk = conn.recv(4096)
+        if not chunk:
+            raise ConnectionResetError("Server hung up")
+        buffer += chunk
+    line = bytes(buffer[:end])
+    del buffer[: end + 1]
+    return line
+
+
+@register
+def guess_server(repeat: int, rounds: int = 2000) -> Dict[str, List[float]]:
+    # One guess and its answer through the selectors server over loopback
+    server = GuessServer(host="127.0.0.1", port=0)
+    port = server.start().getsockname()[1]
+    stop = Event()
+
+    def serve():
+        while not stop.is_set():
+            server.serve_once(0.05)
+
+    thread = Thread(target=serve, daemon=True)
+    thread.start()
+    samples = []
+    try:
+        with socket.create_connection(("127.0.0.1", port)) as conn:
+            buffer = bytearray()
+            _readline(conn, buffer)
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    # Never right, so the round never changes
+                    conn.sendall(b"0\n")
+                    _readline(conn, buffer)
+                samples.append((time.perf_counter() - started) / rounds)
+    finally:
+        stop.set()
+        thread.join()
+        server.close()
+    return {"guess_server.round_trip": samples}
+
+
+class _Client:
+    def __init__(self, port: int, name: str):
+        self.conn = socket.create_connection(("127.0.0.1", port))
+        self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.decoder = greet(self.conn, name)
+        self.seat = None
+
+    def next_state(self) -> State:
+        while True:
+            while (frame := self.decoder.next_frame()) is not None:
+                kind, payload = frame
+                if kind == Kind.SEAT:
+                    self.seat = decode_seat(payload)
+                elif kind == Kind.STATE:
+                    return decode_state(payload)
+            if not self.decoder.recv_into(self.conn):
+                raise ConnectionResetError("Server hung up")
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _serve_in_thread(start: Callable) -> tuple:
+    # The server gets its own loop so the blocking clients can live on this one
+    ready, stop = Future(), None
+
+    async def run():
+        nonlocal stop
+        stop = asyncio.Event()
+        server = await start()
+        ready.set_result(
+            (server.sockets[0].getsockname()[1], asyncio.get_running_loop())
+        )
+        await stop.wait()
+        server.close()
+
+    thread = Thread(target=asyncio.run, args=(run(),), daemon=True)
+    thread.start()
+    port, loop = ready.result()
+
+    def shutdown():
+        loop.call_soon_threadsafe(stop.set)
+        thread.join()
+
+    return port, shutdown
+
+
+@register
+def lobby(repeat: int, games: int = 50) -> Dict[str, List[float]]:
+    # A move and the board that comes back, through the asyncio lobby
+    lobby = Lobby(Rules(bits.winning_positions), host="127.0.0.1", port=0)
+    port, shutdown = _serve_in_thread(lobby.start)
+    samples = []
+    try:
+        for _ in range(repeat):
+            moves, elapsed = 0, 0.0
+            for game in range(games):
+                clients = [_Client(port, f"bench {game} {n}") for n in range(2)]
+                state = [client.next_state() for client in clients][0]
+                seats = {client.seat: client for client in clients}
+                while state.status == Status.PLAYING:
+                    mover = seats[state.turn]
+                    started = time.perf_counter()
+                    mover.conn.sendall(encode_move(state.moves()[0]))
+                    state = mover.next_state()
+                    elapsed += time.perf_counter() - started
+                    moves += 1
+                    # Everybody else gets the same board
+                    for client in clients:
+                        if client is not mover:
+                            client.next_state()
+                for client in clients:
+                    client.close()
+            samples.append(elapsed / moves)
+    finally:
+        shutdown()
+    return {"lobby.move_round_trip": samples}
+
+
+@register
+def word_game(
+    repeat: int, clients: int = 20, guesses: int = 500
+) -> Dict[str, List[float]]:
+    # Guesses per second through the asyncio front end, every client keeps a
+    # whole batch in flight so the engine's queue stays full
+    server = WordGameServer(answer="unguessable", host="127.0.0.1", port=0)
+    port, shutdown = _serve_in_thread(server.start)
+    batch = b"".join(f"guess word{n}\n".encode() for n in range(guesses))
+    samples = []
+    try:
+        conns = []
+        for n in range(clients):
+            conn = socket.create_connection(("127.0.0.1", port))
+            conn.sendall(f"join bench{n}\nconfirm\n".encode())
+            buffer = bytearray()
+            while b"confirmed" not in _readline(conn, buffer):
+                pass
+            conns.append((conn, buffer))
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for conn, _ in conns:
+                conn.sendall(batch)
+            for conn, buffer in conns:
+                for _ in range(guesses):
+                    _readline(conn, buffer)
+            samples.append((time.perf_counter() - started) / (clients * guesses))
+        for conn, _ in conns:
+            conn.close()
+    finally:
+        shutdown()
+    return {"word_game.guess": samples}
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names: List[str], repeat: int = 5) -> dict:
+    results = {}
+    for name in names:
+        for bench, samples in SUITE[name](repeat).items():
+            results[bench] = {
+                "best": min(samples),
+                "median": median(samples),
+                "samples": samples,
+            }
+    return {
+        "commit": _commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "machine": platform.platform(),
+        "unit": "seconds per operation",
+        "results": results,
+    }
+
+
+def compare(before: dict, after: dict, threshold: float = 0.1) -> List[str]:
+    # Compares best times, the least noisy number we have. Returns regressions
+    regressions = []
+    print(f"{before['commit']} -> {after['commit']}")
+    for name, result in after["results"].items():
+        if name not in before["results"]:
+            print(f"{name:>28}  {result['best'] * 1e6:10.3f}µs  (new)")
+            continue
+        old, new = before["results"][name]["best"], result["best"]
+        change = new / old - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(
+            f"{name:>28}  {old * 1e6:10.3f}µs -> {new * 1e6:10.3f}µs "
+            f"{change:+7.1%}{flag}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    # python benchmarks.py -o before.json; change things;
+    # python benchmarks.py -o after.json; python benchmarks.py --compare before.json after.json
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(SUITE)}")
+    parser.add_argument("-o", "--output", help="write results here as JSON")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            regressions = compare(json.load(f), json.load(g), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    # The servers log every move, that's not what we're here to time
+    logging.disable(logging.INFO)
+    unknown = set(args.benchmarks) - set(SUITE)
+    if unknown:
+        parser.error(f"unknown benchmarks {', '.join(sorted(unknown))}")
+    results = run(args.benchmarks or list(SUITE), args.repeat)
+    for name, result in results["results"].items():
+        print(f"{name:>28}  {result['best'] * 1e6:10.3f}µs")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
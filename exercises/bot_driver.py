@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import logging
+from asyncio import StreamReader
+from configparser import ConfigParser
+from dataclasses import dataclass, field
+from random import Random
+from typing import Awaitable, Callable, Protocol
+
+from openai import AsyncOpenAI
+
+from ai_ttt_bot import Bot, Message
+from metrics import PORT, registry
+from protocol import MAGIC, FrameDecoder, encode_move, encode_text
+from tic_tac_toe_solver import Solver
+
+logger = logging.getLogger(__name__)
+
+
+class Completions(Protocol):
+    # Anything that can answer a prompt, msg is there for stand-ins that would
+    # rather look at the bitboards than read
+    async def complete(self, prompt: str, msg: Message) -> str: ...
+
+
+def free_positions(boards: list) -> list:
+    taken = 0
+    for board in boards:
+        taken |= board
+    return [pos for pos in range(1, 10) if not taken >> (pos - 1) & 1]
+
+
+@dataclass
+class OpenAICompletions:
+    client: AsyncOpenAI  # shared by every bot
+    model: str = "gpt-4"
+
+    async def complete(self, prompt: str, msg: Message) -> str:
+        completion = await self.client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}], model=self.model
+        )
+        return completion.choices[0].message.content
+
+
+@dataclass
+class SolverCompletions:
+    # A local stand-in that never loses, latency pretends to be the network
+    solver: Solver = field(default_factory=Solver.build)
+    latency: float = 0.0
+
+    async def complete(self, prompt: str, msg: Message) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if msg.boards is None:
+            return "Action: None"
+        try:
+            return f"Action: {self.solver.best_move(msg.boards, msg.turn)}"
+        except ValueError:
+            # Skipped turns can leave us somewhere perfect play never goes
+            return f"Action: {free_positions(msg.boards)[0]}"
+
+
+@dataclass
+class RandomCompletions:
+    rnd: Random = field(default_factory=lambda: Random(0))
+    latency: float = 0.0
+
+    async def complete(self, prompt: str, msg: Message) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if msg.boards is None:
+            return "Action: None"
+        free = free_positions(msg.boards)
+        return f"Action: {self.rnd.choice(free)}" if free else "Action: None"
+
+
+@dataclass
+class RateLimiter:
+    # At most `concurrency` calls in flight and, if set, no more than
+    # `per_second` started every second across every bot
+    concurrency: int = 16
+    per_second: float | None = None
+    calls: int = 0
+    # The event loop's clock and asyncio.sleep unless given
+    clock: Callable[[], float] | None = None
+    sleep: Callable[[float], Awaitable] = asyncio.sleep
+    _semaphore: asyncio.Semaphore | None = None
+    _next_start: float = 0.0
+
+    def __post_init__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self.per_second:
+            now = (self.clock or asyncio.get_running_loop().time)()
+            start = max(now, self._next_start)
+            self._next_start = start + 1 / self.per_second
+            if start > now:
+                await self.sleep(start - now)
+        self.calls += 1
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._semaphore.release()
+
+
+@dataclass
+class AsyncBot(Bot):
+    # conn is the StreamWriter, gpt is unused
+    completions: Completions | None = None
+    limiter: RateLimiter | None = None
+    reader: StreamReader | None = None
+
+    @classmethod
+    async def connect(
+        cls,
+        host: str,
+        port: int,
+        name: str,
+        completions: Completions,
+        limiter: RateLimiter,
+    ):
+        reader, writer = await asyncio.open_connection(host, port)
+        bot = cls(
+            gpt=None,
+            conn=writer,
+            name=name,
+            completions=completions,
+            limiter=limiter,
+            reader=reader,
+        )
+        await bot.greet()
+        return bot
+
+    async def greet(self) -> None:
+        self.conn.write(MAGIC + encode_text(self.name))
+        # Everything up to the echoed MAGIC is the text greeting
+        await self.reader.readuntil(MAGIC)
+        self._decoder = FrameDecoder()
+
+    async def receive(self) -> Message | None:
+        while (frame := self._decoder.next_frame()) is None:
+            data = await self.reader.read(4096)
+            if not data:
+                raise ConnectionResetError("Server hung up")
+            self._decoder.feed(data)
+
+        return self._handle(frame)
+
+    def send(self, action: str) -> None:
+        if action.isdigit():
+            self.conn.write(encode_move(int(action)))
+        else:
+            self.conn.write(encode_text(action))
+
+    async def decide_action(self) -> str | None:
+        msg = self.messages[-1]
+        decided, action = self._without_model(msg)
+        if decided:
+            return action
+
+        cacheable = self.cache is not None and self._my_turn(msg)
+        if cacheable and (position := self.cache.get(msg.boards, self.seat)):
+            return str(position)
+
+        async with self.limiter:
+            registry.inc("completions")
+            with registry.time("gpt"):
+                content = await self.completions.complete(self._prompt(msg), msg)
+        action = self._parse(content)
+        if cacheable and self._legal(msg, action):
+            self.cache.put(msg.boards, self.seat, int(action))
+        return action
+
+    async def play(self) -> None:
+        # Until the server hangs up at the end of the game
+        while True:
+            try:
+                msg = await self.receive()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                return
+            if msg:
+                self.messages.append(msg)
+                with registry.time("decide"):
+                    action = await self.decide_action()
+                if action:
+                    self.send(action)
+                    await self.conn.drain()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+async def run_bot(name: str, games: int, host: str, port: int, **kwargs) -> int:
+    played = 0
+    for _ in range(games):
+        try:
+            bot = await AsyncBot.connect(host, port, name, **kwargs)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.error(f"{name} couldn't join: {e}")
+            break
+        try:
+            await bot.play()
+            played += 1
+        finally:
+            bot.close()
+    return played
+
+
+async def run_bots(
+    bots: int,
+    games: int,
+    completions: Completions,
+    limiter: RateLimiter,
+    host: str = "127.0.0.1",
+    port: int = 4227,
+) -> int:
+    played = await asyncio.gather(
+        *(
+            run_bot(
+                f"Roboty {n}",
+                games,
+                host,
+                port,
+                completions=completions,
+                limiter=limiter,
+            )
+            for n in range(bots)
+        )
+    )
+    return sum(played)
+
+
+def openai_completions(model: str) -> OpenAICompletions:
+    config = ConfigParser()
+    config.read("./data/ttt.config")
+    client = AsyncOpenAI(
+        api_key=config["TTT"]["API_KEY"],
+        organization=config["TTT"]["ORGANIZATION"],
+    )
+    return OpenAICompletions(client, model)
+
+
+async def main(args) -> None:
+    match args.backend:
+        case "openai":
+            completions = openai_completions(args.model)
+        case "solver":
+            completions = SolverCompletions(latency=args.latency)
+        case _:
+            completions = RandomCompletions(latency=args.latency)
+    limiter = RateLimiter(args.concurrency, args.rate)
+    registry.serve(PORT + 1)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    played = await run_bots(
+        args.bots, args.games, completions, limiter, args.host, args.port
+    )
+    elapsed = loop.time() - started
+    logger.info(
+        f"{args.bots} bots played {played} games with {limiter.calls} completions "
+        f"in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    # Fill the lobby (python tic_tac_toe_bits_async.py) with bots
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--games", type=int, default=1)
+    parser.add_argument(
+        "--backend", choices=["openai", "solver", "random"], default="random"
+    )
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=None)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4227)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,163 @@
+import logging
+import selectors
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from socket import MSG_DONTWAIT, SHUT_RDWR, socket
+from typing import Deque, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SlowConsumer(Enum):
+    DROP = "drop"  # throw away boards they haven't read yet, keep the rest
+    DISCONNECT = "disconnect"
+
+    def __str__(self):
+        return self.value
+
+
+@dataclass
+class Outbox:
+    # What we still owe one connection. Sends never block, whatever the kernel
+    # won't take waits here until the connection is writable again.
+    conn: socket
+    limit: int = 64 * 1024
+    policy: SlowConsumer = SlowConsumer.DROP
+    queued: int = 0
+    dropped: int = 0
+    closed: bool = False
+    _queue: Deque[Tuple[memoryview, bool]] = field(default_factory=deque)
+
+    def put(self, data: bytes, droppable: bool = False) -> None:
+        # droppable is for boards, a newer one makes the older ones pointless
+        if self.closed:
+            return
+        if self.queued + len(data) > self.limit and self.policy == SlowConsumer.DROP:
+            self._drop_boards()
+            if droppable and self.queued + len(data) > self.limit:
+                self.dropped += 1
+                return
+        if self.queued + len(data) > self.limit:
+            # Nothing left we could skip, they'll never catch up
+            self.close(f"more than {self.limit} bytes behind")
+            return
+        self._queue.append((memoryview(data), droppable))
+        self.queued += len(data)
+        self.flush()
+
+    def _drop_boards(self) -> None:
+        # The head may be half sent, it has to go out whole
+        kept = deque(self._queue)
+        self._queue.clear()
+        if kept:
+            self._queue.append(kept.popleft())
+        for data, droppable in kept:
+            if droppable:
+                self.queued -= len(data)
+                self.dropped += 1
+            else:
+                self._queue.append((data, droppable))
+
+    def flush(self) -> bool:
+        # True once everything is out
+        while self._queue and not self.closed:
+            data, droppable = self._queue[0]
+            try:
+                sent = self.conn.send(data, MSG_DONTWAIT)
+            except BlockingIOError:
+                return False
+            except OSError as e:
+                self.close(str(e))
+                return False
+            self.queued -= sent
+            if sent < len(data):
+                self._queue[0] = data[sent:], droppable
+                return False
+            self._queue.popleft()
+        return not self._queue
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._queue) and not self.closed
+
+    def close(self, reason: str) -> None:
+        if self.closed:
+            return
+        logger.info(f"Dropping slow connection, {reason}")
+        self.closed = True
+        self._queue.clear()
+        self.queued = 0
+        try:
+            # The reader notices on its next recv
+            self.conn.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+
+@dataclass
+class Fanout:
+    # One outbox per connection. Callers encode a broadcast once and hand the
+    # same bytes to every outbox.
+    limit: int = 64 * 1024
+    policy: SlowConsumer = SlowConsumer.DROP
+    _outboxes: Dict[socket, Outbox] = field(default_factory=dict)
+
+    def attach(self, conn: socket, policy: SlowConsumer | None = None) -> Outbox:
+        if conn not in self._outboxes:
+            self._outboxes[conn] = Outbox(conn, self.limit, policy or self.policy)
+        return self._outboxes[conn]
+
+    def detach(self, conn: socket) -> None:
+        self._outboxes.pop(conn, None)
+
+    def send(self, conn: socket, data: bytes, droppable: bool = False) -> None:
+        self.attach(conn).put(data, droppable)
+
+    def closed(self, conn: socket) -> bool:
+        outbox = self._outboxes.get(conn)
+        return outbox is not None and outbox.closed
+
+    def wait(self, readers: List[socket], timeout: float | None = None) -> List[socket]:
+        # Keep flushing while we wait for any of readers to have something for
+        # us. Returns the readable ones, empty if we ran out of time or there
+        # was nothing to wait for.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interest = {conn: selectors.EVENT_READ for conn in readers}
+        for conn, outbox in self._outboxes.items():
+            if outbox.pending:
+                interest[conn] = interest.get(conn, 0) | selectors.EVENT_WRITE
+
+        with selectors.DefaultSelector() as selector:
+            for conn, events in interest.items():
+                selector.register(conn, events)
+            while selector.get_map():
+                remaining = None
+                if deadline is not None:
+                    remaining = max(deadline - time.monotonic(), 0)
+                readable = []
+                for key, events in selector.select(remaining):
+                    if events & selectors.EVENT_WRITE:
+                        outbox = self._outboxes[key.fileobj]
+                        if outbox.flush() or outbox.closed:
+                            self._unwatch(selector, key)
+                    if events & selectors.EVENT_READ:
+                        readable.append(key.fileobj)
+                if readable:
+                    return readable
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        return []
+
+    @staticmethod
+    def _unwatch(selector: selectors.BaseSelector, key: selectors.SelectorKey):
+        events = key.events & ~selectors.EVENT_WRITE
+        if events:
+            selector.modify(key.fileobj, events)
+        else:
+            selector.unregister(key.fileobj)
+
+    def drain(self, timeout: float) -> None:
+        # Last chance for everybody to get the final board
+        self.wait([], timeout)
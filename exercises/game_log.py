@@ -0,0 +1,166 @@
+import mmap
+import struct
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple
+
+LOG_PATH = "./data/games.log"
+
+# game id, turn, player, position, timestamp (ns). Little endian and no
+# padding so every record is exactly 16 bytes.
+RECORD = struct.Struct("<IHBBQ")
+# Just the game id of a record
+GAME_ID = struct.Struct("<I12x")
+
+# A record with position 0 closes a game, player is then the winner's seat
+END = 0
+NOBODY = 0xFF
+
+
+class Record(NamedTuple):
+    game_id: int
+    turn: int
+    player: int
+    position: int
+    timestamp: int
+
+
+@dataclass
+class GameLog:
+    path: str = LOG_PATH
+    buffering: int = 64 * 1024
+    _file: BinaryIO | None = None
+
+    def open(self):
+        if self._file is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab", buffering=self.buffering)
+        return self
+
+    def record(
+        self,
+        game_id: int,
+        turn: int,
+        player: int,
+        position: int,
+        timestamp: int | None = None,
+    ) -> None:
+        if timestamp is None:
+            timestamp = time.time_ns()
+        self.open()._file.write(RECORD.pack(game_id, turn, player, position, timestamp))
+
+    def end(self, game_id: int, turn: int, winner: int | None) -> None:
+        self.record(game_id, turn, NOBODY if winner is None else winner, END)
+
+    def next_id(self) -> int:
+        # One past every game already in the log, so a restarted server
+        # doesn't mix its games up with the last one's
+        self.flush()
+        if not Path(self.path).exists():
+            return 0
+        with GameLogReader(self.path) as reader:
+            return reader.next_id()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+@dataclass
+class Replay:
+    game_id: int
+    boards: List[int]
+    turns: int = 0
+    winner: int | None = None
+
+
+@dataclass
+class GameLogReader:
+    path: str = LOG_PATH
+    players: int = 2
+    _map: mmap.mmap | None = field(default=None, repr=False)
+
+    def __post_init__(self):
+        with open(self.path, "rb") as f:
+            size = (f.seek(0, 2) // RECORD.size) * RECORD.size
+            # mmap refuses empty files, and a half written record at the end
+            # is ignored until it's complete
+            if size:
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return 0 if self._map is None else len(self._map) // RECORD.size
+
+    def __iter__(self) -> Iterator[Record]:
+        if self._map is None:
+            return
+        for fields in RECORD.iter_unpack(self._map):
+            yield Record(*fields)
+
+    def next_id(self) -> int:
+        # Games overlap, so the last record needn't be the newest game
+        if self._map is None:
+            return 0
+        return max(game_id for (game_id,) in GAME_ID.iter_unpack(self._map)) + 1
+
+    def boards_at(self, game_id: int, turn: int | None = None) -> List[int]:
+        # Boards after `turn` moves, or at the end of the game
+        boards = [0] * self.players
+        for record in self:
+            if record.game_id != game_id or record.position == END:
+                continue
+            if turn is not None and record.turn >= turn:
+                break
+            boards[record.player] |= 1 << (record.position - 1)
+        return boards
+
+    def replay(self) -> Iterator[Replay]:
+        # Only games that are still going are held in memory, so streaming
+        # through millions of finished games costs the same as a handful
+        live: Dict[int, Replay] = {}
+        for record in self:
+            game = live.get(record.game_id)
+            if game is None:
+                game = live[record.game_id] = Replay(record.game_id, [0] * self.players)
+            if record.position == END:
+                del live[record.game_id]
+                game.winner = None if record.player == NOBODY else record.player
+                yield game
+                continue
+            game.boards[record.player] |= 1 << (record.position - 1)
+            game.turns = record.turn + 1
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    # python game_log.py to summarize the games played so far
+    wins, games = {}, 0
+    with GameLogReader() as reader:
+        for game in reader.replay():
+            games += 1
+            wins[game.winner] = wins.get(game.winner, 0) + 1
+    print(f"{games} games")
+    for winner, count in sorted(wins.items(), key=lambda w: -w[1]):
+        print(f"{'Cat' if winner is None else f'Player {winner}'}: {count}")
@@ -0,0 +1,187 @@
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from random import Random
+from typing import Dict, List, Tuple
+
+from state_machine_game import Action, Game, Message, Player
+from word_index import WordIndex
+
+logger = logging.getLogger(__name__)
+
+# (game_id, player name, kind, word), kind is "start" (word is the answer) or a
+# Message label. Plain tuples pickle a lot faster than Actions.
+Item = Tuple[int, str, str, str | None]
+
+
+def _play(games: Dict[int, tuple], item: Item, words: WordIndex | None) -> tuple:
+    game_id, name, kind, word = item
+    if kind == "start":
+        game = Game(word, words).simulate()
+        next(game)
+        games[game_id] = game, {}
+        return None
+
+    if game_id not in games:
+        # Already won, or never started
+        return None
+    game, players = games[game_id]
+    player = players.get(name)
+    if player is None:
+        player = players[name] = Player(name)
+    # with_data hands back the shared GUESS member, it's used straight away
+    if kind == Message.GUESS.label:
+        message = Message.GUESS.with_data({"word": word})
+    else:
+        message = Message(kind)
+
+    state = game.send(Action(player, message))
+    if state.winner is None:
+        return None
+    game.close()
+    del games[game_id]
+    return game_id, state.winner.name
+
+
+def _work(conn: Connection, words_path: str | None, level: int) -> None:
+    # Owns every game in its shard, answers each batch with how many items it
+    # got through and who won what
+    logging.getLogger("state_machine_game").setLevel(level)
+    words = WordIndex(words_path) if words_path else None
+    games = {}
+    while (batch := conn.recv()) is not None:
+        winners = [won for item in batch if (won := _play(games, item, words))]
+        conn.send((len(batch), winners))
+    conn.close()
+
+
+@dataclass
+class GameRunner:
+    # Games are sharded across worker processes by id, actions are buffered
+    # per shard and shipped in batches
+    workers: int = field(default_factory=os.cpu_count)
+    batch_size: int = 1024
+    max_in_flight: int = 4
+    words_path: str | None = None
+    level: int = logging.WARNING
+    processed: int = 0
+    winners: Dict[int, str] = field(default_factory=dict)
+    _conns: List[Connection] = field(default_factory=list)
+    _procs: List[Process] = field(default_factory=list)
+    _buffers: List[List[Item]] = field(default_factory=list)
+    _in_flight: List[int] = field(default_factory=list)
+
+    def start(self):
+        for n in range(self.workers):
+            parent, child = Pipe()
+            proc = Process(
+                target=_work,
+                args=(child, self.words_path, self.level),
+                name=f"games-{n}",
+                daemon=True,
+            )
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self._buffers = [[] for _ in range(self.workers)]
+        self._in_flight = [0] * self.workers
+        return self
+
+    def shard(self, game_id: int) -> int:
+        return game_id % self.workers
+
+    def submit(
+        self, game_id: int, name: str, kind: str, word: str | None = None
+    ) -> None:
+        shard = self.shard(game_id)
+        buffer = self._buffers[shard]
+        buffer.append((game_id, name, kind, word))
+        if len(buffer) >= self.batch_size:
+            self._send(shard)
+
+    def start_game(self, game_id: int, answer: str) -> None:
+        self.submit(game_id, "", "start", answer)
+
+    def _send(self, shard: int) -> None:
+        # Don't let a worker fall too far behind, or both ends block on a full pipe
+        while self._in_flight[shard] >= self.max_in_flight:
+            self._collect(shard)
+        self._conns[shard].send(self._buffers[shard])
+        self._buffers[shard] = []
+        self._in_flight[shard] += 1
+
+    def _collect(self, shard: int) -> None:
+        processed, winners = self._conns[shard].recv()
+        self._in_flight[shard] -= 1
+        self.processed += processed
+        self.winners.update(winners)
+
+    def flush(self) -> None:
+        for shard, buffer in enumerate(self._buffers):
+            if buffer:
+                self._send(shard)
+
+    def wait(self) -> None:
+        # Everything submitted so far has been played
+        self.flush()
+        for shard in range(self.workers):
+            while self._in_flight[shard]:
+                self._collect(shard)
+
+    def close(self) -> None:
+        if self._conns:
+            self.wait()
+        for conn in self._conns:
+            conn.send(None)
+            conn.close()
+        for proc in self._procs:
+            proc.join()
+        self._conns, self._procs = [], []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def simulate(runner: GameRunner, games: int, players: int, guesses: int) -> None:
+    # Every player guesses junk except the last guess of the first player
+    rnd = Random(0)
+    for game_id in range(games):
+        runner.start_game(game_id, "supermarket")
+        for n in range(players):
+            runner.submit(game_id, f"player {n}", "request")
+            runner.submit(game_id, f"player {n}", "confirm")
+    for turn in range(guesses):
+        for game_id in range(games):
+            for n in range(players):
+                word = f"{rnd.random():.8f}"
+                if turn == guesses - 1 and n == 0:
+                    word = "supermarket"
+                runner.submit(game_id, f"player {n}", "guess", word)
+    runner.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2_000)
+    parser.add_argument("--players", type=int, default=5)
+    parser.add_argument("--guesses", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        started = time.perf_counter()
+        with GameRunner(workers) as runner:
+            simulate(runner, args.games, args.players, args.guesses)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{workers} workers: {runner.processed:,} actions in {elapsed:.2f}s "
+            f"({runner.processed / elapsed:,.0f}/s), {len(runner.winners)} winners"
+        )
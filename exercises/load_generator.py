@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import json
+import logging
+import re
+from asyncio import StreamReader
+from dataclasses import dataclass, field
+from random import Random
+from typing import Callable, List
+
+from rich.logging import RichHandler
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(message)s",
+    datefmt="[%X]",
+    handlers=[RichHandler(rich_tracebacks=True)],
+)
+
+logger = logging.getLogger(__name__)
+
+
+def think_time(spec: str, rnd: Random) -> Callable[[], float]:
+    # none, fixed:0.1, uniform:0.05,0.2, exp:0.1 (mean) or lognormal:-2,0.5
+    kind, _, args = spec.partition(":")
+    params = [float(arg) for arg in args.split(",") if arg]
+    match kind, params:
+        case "none", []:
+            return lambda: 0.0
+        case "fixed", [seconds]:
+            return lambda: seconds
+        case "uniform", [low, high]:
+            return lambda: rnd.uniform(low, high)
+        case "exp", [mean]:
+            return lambda: rnd.expovariate(1 / mean)
+        case "lognormal", [mu, sigma]:
+            return lambda: rnd.lognormvariate(mu, sigma)
+        case _:
+            raise ValueError(f"Don't know how to think like {spec!r}.")
+
+
+def percentile(samples: List[float], p: float) -> float:
+    # Nearest rank, good enough with thousands of samples
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+@dataclass
+class Stats:
+    connect: List[float] = field(default_factory=list)
+    turn: List[float] = field(default_factory=list)
+    game: List[float] = field(default_factory=list)
+    moves: int = 0
+    invalid: int = 0
+    errors: int = 0
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = {
+            name: {
+                "n": len(samples),
+                **{f"p{p}": percentile(samples, p) for p in (50, 95, 99)},
+            }
+            for name, samples in [
+                ("connect", self.connect),
+                ("turn", self.turn),
+                ("game", self.game),
+            ]
+        }
+        return {
+            "elapsed": elapsed,
+            "games": len(self.game),
+            "moves": self.moves,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "games_per_second": len(self.game) / elapsed,
+            "moves_per_second": self.moves / elapsed,
+            "latency": latencies,
+        }
+
+
+@dataclass
+class Client:
+    name: str
+    host: str
+    port: int
+    think: Callable[[], float]
+    rnd: Random
+    stats: Stats
+    invalid: float = 0.0  # chance of sending something the server must reject
+
+    async def _connect(self) -> tuple:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.stats.connect.append(loop.time() - started)
+        return started, reader, writer
+
+    def _sabotage(self) -> bool:
+        return self.invalid and self.rnd.random() < self.invalid
+
+
+@dataclass
+class TicTacToeClient(Client):
+    # Plays tic_tac_toe_bits_sockets or the async lobby as a text player that
+    # asked for JSON, so nothing has to read the ASCII board
+
+    async def play(self) -> None:
+        loop = asyncio.get_running_loop()
+        started, reader, writer = await self._connect()
+        try:
+            await reader.readuntil(b"What is your name?\n")
+            writer.write(f"{self.name} /json\n".encode())
+
+            sent = None
+            while line := await reader.readline():
+                state = json.loads(line)
+                if "boards" not in state:
+                    if state["message"].startswith(f"Invalid move by {self.name}:"):
+                        self.stats.invalid += 1
+                        sent = None
+                    continue
+                if sent is not None:
+                    self.stats.turn.append(loop.time() - sent)
+                    sent = None
+                if state["status"] != "playing":
+                    self.stats.game.append(loop.time() - started)
+                    return
+                if f"{self.name}'s turn" not in state["message"].splitlines():
+                    continue
+
+                await asyncio.sleep(self.think())
+                if self._sabotage():
+                    move = self._bad_move(state["legal"])
+                else:
+                    move = self.rnd.choice(state["legal"])
+                writer.write(f"{move}\n".encode())
+                sent = loop.time()
+                self.stats.moves += 1
+            raise ConnectionResetError("Server hung up mid game")
+        finally:
+            writer.close()
+
+    def _bad_move(self, legal: List[int]) -> int | str:
+        taken = [pos for pos in range(1, 10) if pos not in legal]
+        return self.rnd.choice(taken) if taken else "x"
+
+
+@dataclass
+class GuessClient(Client):
+    # Plays socket_game or socket_game_selectors until somebody wins
+
+    async def _reply(self, reader: StreamReader, buffer: bytearray) -> bytes:
+        # socket_game doesn't bother with a newline after "You win!"
+        while True:
+            if buffer.startswith(b"You win!"):
+                del buffer[: len(b"You win!\n")]
+                return b"You win!"
+            if (end := buffer.find(b"\n")) != -1:
+                line = bytes(buffer[:end])
+                del buffer[: end + 1]
+                return line
+            chunk = await reader.read(4096)
+            if not chunk:
+                raise ConnectionResetError("Server hung up mid game")
+            buffer += chunk
+
+    async def play(self) -> None:
+        loop = asyncio.get_running_loop()
+        started, reader, writer = await self._connect()
+        try:
+            buffer = bytearray()
+            while not (line := await self._reply(reader, buffer)).startswith(
+                b"Guess a number"
+            ):
+                continue
+            low, high = map(int, re.findall(rb"\d+", line))
+            guesses = list(range(low, high + 1))
+            self.rnd.shuffle(guesses)
+
+            while True:
+                await asyncio.sleep(self.think())
+                guess = b"x" if self._sabotage() else str(guesses.pop()).encode()
+                writer.write(guess + b"\n")
+                sent = loop.time()
+                self.stats.moves += 1
+
+                line = await self._reply(reader, buffer)
+                if line.startswith(b"Someone else guessed"):
+                    break
+                self.stats.turn.append(loop.time() - sent)
+                if line == b"You win!":
+                    break
+                if line == b"That's not a number":
+                    self.stats.invalid += 1
+            self.stats.game.append(loop.time() - started)
+        finally:
+            writer.close()
+
+
+CLIENTS = {"tic_tac_toe": TicTacToeClient, "guess": GuessClient}
+
+
+async def _run_client(client: Client, games: int, delay: float) -> None:
+    await asyncio.sleep(delay)
+    for _ in range(games):
+        try:
+            await client.play()
+        except (
+            ConnectionError,
+            asyncio.IncompleteReadError,
+            ValueError,
+            IndexError,
+        ) as e:
+            client.stats.errors += 1
+            logger.debug(f"{client.name}: {e!r}")
+
+
+async def run(
+    kind: str,
+    clients: int,
+    games: int = 1,
+    host: str = "127.0.0.1",
+    port: int = 4227,
+    think: str = "none",
+    invalid: float = 0.0,
+    ramp: float = 0.0,
+    seed: int = 0,
+) -> dict:
+    # ramp spreads the connections over that many seconds so the listen
+    # backlog doesn't overflow
+    stats = Stats()
+    rnd = Random(seed)
+    players = [
+        CLIENTS[kind](
+            f"load {n}",
+            host,
+            port,
+            think_time(think, rnd),
+            Random(rnd.random()),
+            stats,
+            invalid,
+        )
+        for n in range(clients)
+    ]
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await asyncio.gather(
+        *(
+            _run_client(player, games, ramp * n / clients)
+            for n, player in enumerate(players)
+        )
+    )
+    return stats.summary(loop.time() - started)
+
+
+def report(summary: dict) -> str:
+    lines = [f"{'':>8} {'n':>7} {'p50':>9} {'p95':>9} {'p99':>9}"]
+    for name, latency in summary["latency"].items():
+        lines.append(
+            f"{name:>8} {latency['n']:>7} "
+            + " ".join(f"{latency[p] * 1000:7.2f}ms" for p in ("p50", "p95", "p99"))
+        )
+    lines.append(
+        f"{summary['games']} games and {summary['moves']} moves in "
+        f"{summary['elapsed']:.2f}s ({summary['games_per_second']:.1f} games/s, "
+        f"{summary['moves_per_second']:.1f} moves/s), "
+        f"{summary['invalid']} invalid, {summary['errors']} errors"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python tic_tac_toe_bits_async.py & python load_generator.py tic_tac_toe
+    # --clients 2000 --think exp:0.2. Thousands of clients need ulimit -n to match.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("kind", choices=list(CLIENTS))
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--games", type=int, default=1, help="per client")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4227)
+    parser.add_argument("--think", default="none")
+    parser.add_argument("--invalid", type=float, default=0.0)
+    parser.add_argument("--ramp", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the summary here")
+    args = parser.parse_args()
+
+    options = {k: v for k, v in vars(args).items() if k != "json"}
+    summary = asyncio.run(run(**options))
+    print(report(summary))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
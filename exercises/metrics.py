@@ -0,0 +1,166 @@
+import logging
+import os
+from bisect import bisect_left
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import perf_counter
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# TTT_METRICS=0 turns everything into no-ops
+ENABLED = os.environ.get("TTT_METRICS", "1") != "0"
+PORT = 9227
+
+# 50µs to ~26s, doubling, which covers a bitboard check and a GPT call alike
+BUCKETS = [0.00005 * 2**n for n in range(20)]
+
+_OFF = nullcontext()
+
+HELP = {
+    "recv": "Waiting for a player to move",
+    "move": "Decoding, validating and logging a move",
+    "render": "Rendering the board",
+    "broadcast": "Encoding and sending the board to every player",
+    "message": "Sending a message to every player",
+    "guess": "Handling a guess",
+    "decide": "A bot deciding what to do with a message",
+    "gpt": "Waiting for a completion",
+    "connections": "Connections accepted",
+    "games": "Games started",
+    "games_finished": "Games finished",
+    "invalid_moves": "Moves rejected",
+    "rounds": "Guessing rounds started",
+    "completions": "Completions requested",
+    "timeouts": "Turns and handshakes that ran out of time",
+    "disconnects": "Players who left mid game",
+}
+
+
+@dataclass(slots=True)
+class Histogram:
+    name: str
+    help: str
+    bounds: List[float] = field(default_factory=lambda: BUCKETS)
+    counts: List[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        # The last bucket is +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip([*map(repr, self.bounds), "+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+@dataclass(slots=True)
+class Counter:
+    name: str
+    help: str
+    value: int = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}",
+        ]
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(perf_counter() - self.started)
+
+
+@dataclass
+class Registry:
+    # Everything lives in this process and is only touched under the GIL, the
+    # odd lost increment from a thread switch is fine for what this is for
+    enabled: bool = ENABLED
+    prefix: str = "ttt_"
+    _histograms: Dict[str, Histogram] = field(default_factory=dict)
+    _counters: Dict[str, Counter] = field(default_factory=dict)
+
+    def histogram(self, stage: str, help: str = "") -> Histogram:
+        if (histogram := self._histograms.get(stage)) is None:
+            name = f"{self.prefix}{stage}_seconds"
+            histogram = self._histograms[stage] = Histogram(
+                name, help or HELP.get(stage, stage)
+            )
+        return histogram
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        if (counter := self._counters.get(name)) is None:
+            full = f"{self.prefix}{name}_total"
+            counter = self._counters[name] = Counter(full, help or HELP.get(name, name))
+        return counter
+
+    def time(self, stage: str):
+        # with registry.time("recv"): ...
+        if not self.enabled:
+            return _OFF
+        return _Timer(self.histogram(stage))
+
+    def inc(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counter(name).inc(n)
+
+    def render(self) -> str:
+        lines = []
+        for metric in [*self._counters.values(), *self._histograms.values()]:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = PORT, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        # Prometheus text on http://host:port/metrics, from a daemon thread
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Metrics on http://{host}:{server.server_port}/metrics")
+        return server
+
+
+registry = Registry()
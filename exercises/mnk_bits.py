@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from functools import cached_property
+from string import ascii_lowercase
+from typing import List, Tuple
+
+
+# Boards with up to this many cells get a lookup table for won
+TABLE_LIMIT = 12
+
+
+@dataclass(frozen=True)
+class MNK:
+    # Positions are numbered 1 to width * height from top left to bottom
+    # right, position p lives in bit p - 1 of a board.
+    width: int = 3
+    height: int = 3
+    k: int = 3
+
+    def __post_init__(self):
+        if self.width < 1 or self.height < 1:
+            raise ValueError("Board must be at least 1x1.")
+        if self.k < 1 or self.k > max(self.width, self.height):
+            raise ValueError(f"Can't get {self.k} in a row on this board.")
+
+    @cached_property
+    def size(self) -> int:
+        return self.width * self.height
+
+    @cached_property
+    def full(self) -> int:
+        return (1 << self.size) - 1
+
+    @cached_property
+    def _columns(self) -> List[int]:
+        column = sum(1 << (row * self.width) for row in range(self.height))
+        return [column << col for col in range(self.width)]
+
+    @cached_property
+    def _sweeps(self) -> List[Tuple[int, int]]:
+        # (shift, guard) for each direction. Shifting right by `shift` pulls
+        # the next cell along that direction onto the current one, the guard
+        # clears cells whose neighbour would wrap around onto another row.
+        not_last = self.full & ~self._columns[-1]
+        not_first = self.full & ~self._columns[0]
+        return [
+            (1, not_last),  # rows
+            (self.width, self.full),  # columns
+            (self.width + 1, not_last),  # diagonals
+            (self.width - 1, not_first),  # anti diagonals
+        ]
+
+    def lines(self) -> List[int]:
+        # Every winning mask, only sensible to enumerate on small boards
+        lines = []
+        for shift, guard in self._sweeps:
+            for start in range(self.size):
+                line, cell = 0, start
+                for _ in range(self.k):
+                    if cell >= self.size:
+                        break
+                    line |= 1 << cell
+                    if not (guard >> cell) & 1:
+                        cell = self.size
+                    else:
+                        cell += shift
+                if line.bit_count() == self.k:
+                    lines.append(line)
+        return lines
+
+    @cached_property
+    def _won_table(self) -> bytes | None:
+        # Small boards look the answer up, 512 entries for tic tac toe. The
+        # sweep is several times slower than an index on a 3x3 board.
+        if self.size > TABLE_LIMIT:
+            return None
+        return bytes(map(self._swept, range(1 << self.size)))
+
+    def won(self, board: int) -> bool:
+        table = self._won_table
+        if table is not None:
+            return table[board] == 1
+        return self._swept(board)
+
+    def _swept(self, board: int) -> bool:
+        for shift, guard in self._sweeps:
+            # After n sweeps a bit survives if it starts a run of n + 1
+            run = board
+            for _ in range(self.k - 1):
+                run &= (run >> shift) & guard
+                if not run:
+                    break
+            if run:
+                return True
+        return False
+
+    def cat(self, boards: List[int]) -> bool:
+        combined = 0
+        for board in boards:
+            combined |= board
+
+        return combined == self.full
+
+    def mask(self, position: int) -> int:
+        if position < 1 or position > self.size:
+            raise ValueError(f"Must be between 1 and {self.size}.")
+        return 1 << (position - 1)
+
+    def move(self, boards: List[int], position: int, player: int) -> List[int]:
+        mask = self.mask(position)
+
+        for board in boards:
+            if board & mask:
+                raise ValueError("Position already taken.")
+
+        boards[player] = boards[player] | mask
+
+        return boards
+
+    def is_set(self, board: int, position: int) -> bool:
+        return (board & self.mask(position)) != 0
+
+    def render(self, boards: List[int]) -> str:
+        rows = []
+        for row in range(self.height):
+            symbols = []
+            for col in range(self.width):
+                mask = 1 << (row * self.width + col)
+                symbol = " "
+                for idx, board in enumerate(boards):
+                    if board & mask:
+                        symbol = ascii_lowercase[idx]
+                        break
+                symbols.append(f" {symbol} ")
+            rows.append("|".join(symbols))
+
+        return f"\n{'-' * (4 * self.width - 1)}\n".join(rows)
+
+
+TIC_TAC_TOE = MNK(3, 3, 3)
@@ -0,0 +1,119 @@
+import dbm
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+
+CACHE_PATH = "./data/moves.db"
+
+
+def _cell(row: int, col: int) -> int:
+    return row * 3 + col
+
+
+# Where each cell ends up under the 8 rotations and reflections of the board
+SYMMETRIES = [
+    [_cell(r, c) for r in range(3) for c in range(3)],  # identity
+    [_cell(c, 2 - r) for r in range(3) for c in range(3)],  # rotate 90
+    [_cell(2 - r, 2 - c) for r in range(3) for c in range(3)],  # rotate 180
+    [_cell(2 - c, r) for r in range(3) for c in range(3)],  # rotate 270
+    [_cell(r, 2 - c) for r in range(3) for c in range(3)],  # mirror
+    [_cell(2 - r, c) for r in range(3) for c in range(3)],  # flip
+    [_cell(c, r) for r in range(3) for c in range(3)],  # transpose
+    [_cell(2 - c, 2 - r) for r in range(3) for c in range(3)],  # anti transpose
+]
+INVERSES = [[perm.index(cell) for cell in range(9)] for perm in SYMMETRIES]
+
+# Every board under every symmetry, so transforming is just an index
+_TRANSFORMS = [
+    [
+        sum(1 << perm[cell] for cell in range(9) if board >> cell & 1)
+        for board in range(512)
+    ]
+    for perm in SYMMETRIES
+]
+
+
+def canonical(boards: Tuple[int, ...]) -> Tuple[Tuple[int, ...], int]:
+    # The smallest of the 8 equivalent boards and the symmetry that made it
+    return min(
+        (tuple(table[board] for board in boards), sym)
+        for sym, table in enumerate(_TRANSFORMS)
+    )
+
+
+def from_seat(boards: List[int], seat: int) -> Tuple[int, ...]:
+    # Always look at the board as the player to move
+    return tuple(boards[seat:]) + tuple(boards[:seat])
+
+
+@dataclass
+class MoveCache:
+    path: str | None = CACHE_PATH
+    maxsize: int = 4096
+    hits: int = 0
+    misses: int = 0
+    _lru: OrderedDict = field(default_factory=OrderedDict)
+    _db: object | None = None
+
+    def __post_init__(self):
+        if self.path is not None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = dbm.open(str(self.path), "c")
+
+    @staticmethod
+    def _key(boards: Tuple[int, ...]) -> bytes:
+        return struct.pack(f"!{len(boards)}H", *boards)
+
+    def _remember(self, key: bytes, position: int) -> None:
+        self._lru[key] = position
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def get(self, boards: List[int], seat: int) -> int | None:
+        board, sym = canonical(from_seat(boards, seat))
+        key = self._key(board)
+
+        position = self._lru.get(key)
+        if position is not None:
+            self._lru.move_to_end(key)
+        elif self._db is not None and (stored := self._db.get(key)) is not None:
+            position = stored[0]
+            self._remember(key, position)
+
+        if position is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return INVERSES[sym][position - 1] + 1
+
+    def contains(self, boards: List[int], seat: int) -> bool:
+        # Like get, without touching the counters or the LRU order
+        key = self._key(canonical(from_seat(boards, seat))[0])
+        return key in self._lru or (self._db is not None and key in self._db)
+
+    def put(self, boards: List[int], seat: int, position: int) -> None:
+        board, sym = canonical(from_seat(boards, seat))
+        key = self._key(board)
+        position = SYMMETRIES[sym][position - 1] + 1
+
+        self._remember(key, position)
+        if self._db is not None:
+            self._db[key] = bytes([position])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._lru),
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,286 @@
+import json
+import struct
+from enum import IntEnum
+from socket import socket
+from typing import List, NamedTuple, Tuple
+
+# A binary client opens with MAGIC and the server echoes it back, anything
+# else (like somebody typing their name into nc) stays on the text protocol.
+MAGIC = b"TTT\x02"
+
+# Every binary frame is a 2 byte payload length, a 1 byte kind and the payload
+HEADER = struct.Struct("!HB")
+MAX_PAYLOAD = 0xFFFF
+# Longest thing a client has any business sending us, a name or a move
+MAX_LINE = 1024
+MOVE = struct.Struct("!H")
+BOARD = struct.Struct("!BB")
+SEAT = struct.Struct("!B")
+STATE = struct.Struct("!BBBB")
+
+# Turn sent with the final board, nobody gets to move
+GAME_OVER = 0xFF
+# Winner in a state nobody has won
+NO_WINNER = 0xFF
+
+
+class Kind(IntEnum):
+    TEXT = 1
+    MOVE = 2
+    BOARD = 3
+    SEAT = 4
+    STATE = 5
+
+
+KINDS = frozenset(Kind)
+
+
+class Status(IntEnum):
+    PLAYING = 0
+    WON = 1
+    CAT = 2
+    OVER = 3
+
+
+class State(NamedTuple):
+    boards: List[int]
+    turn: int
+    legal: int
+    status: Status
+    winner: int | None = None  # seat, once status is WON
+
+    def moves(self) -> List[int]:
+        return [
+            pos + 1 for pos in range(self.legal.bit_length()) if self.legal >> pos & 1
+        ]
+
+    def to_json(self, msg: str = "") -> str:
+        return json.dumps(
+            {
+                "boards": self.boards,
+                "turn": None if self.turn == GAME_OVER else self.turn,
+                "legal": self.moves(),
+                "status": self.status.name.lower(),
+                "winner": self.winner,
+                "message": msg,
+            }
+        )
+
+
+Frame = Tuple[Kind, bytes]
+
+
+def encode(kind: Kind, payload: bytes) -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Payload too big: {len(payload)} bytes.")
+    return HEADER.pack(len(payload), kind) + payload
+
+
+def encode_text(msg: str) -> bytes:
+    return encode(Kind.TEXT, msg.encode())
+
+
+def encode_move(position: int) -> bytes:
+    return encode(Kind.MOVE, MOVE.pack(position))
+
+
+def encode_seat(seat: int) -> bytes:
+    return encode(Kind.SEAT, SEAT.pack(seat))
+
+
+def encode_board(boards: List[int], turn: int, size: int = 9) -> bytes:
+    # Two uint16 bitboards for tic tac toe, wider for bigger grids
+    width = (size + 7) // 8
+    payload = BOARD.pack(turn, width) + b"".join(
+        board.to_bytes(width, "big") for board in boards
+    )
+    return encode(Kind.BOARD, payload)
+
+
+def make_state(
+    boards: List[int],
+    turn: int,
+    status: Status,
+    size: int = 9,
+    winner: int | None = None,
+) -> State:
+    taken = 0
+    for board in boards:
+        taken |= board
+    legal = ~taken & ((1 << size) - 1) if status == Status.PLAYING else 0
+    return State(list(boards), turn, legal, status, winner)
+
+
+def encode_state(state: State, size: int = 9) -> bytes:
+    # Like a board, plus the legal moves as one more bitboard, the status and
+    # who won
+    width = (size + 7) // 8
+    winner = NO_WINNER if state.winner is None else state.winner
+    payload = STATE.pack(state.turn, state.status, width, winner) + b"".join(
+        board.to_bytes(width, "big") for board in [state.legal, *state.boards]
+    )
+    return encode(Kind.STATE, payload)
+
+
+def decode_move(frame: Frame) -> int:
+    kind, payload = frame
+    match kind:
+        case Kind.MOVE:
+            return MOVE.unpack(payload)[0]
+        case Kind.TEXT:
+            return int(payload.decode())
+        case _:
+            raise ValueError(f"Expected a move, got {kind.name}.")
+
+
+def decode_seat(payload: bytes) -> int:
+    return SEAT.unpack(payload)[0]
+
+
+def decode_board(payload: bytes) -> Tuple[List[int], int]:
+    turn, width = BOARD.unpack_from(payload)
+    boards = [
+        int.from_bytes(payload[start : start + width], "big")
+        for start in range(BOARD.size, len(payload), width)
+    ]
+    return boards, turn
+
+
+def decode_state(payload: bytes) -> State:
+    turn, status, width, winner = STATE.unpack_from(payload)
+    legal, *boards = [
+        int.from_bytes(payload[start : start + width], "big")
+        for start in range(STATE.size, len(payload), width)
+    ]
+    winner = None if winner == NO_WINNER else winner
+    return State(boards, turn, legal, Status(status), winner)
+
+
+class ProtocolError(ConnectionResetError):
+    # Whoever sent it gets treated as having hung up
+    pass
+
+
+class FrameDecoder:
+    # Reads straight into a preallocated buffer and hands out complete
+    # frames, however TCP decided to split or glue them together. Frames
+    # bigger than limit are refused instead of buffered.
+    LIMIT = MAX_PAYLOAD
+
+    def __init__(self, size: int = 4096, limit: int | None = None):
+        self.limit = self.LIMIT if limit is None else limit
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def _make_room(self, need: int) -> None:
+        if len(self._buffer) - self._end >= need:
+            return
+        pending = len(self)
+        if len(self._buffer) < pending + need:
+            # Only happens for frames bigger than the buffer
+            self._view.release()
+            self._buffer.extend(bytes(max(len(self._buffer), need)))
+            self._view = memoryview(self._buffer)
+        self._buffer[:pending] = self._buffer[self._start : self._end]
+        self._start, self._end = 0, pending
+
+    def recv_into(self, conn: socket, size: int = 4096) -> int:
+        self._make_room(size)
+        received = conn.recv_into(self._view[self._end :], size)
+        self._end += received
+        return received
+
+    def feed(self, data: bytes) -> None:
+        self._make_room(len(data))
+        self._buffer[self._end : self._end + len(data)] = data
+        self._end += len(data)
+
+    def next_frame(self) -> Frame | None:
+        if len(self) < HEADER.size:
+            return None
+        length, kind = HEADER.unpack_from(self._buffer, self._start)
+        if kind not in KINDS:
+            raise ProtocolError(f"Unknown frame kind {kind}")
+        if length > self.limit:
+            raise ProtocolError(f"Frame of {length} bytes, {self.limit} at most")
+        end = self._start + HEADER.size + length
+        if end > self._end:
+            return None
+
+        payload = bytes(self._view[self._start + HEADER.size : end])
+        self._start = end
+        if self._start == self._end:
+            self._start = self._end = 0
+        return Kind(kind), payload
+
+    def __iter__(self):
+        while (frame := self.next_frame()) is not None:
+            yield frame
+
+
+class LineDecoder(FrameDecoder):
+    # The text protocol, every newline terminated line is a TEXT frame
+    LIMIT = MAX_LINE
+
+    def next_frame(self) -> Frame | None:
+        end = self._buffer.find(b"\n", self._start, self._end)
+        if end == -1 and len(self) <= self.limit:
+            return None
+        if end == -1 or end - self._start > self.limit:
+            raise ProtocolError(f"Line longer than {self.limit} bytes")
+
+        line = bytes(self._view[self._start : end]).rstrip(b"\r")
+        self._start = end + 1
+        if self._start == self._end:
+            self._start = self._end = 0
+        return Kind.TEXT, line
+
+
+def sniff(data: bytes) -> FrameDecoder | None:
+    # None means we can't tell yet, wait for more bytes
+    if len(data) < len(MAGIC) and MAGIC.startswith(data):
+        return None
+
+    if data.startswith(MAGIC):
+        # Clients only send names and moves
+        decoder = FrameDecoder(limit=MAX_LINE)
+        data = data[len(MAGIC) :]
+    else:
+        decoder = LineDecoder()
+    decoder.feed(data)
+    return decoder
+
+
+def negotiate(conn: socket) -> FrameDecoder:
+    # Server side, call once the greeting has been sent
+    data = b""
+    while (decoder := sniff(data)) is None:
+        chunk = conn.recv(len(MAGIC) - len(data))
+        if not chunk:
+            raise ConnectionResetError("Disconnected before saying anything.")
+        data += chunk
+
+    if not isinstance(decoder, LineDecoder):
+        conn.sendall(MAGIC)
+    return decoder
+
+
+def greet(conn: socket, name: str) -> FrameDecoder:
+    # Client side, switch to the binary protocol and skip the text greeting
+    conn.sendall(MAGIC + encode_text(name))
+
+    data = b""
+    while (found := data.find(MAGIC)) == -1:
+        chunk = conn.recv(4096)
+        if not chunk:
+            raise ConnectionResetError("Server hung up during the greeting.")
+        data += chunk
+
+    decoder = FrameDecoder()
+    decoder.feed(data[found + len(MAGIC) :])
+    return decoder
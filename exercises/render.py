@@ -0,0 +1,37 @@
+from functools import lru_cache
+from string import ascii_lowercase
+from typing import Callable, Tuple
+
+BOARD_TEMPLATE = """
+ {0} | {1} | {2}
+-----------
+ {3} | {4} | {5}
+-----------
+ {6} | {7} | {8}\n
+""".format
+
+
+def symbol(player: int) -> str:
+    return ascii_lowercase[player]
+
+
+# Only a few thousand 3x3 boards are reachable so they all fit
+@lru_cache(maxsize=8192)
+def render_board(
+    boards: Tuple[int, ...], template: Callable[..., str] = BOARD_TEMPLATE
+) -> str:
+    symbols = []
+    for pos in range(9):
+        mask = 1 << pos
+        cell = " "
+        for idx, board in enumerate(boards):
+            if board & mask:
+                cell = symbol(idx)
+                break
+        symbols.append(cell)
+
+    return template(*symbols)
+
+
+def delta(player: int, position: int) -> str:
+    return f"{symbol(player)} took {position}\n"
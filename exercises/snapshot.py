@@ -0,0 +1,306 @@
+import os
+import struct
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, List, Tuple
+
+from mnk_bits import MNK, TIC_TAC_TOE
+from state_machine_game import Game as WordGame
+from state_machine_game import Player as WordPlayer
+from state_machine_game import State
+from tic_tac_toe_bits_sockets import Game, Player, Rules
+from word_index import WordIndex
+
+SNAPSHOT_PATH = "./data/games.snap"
+CHECKPOINT_PATH = "./data/word_game.ckpt"
+
+COUNT = struct.Struct("<I")
+NOBODY = 0xFFFFFFFF
+
+# Tic tac toe: magic, width, height, k, bytes per board and number of games,
+# followed by the string table of player names and then the games
+GAMES_MAGIC = b"TTS\x02"
+GAMES_HEADER = struct.Struct("<4sBBBBI")
+# game id, turns taken, seat to move, players and the last move's seat (or
+# NO_SEAT) and position. Each player is then a name and a token (indices
+# into the string table), skips in a row and a packed board.
+GAME = struct.Struct("<IHBBBH")
+SEAT = struct.Struct("<IIB")
+NO_SEAT = 0xFF
+
+# Word game: magic, then chunks. The first chunk has the whole game, every
+# one after it only what changed. Each chunk is its length, the winner (a
+# string index or NOBODY), how many player and guess records it holds, new
+# strings for the table, the records and finally the latest preformed.
+CHECKPOINT_MAGIC = b"WGC\x01"
+CHUNK = struct.Struct("<IIII")
+# name (string index), tries left, confirmed
+PLAYER = struct.Struct("<IiB")
+
+
+def pack_strings(strings: List[str]) -> bytes:
+    encoded = [s.encode() for s in strings]
+    lengths = struct.pack(f"<{len(encoded)}I", *map(len, encoded))
+    return COUNT.pack(len(encoded)) + lengths + b"".join(encoded)
+
+
+def unpack_strings(data: bytes, offset: int = 0) -> Tuple[List[str], int]:
+    (n,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    lengths = struct.unpack_from(f"<{n}I", data, offset)
+    offset += n * COUNT.size
+    strings = []
+    for length in lengths:
+        strings.append(data[offset : offset + length].decode())
+        offset += length
+    return strings, offset
+
+
+@dataclass
+class StringTable:
+    # Every string once, records refer to them by index
+    index: Dict[str, int] = field(default_factory=dict)
+    new: List[str] = field(default_factory=list)
+
+    def __getitem__(self, s: str) -> int:
+        if (n := self.index.get(s)) is None:
+            n = self.index[s] = len(self.index)
+            self.new.append(s)
+        return n
+
+    def pack_new(self) -> bytes:
+        # Only what hasn't been written yet
+        packed = pack_strings(self.new)
+        self.new = []
+        return packed
+
+
+def snapshot_games(games: Iterable[Game], grid: MNK | None = None) -> bytes:
+    games = list(games)
+    if grid is None:
+        grid = games[0].rules.grid if games else TIC_TAC_TOE
+    width = (grid.size + 7) // 8
+    names = StringTable()
+    records = []
+    for game in games:
+        last_seat, last_position = game._last_move or (NO_SEAT, 0)
+        records.append(
+            GAME.pack(
+                game.game_id,
+                game._turns,
+                game._turn,
+                len(game._players),
+                last_seat,
+                last_position,
+            )
+        )
+        for player in game._players:
+            records.append(
+                SEAT.pack(names[player.name], names[player.token], player.skips)
+            )
+            records.append(player._board.to_bytes(width, "little"))
+    header = GAMES_HEADER.pack(
+        GAMES_MAGIC, grid.width, grid.height, grid.k, width, len(games)
+    )
+    return header + names.pack_new() + b"".join(records)
+
+
+def restore_games(
+    data: bytes, rules: Rules, factory: Callable[..., Game] = Game
+) -> List[Game]:
+    # Players come back without a connection, they're matched up again by
+    # token when they reconnect
+    magic, grid_width, height, k, width, n = GAMES_HEADER.unpack_from(data)
+    if magic != GAMES_MAGIC:
+        raise ValueError("Not a tic tac toe snapshot")
+    grid = rules.grid
+    if (grid.width, grid.height, grid.k) != (grid_width, height, k):
+        raise ValueError(f"Snapshot is for a {grid_width}x{height} board")
+    names, offset = unpack_strings(data, GAMES_HEADER.size)
+
+    games = []
+    from_bytes = int.from_bytes
+    for _ in range(n):
+        game_id, turns, turn, seats, last_seat, last_position = GAME.unpack_from(
+            data, offset
+        )
+        offset += GAME.size
+        players = []
+        for _ in range(seats):
+            name, token, skips = SEAT.unpack_from(data, offset)
+            offset += SEAT.size
+            board = from_bytes(data[offset : offset + width], "little")
+            offset += width
+            players.append(
+                Player(
+                    None,
+                    None,
+                    names[name],
+                    board,
+                    _decoder=None,
+                    skips=skips,
+                    token=names[token],
+                )
+            )
+        last_move = None if last_seat == NO_SEAT else (last_seat, last_position)
+        games.append(
+            factory(
+                rules,
+                _players=players,
+                game_id=game_id,
+                _turns=turns,
+                _turn=turn,
+                _last_move=last_move,
+            )
+        )
+    return games
+
+
+def save_games(
+    games: Iterable[Game], path: str = SNAPSHOT_PATH, grid: MNK | None = None
+) -> int:
+    # Written next to the old one and swapped in, a crash mid write leaves
+    # the last good snapshot alone
+    data = snapshot_games(games, grid)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+    return len(data)
+
+
+def load_games(
+    rules: Rules, path: str = SNAPSHOT_PATH, factory: Callable[..., Game] = Game
+) -> List[Game]:
+    return restore_games(Path(path).read_bytes(), rules, factory)
+
+
+@dataclass
+class Checkpoint:
+    # Appends what changed in a word game since the last write. A new game,
+    # or compact(), starts the file over.
+    path: str = CHECKPOINT_PATH
+    _file: BinaryIO | None = None
+    _state: State | None = None
+    _strings: StringTable = field(default_factory=StringTable)
+    _players: Dict[str, tuple] = field(default_factory=dict)
+    _guesses: int = 0
+
+    def write(self, state: State) -> int:
+        started = state is not self._state
+        if started:
+            self._start(state)
+        strings = self._strings
+
+        players = []
+        for name, player in state.players.items():
+            row = (player.tires, name in state.confirmed)
+            if self._players.get(name) != row:
+                self._players[name] = row
+                players.append(PLAYER.pack(strings[name], *row))
+        # Guesses are only ever added, and in order
+        guesses = [strings[g] for g in islice(state.guesses, self._guesses, None)]
+        self._guesses = len(state.guesses)
+        winner = NOBODY if state.winner is None else strings[state.winner.name]
+
+        body = (
+            strings.pack_new()
+            + b"".join(players)
+            + struct.pack(f"<{len(guesses)}I", *guesses)
+            + pack_strings([state.preformed])
+        )
+        chunk = (
+            CHUNK.pack(CHUNK.size + len(body), winner, len(players), len(guesses))
+            + body
+        )
+        self._file.write(chunk)
+        self._file.flush()
+        if started:
+            # The old file stays put until the new one has a whole game in it
+            os.replace(f"{self.path}.partial", self.path)
+        return len(chunk)
+
+    def _start(self, state: State) -> None:
+        self.close()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(f"{self.path}.partial", "wb")
+        self._file.write(CHECKPOINT_MAGIC)
+        self._state = state
+        self._strings = StringTable()
+        self._strings[state.answer]  # always string 0
+        self._players = {}
+        self._guesses = 0
+
+    def compact(self, state: State) -> int:
+        # Player records pile up as their tries go down, this writes each once
+        self._state = None
+        return self.write(state)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def restore_state(data: bytes) -> State:
+    if data[: len(CHECKPOINT_MAGIC)] != CHECKPOINT_MAGIC:
+        raise ValueError("Not a word game checkpoint")
+    strings: List[str] = []
+    players: Dict[str, WordPlayer] = {}
+    confirmed = set()
+    guesses: Dict[str, None] = {}
+    preformed, winner = "nothing", NOBODY
+
+    offset = len(CHECKPOINT_MAGIC)
+    while offset + CHUNK.size <= len(data):
+        length, winner_index, n_players, n_guesses = CHUNK.unpack_from(data, offset)
+        if offset + length > len(data):
+            break  # the last write never finished, everything before it did
+        new, at = unpack_strings(data, offset + CHUNK.size)
+        strings.extend(new)
+        for name, tries, is_confirmed in PLAYER.iter_unpack(
+            data[at : at + n_players * PLAYER.size]
+        ):
+            name = strings[name]
+            if name in players:
+                players[name].tires = tries
+            else:
+                players[name] = WordPlayer(name, tries)
+            if is_confirmed:
+                confirmed.add(name)
+        at += n_players * PLAYER.size
+        indices = struct.unpack_from(f"<{n_guesses}I", data, at)
+        guesses.update(dict.fromkeys(map(strings.__getitem__, indices)))
+        [preformed], _ = unpack_strings(data, at + n_guesses * COUNT.size)
+        winner = winner_index
+        offset += length
+
+    if not strings:
+        raise ValueError("Checkpoint is empty")
+    return State(
+        answer=strings[0],
+        players=players,
+        confirmed=confirmed,
+        guesses=guesses,
+        preformed=preformed,
+        winner=None if winner == NOBODY else players[strings[winner]],
+    )
+
+
+def load_word_game(
+    path: str = CHECKPOINT_PATH, words: WordIndex | None = None
+) -> WordGame:
+    # Penalties last a second, nobody misses them after a restart
+    state = restore_state(Path(path).read_bytes())
+    game = WordGame(state.answer, words)
+    state._penalty = game.state._penalty
+    game.state = state
+    return game
@@ -6,6 +6,8 @@ from time import sleep
 
 from rich.logging import RichHandler
 
+from protocol import LineDecoder
+
 level = logging.DEBUG
 
 logging.basicConfig(
@@ -24,9 +26,13 @@ def client_game(conn, answer):
     # We could pass in all the other players and let them know they'v lost if
     # the correct answer is guessed
     conn.sendall(b"Guess a number between 1 and 10\n")
+    decoder = LineDecoder(64)
     while True:
         try:
-            guess = conn.recv(1024).strip()
+            while (frame := decoder.next_frame()) is None:
+                if not decoder.recv_into(conn, 64):
+                    raise ConnectionResetError
+            guess = frame[1].strip()
             logger.info(f"Received {guess}")
             if guess:
                 if int(guess) == answer:
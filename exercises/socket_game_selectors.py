@@ -0,0 +1,211 @@
+import logging
+import selectors
+import socket
+from dataclasses import dataclass, field
+from random import Random
+
+from rich.logging import RichHandler
+
+from metrics import registry
+
+level = logging.DEBUG
+
+logging.basicConfig(
+    level=level,
+    format="%(message)s",
+    datefmt="[%X]",
+    handlers=[RichHandler(rich_tracebacks=True)],
+)
+
+logger = logging.getLogger(__name__)
+
+# Nobody needs more than this to type a number
+MAX_LINE = 64
+# Anybody this far behind on reading our replies isn't coming back
+MAX_OUTBOX = 64 * 1024
+
+
+@dataclass(slots=True)
+class Guesser:
+    conn: socket.socket
+    addr: tuple
+    inbox: bytearray = field(default_factory=bytearray)
+    outbox: bytearray = field(default_factory=bytearray)
+    guesses: int = 0
+    writing: bool = False
+
+
+@dataclass
+class GuessServer:
+    host: str = "0.0.0.0"
+    port: int = 4227
+    low: int = 1
+    high: int = 10
+    rnd: Random = field(default_factory=lambda: Random(0))
+    answer: int = 0
+    rounds: int = 0
+    outbox_limit: int = MAX_OUTBOX
+    _selector: selectors.BaseSelector = field(default_factory=selectors.DefaultSelector)
+    _players: dict = field(default_factory=dict)
+    _server: socket.socket | None = None
+
+    @property
+    def prompt(self) -> bytes:
+        return f"Guess a number between {self.low} and {self.high}\n".encode()
+
+    def start(self) -> socket.socket:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        server.listen(socket.SOMAXCONN)
+        server.setblocking(False)
+        self._selector.register(server, selectors.EVENT_READ)
+        self._server = server
+        self.new_round()
+        return server
+
+    def new_round(self) -> None:
+        self.answer = self.rnd.randint(self.low, self.high)
+        self.rounds += 1
+        registry.inc("rounds")
+        logger.info(f"Round {self.rounds}, answer is {self.answer} 🎉")
+
+    def accept(self) -> None:
+        # Drain the whole backlog, there could be a lot of people arriving
+        while True:
+            try:
+                conn, addr = self._server.accept()
+            except BlockingIOError:
+                return
+            conn.setblocking(False)
+            registry.inc("connections")
+            player = Guesser(conn, addr)
+            self._players[conn.fileno()] = player
+            self._selector.register(conn, selectors.EVENT_READ, player)
+            self.send(player, self.prompt)
+
+    def send(self, player: Guesser, data: bytes) -> None:
+        if len(player.outbox) + len(data) > self.outbox_limit:
+            # Every reply matters to them, so there's nothing we could skip
+            registry.inc("slow_consumers")
+            logger.info(f"{player.addr} isn't reading, dropping them")
+            self.drop(player)
+            return
+        was_empty = not player.outbox
+        player.outbox += data
+        if was_empty:
+            self.write(player)
+
+    def write(self, player: Guesser) -> None:
+        try:
+            sent = player.conn.send(player.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.drop(player)
+            return
+        del player.outbox[:sent]
+
+        # Only wait for writability while something is stuck in the outbox
+        if bool(player.outbox) != player.writing:
+            player.writing = bool(player.outbox)
+            events = selectors.EVENT_READ
+            if player.writing:
+                events |= selectors.EVENT_WRITE
+            self._selector.modify(player.conn, events, player)
+
+    def read(self, player: Guesser) -> None:
+        try:
+            data = player.conn.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(player)
+            return
+
+        player.inbox += data
+        while (end := player.inbox.find(b"\n")) != -1:
+            line = bytes(player.inbox[:end])
+            del player.inbox[: end + 1]
+            with registry.time("guess"):
+                self.guess(player, line)
+            if player.conn.fileno() == -1:
+                return
+        if len(player.inbox) > MAX_LINE:
+            logger.error(f"{player.addr} is sending garbage")
+            self.drop(player)
+
+    def guess(self, player: Guesser, line: bytes) -> None:
+        line = line.strip()
+        if not line:
+            return
+        logger.debug(f"Received {line} from {player.addr}")
+        try:
+            guess = int(line)
+        except ValueError:
+            self.send(player, b"That's not a number\n")
+            return
+
+        player.guesses += 1
+        if guess != self.answer:
+            self.send(player, b"Nope, try again\n")
+            return
+
+        self.send(player, b"You win!\n")
+        lost = (
+            f"Someone else guessed {self.answer} first, you lose!\n".encode()
+            + b"New round!\n"
+        )
+        self.broadcast(lost, skip=player)
+        self.new_round()
+        self.broadcast(self.prompt)
+
+    def broadcast(self, data: bytes, skip: Guesser | None = None) -> None:
+        for player in list(self._players.values()):
+            if player is not skip:
+                self.send(player, data)
+
+    def drop(self, player: Guesser) -> None:
+        if self._players.pop(player.conn.fileno(), None) is None:
+            return
+        self._selector.unregister(player.conn)
+        player.conn.close()
+        logger.info(f"{player.addr} left after {player.guesses} guesses")
+
+    def serve_once(self, timeout: float | None = None) -> None:
+        for key, events in self._selector.select(timeout):
+            if key.data is None:
+                self.accept()
+                continue
+            player = key.data
+            if events & selectors.EVENT_READ:
+                self.read(player)
+            if events & selectors.EVENT_WRITE and player.conn.fileno() != -1:
+                self.write(player)
+
+    def serve_forever(self) -> None:
+        if self._server is None:
+            self.start()
+        logger.info(f"Listening on {self.host}:{self.port}")
+        while True:
+            self.serve_once()
+
+    def close(self) -> None:
+        for player in list(self._players.values()):
+            self.drop(player)
+        if self._server is not None:
+            self._selector.unregister(self._server)
+            self._server.close()
+            self._server = None
+
+
+if __name__ == "__main__":
+    # nc localhost 4227 to play, join whenever you like
+    server = GuessServer()
+    registry.serve()
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
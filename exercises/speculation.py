@@ -0,0 +1,43 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Speculator:
+    # Works out answers to positions we might be in next while we'd otherwise
+    # be sat waiting, at most max_outstanding of them at a time
+    think: Callable
+    max_outstanding: int = 4
+    _pool: ThreadPoolExecutor | None = None
+    _pending: Dict[Hashable, Future] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_outstanding, thread_name_prefix="speculate"
+        )
+
+    def speculate(self, situations: Dict[Hashable, object]) -> None:
+        self.cancel()
+        for key, situation in situations.items():
+            self._pending[key] = self._pool.submit(self.think, situation)
+        logger.debug(f"Speculating on {len(situations)} positions")
+
+    def take(self, key: Hashable) -> Future | None:
+        # Whatever we didn't guess right is thrown away
+        future = self._pending.pop(key, None)
+        self.cancel()
+        return future
+
+    def cancel(self) -> None:
+        # Queued calls are dropped, running ones finish but nobody listens
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+    def close(self) -> None:
+        self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,13 +1,17 @@
 import logging
+import sys
 import time
 from collections import deque
 from dataclasses import dataclass, field
 from enum import Enum
 from random import Random
-from typing import Dict
+from typing import Dict, Set
 
 from rich.logging import RichHandler
 
+from timing_wheel import TimingWheel
+from word_index import WordIndex
+
 level = logging.DEBUG
 
 logging.basicConfig(
@@ -19,14 +23,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Seconds a player sits out after guessing a word somebody already guessed
+PENALTY = 1.0
+
 
-def get_word():
-    with open("/usr/share/dict/words") as f:
-        wordlist = (ln.strip() for ln in f)
-        wordlist = {w for w in wordlist if w.isalpha() and w.islower()}
+def get_word(words: WordIndex | None = None):
+    # The index is already sorted so this picks what choice(sorted(...)) did
+    if words is None:
+        with WordIndex.load_or_build() as words:
+            return get_word(words)
 
     rnd = Random(0)
-    answer = rnd.choice(sorted(wordlist))  # supermarket on a Ubuntu
+    answer = rnd.choice(words)  # supermarket on a Ubuntu
     return answer
 
 
@@ -46,9 +54,9 @@ class Message(Enum):
         return inst
 
 
-@dataclass
+@dataclass(slots=True)
 class Player:
-    name: str
+    name: str  # unique within a game
     tires: int = 10
 
     def __str__(self):
@@ -59,26 +67,37 @@ class Player:
 class Action:
     player: Player
     message: Message
+    # Each action keeps its own data. Message.GUESS is a singleton, so
+    # whatever with_data left on it gets copied here straight away, before
+    # the next guess overwrites it.
+    data: Dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self.data and isinstance(self.message, Message):
+            self.data = dict(self.message.data)
 
 
 @dataclass
 class State:
+    # Everything is keyed by player name so lookups don't grow with the game
     answer: str
-    players: list = field(default_factory=list)
-    confirmed: list = field(default_factory=list)
-    guesses: list = field(default_factory=list)
+    players: Dict[str, Player] = field(default_factory=dict)
+    confirmed: Set[str] = field(default_factory=set)
+    # Used as an ordered set, checkpoints only write what came after last time
+    guesses: Dict[str, None] = field(default_factory=dict)
     preformed: str = "nothing"
     winner: Player | None = None
-    _penalty: list = field(default_factory=list)
+    _penalty: TimingWheel = field(default_factory=TimingWheel)
 
 
 @dataclass
 class Game:
-    def __init__(self, answer):
-        self.state = State(answer=answer)
+    def __init__(self, answer, words: WordIndex | None = None, clock=time.monotonic):
+        self.state = State(answer=answer, _penalty=TimingWheel(clock=clock))
+        self.words = words
 
     def _validate_action(self, action):
-        logger.debug(f"validating action {action}")
+        logger.debug("validating action %s", action)
         if not isinstance(action, Action):
             logger.error("not an action")
             return False
@@ -91,11 +110,10 @@ class Game:
         return True
 
     def _confirmed(self, player):
-        return player in self.state.confirmed
+        return player.name in self.state.confirmed
 
     def _penalized(self, player):
-        # TODO: write penalty logic
-        return False
+        return player.name in self.state._penalty
 
     def process(self, action):
         if not self._validate_action(action):
@@ -104,18 +122,19 @@ class Game:
 
         match action.message:
             case Message.REQUEST:
-                if action.player in self.state.players:
+                if action.player.name in self.state.players:
                     self.state.preformed = (
                         f"{action.player.name} already joined, skipping turn"
                     )
-                self.state.players.append(action.player)
+                    return
+                self.state.players[action.player.name] = action.player
                 self.state.preformed = f"{action.player.name} joined"
             case Message.CONFIRM:
                 if (
                     self._confirmed(action.player)
-                    or action.player in self.state.players
+                    or action.player.name in self.state.players
                 ):
-                    self.state.confirmed.append(action.player)
+                    self.state.confirmed.add(action.player.name)
                     self.state.preformed = f"{action.player.name} confirmed"
                 else:
                     self.state.preformed = (
@@ -132,20 +151,29 @@ class Game:
                         f"{action.player.name} penalized, skipping turn"
                     )
                     return
-                if action.message.data["word"] == self.state.answer:
+                if self.words is not None and action.data["word"] not in self.words:
+                    self.state.preformed = (
+                        f"{action.data['word']} is not a word, try again"
+                    )
+                    return
+                if action.data["word"] == self.state.answer:
                     logger.debug(f"{action.player.name} won!")
                     self.state.winner = action.player
                     self.state.preformed = f"{action.player.name} won!"
                     return self.state
-                if action.message.data["word"] in self.state.guesses:
+                if action.data["word"] in self.state.guesses:
                     self.state.preformed = (
                         f"{action.player.name} already guessed this word"
                     )
-                    self.state._penalty[action.player] = time.time()
+                    self.state._penalty.schedule(action.player.name, PENALTY)
                     action.player.tires -= 1
                     return
                 action.player.tires -= 1
-                self.state.guesses.append(action.message.data["word"])
+                self.state.preformed = (
+                    f"{action.player.name} guessed {action.data['word']}"
+                )
+                # Words arrive as fresh strings, share one copy with everybody else
+                self.state.guesses[sys.intern(action.data["word"])] = None
             case _:
                 self.state.preformed = f"unknown message {action.message.label}"
 
@@ -169,8 +197,9 @@ if __name__ == "__main__":
             Action(dad, Message.GUESS.with_data({"word": "supermarket"})),
         ]
     )
-    answer = get_word()
-    game = Game(answer).simulate()
+    words = WordIndex.load_or_build()
+    answer = get_word(words)
+    game = Game(answer, words).simulate()
     for _ in game:
         try:
             resp = game.send(actions.popleft())
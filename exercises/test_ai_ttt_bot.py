@@ -0,0 +1,79 @@
+import pytest
+
+from ai_ttt_bot import Bot, Message
+from protocol import FrameDecoder
+from speculation import Speculator
+
+
+def speculating_bot(think):
+    bot = Bot(gpt=None, conn=None, name="Boty", seat=0)
+    bot.speculator = Speculator(think)
+
+    def ask_gpt(msg):
+        pytest.fail("Asked the model for a move we already worked out")
+
+    bot._ask_gpt = ask_gpt
+    return bot
+
+
+def our_turn(boards):
+    return Message.from_board(b"Boty's turn\n", boards, 0)
+
+
+def test_speculated_move_skips_the_model():
+    thought = []
+
+    def think(msg):
+        thought.append(tuple(msg.boards))
+        return str(msg.legal[0])
+
+    bot = speculating_bot(think)
+    bot._think_ahead(our_turn([0, 0]), "1")
+    # The opponent took 5, which we already thought about
+    bot.messages.append(our_turn([0b1, 0b10000]))
+
+    assert bot.decide_action() == "2"
+    assert (0b1, 0b10000) in thought
+    assert bot.speculator._pending == {}
+    bot.speculator.close()
+
+
+@pytest.mark.parametrize(
+    "boards, action",
+    [
+        ([0b000000011, 0b000011000], "3"),  # a win
+        ([0b011100001, 0b100011010], "6"),  # fills the board
+    ],
+)
+def test_no_speculation_after_the_last_move(boards, action):
+    thought = []
+    bot = speculating_bot(thought.append)
+    bot._think_ahead(our_turn(boards), action)
+    bot.speculator.close()
+    assert bot.speculator._pending == {}
+    assert thought == []
+
+
+def test_bare_text_needs_no_model_once_seated():
+    bot = speculating_bot(lambda msg: None)
+    for text in [
+        b"Invalid move by Boty: Position already taken.\n",
+        b"b ran out of time\n",
+    ]:
+        bot.messages.append(Message.from_bytes(text))
+        assert bot.decide_action() is None
+    bot.speculator.close()
+
+
+def test_lobby_news_before_the_seat_needs_no_model():
+    bot = Bot(gpt=None, conn=None, name="Boty", _decoder=FrameDecoder())
+    bot._ask_gpt = lambda msg: pytest.fail("Asked the model about lobby news")
+    bot.messages.append(Message.from_bytes(b"Waiting for an opponent...\n"))
+    assert bot.decide_action() is None
+
+
+def test_text_sessions_still_ask_the_model():
+    bot = Bot(gpt=None, conn=None, name="Boty")
+    bot._ask_gpt = lambda msg: "5"
+    bot.messages.append(Message.from_bytes(b"What is your name?\n"))
+    assert bot.decide_action() == "5"
@@ -0,0 +1,101 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from bot_driver import (
+    OpenAICompletions,
+    RandomCompletions,
+    RateLimiter,
+    SolverCompletions,
+    run_bots,
+)
+from game_log import GameLog, GameLogReader
+from mnk_bits import TIC_TAC_TOE
+from tic_tac_toe_bits_async import Lobby
+from tic_tac_toe_bits_sockets import Rules
+from tic_tac_toe_solver import Solver
+
+
+def test_concurrency_is_capped():
+    async def run():
+        limiter = RateLimiter(concurrency=2)
+        in_flight, most = 0, 0
+
+        async def call():
+            nonlocal in_flight, most
+            async with limiter:
+                in_flight += 1
+                most = max(most, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return limiter.calls, most
+
+    assert asyncio.run(run()) == (6, 2)
+
+
+def test_calls_are_spaced_out():
+    now = 0.0
+    started = []
+
+    async def sleep(delay):
+        nonlocal now
+        now += delay
+
+    async def run():
+        limiter = RateLimiter(per_second=2, clock=lambda: now, sleep=sleep)
+        for _ in range(4):
+            async with limiter:
+                started.append(now)
+
+    asyncio.run(run())
+    assert started == [0.0, 0.5, 1.0, 1.5]
+
+
+def fake_openai():
+    # Answers like the model would, with the first free position
+    async def create(messages, model):
+        free = re.search(r"Free positions: (\d)", messages[0]["content"])
+        content = f"Action: {free[1]}" if free else "Action: None"
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
+
+    completions = SimpleNamespace(create=create)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+@pytest.mark.parametrize(
+    "completions",
+    [
+        RandomCompletions(),
+        SolverCompletions(Solver.build()),
+        OpenAICompletions(fake_openai()),
+    ],
+    ids=["random", "solver", "openai"],
+)
+def test_bots_play_whole_games(completions, tmp_path):
+    path = tmp_path / "games.log"
+
+    async def run():
+        with GameLog(path) as log:
+            lobby = Lobby(Rules(TIC_TAC_TOE.lines()), port=0, log=log)
+            server = await lobby.start()
+            port = server.sockets[0].getsockname()[1]
+            limiter = RateLimiter(concurrency=2)
+            played = await run_bots(4, 2, completions, limiter, port=port)
+            server.close()
+            return played
+
+    assert asyncio.run(run()) == 8
+    with GameLogReader(path) as reader:
+        games = list(reader.replay())
+    assert len(games) == 4
+    # Nobody runs out of time or loses a connection, every game is played out
+    for game in games:
+        assert game.turns >= 5
+    if isinstance(completions, SolverCompletions):
+        assert all(game.winner is None for game in games)
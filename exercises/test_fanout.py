@@ -0,0 +1,121 @@
+import socket
+import time
+from threading import Thread
+
+from fanout import Fanout, Outbox, SlowConsumer
+from mnk_bits import TIC_TAC_TOE
+from tic_tac_toe_bits_sockets import Game, Rules
+
+
+def stuffed_pair():
+    # A connection whose reader never reads, with the kernel buffers full
+    ours, theirs = socket.socketpair()
+    ours.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    theirs.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    ours.setblocking(False)
+    try:
+        while True:
+            ours.send(b"x" * 4096)
+    except BlockingIOError:
+        pass
+    ours.setblocking(True)
+    return ours, theirs
+
+
+def read_all(conn, size):
+    data = b""
+    while len(data) < size:
+        data += conn.recv(65536)
+    return data
+
+
+def test_writes_straight_through():
+    ours, theirs = socket.socketpair()
+    outbox = Outbox(ours)
+    outbox.put(b"hello")
+
+    assert theirs.recv(5) == b"hello"
+    assert not outbox.pending
+
+
+def test_slow_reader_loses_old_boards():
+    ours, theirs = stuffed_pair()
+    outbox = Outbox(ours, limit=100)
+    outbox.put(b"a" * 40, droppable=True)
+    outbox.put(b"b" * 40, droppable=True)
+    outbox.put(b"!" * 10)
+    outbox.put(b"c" * 40, droppable=True)
+
+    # The first board might already be half sent so it stays
+    assert outbox.dropped == 1
+    assert outbox.queued == 90
+    assert not outbox.closed
+
+
+def test_slow_reader_disconnected():
+    ours, theirs = stuffed_pair()
+    outbox = Outbox(ours, limit=100, policy=SlowConsumer.DISCONNECT)
+    outbox.put(b"a" * 60, droppable=True)
+    outbox.put(b"b" * 60, droppable=True)
+
+    assert outbox.closed
+    outbox.put(b"ignored")
+    assert outbox.queued == 0
+
+
+def test_wait_flushes_while_waiting():
+    fanout = Fanout()
+    slow, slow_reader = stuffed_pair()
+    player, player_end = socket.socketpair()
+    fanout.send(slow, b"board")
+    assert fanout.wait([player], timeout=0.01) == []
+
+    # Reading frees up the buffer, then the board goes out by itself
+    drained = Thread(target=read_all, args=(slow_reader, 4096 + 5))
+    drained.start()
+    player_end.sendall(b"5\n")
+    assert fanout.wait([player], timeout=1) == [player]
+    fanout.drain(timeout=1)
+    drained.join(timeout=1)
+    assert not drained.is_alive()
+
+
+def connect(port, name):
+    conn = socket.create_connection(("127.0.0.1", port))
+    conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    conn.recv(1024)
+    conn.sendall(f"{name}\n".encode())
+    return conn
+
+
+def read_until(conn, text):
+    data = b""
+    while text.encode() not in data:
+        chunk = conn.recv(1024)
+        assert chunk, data
+        data += chunk
+    return data.decode()
+
+
+def test_spectators_dont_hold_up_the_game():
+    game = Game(Rules(TIC_TAC_TOE.lines()), host="127.0.0.1", port=0)
+    thread = Thread(target=game.init, daemon=True)
+    thread.start()
+    while game._server is None:
+        time.sleep(0.01)
+    port = game._server.getsockname()[1]
+
+    lurker = connect(port, "lurker /watch")  # never reads a thing
+    a = connect(port, "a")
+    b = connect(port, "b")
+    read_until(a, "a's turn")
+    late = socket.create_connection(("127.0.0.1", port))
+    for player, move in [(a, 1), (b, 4), (a, 2), (b, 5), (a, 3)]:
+        player.sendall(f"{move}\n".encode())
+
+    assert "You're watching a, b" in read_until(late, "a won!")
+    assert "a won!" in read_until(b, "Thanks for playing!")
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert len(game.spectators) == 2
+    lurker.close()
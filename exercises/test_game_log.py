@@ -0,0 +1,69 @@
+from game_log import GameLog, GameLogReader, RECORD
+
+
+def play(log, game_id, moves, winner):
+    for turn, (player, position) in enumerate(moves):
+        log.record(game_id, turn, player, position)
+    log.end(game_id, len(moves), winner)
+
+
+def test_records_are_fixed_width(tmp_path):
+    path = tmp_path / "games.log"
+    with GameLog(path) as log:
+        play(log, 1, [(0, 1), (1, 4), (0, 2), (1, 5), (0, 3)], 0)
+
+    assert RECORD.size == 16
+    assert path.stat().st_size == 6 * RECORD.size
+
+
+def test_boards_at(tmp_path):
+    path = tmp_path / "games.log"
+    with GameLog(path) as log:
+        play(log, 1, [(0, 1), (1, 4), (0, 2), (1, 5), (0, 3)], 0)
+
+    with GameLogReader(path) as reader:
+        assert reader.boards_at(1, 0) == [0, 0]
+        assert reader.boards_at(1, 2) == [0b1, 0b1000]
+        assert reader.boards_at(1) == [0b111, 0b11000]
+
+
+def test_replay_interleaved_games(tmp_path):
+    path = tmp_path / "games.log"
+    with GameLog(path) as log:
+        log.record(1, 0, 0, 5)
+        log.record(2, 0, 0, 1)
+        log.record(1, 1, 1, 9)
+        log.end(2, 1, None)
+        log.end(1, 2, 1)
+
+    with GameLogReader(path) as reader:
+        games = [(g.game_id, g.boards, g.turns, g.winner) for g in reader.replay()]
+
+    assert games == [(2, [0b1, 0], 1, None), (1, [0b10000, 1 << 8], 2, 1)]
+
+
+def test_partial_records_are_ignored(tmp_path):
+    path = tmp_path / "games.log"
+    path.write_bytes(b"")
+    with GameLogReader(path) as reader:
+        assert list(reader) == []
+
+    with GameLog(path) as log:
+        log.record(1, 0, 0, 5)
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 3)
+
+    with GameLogReader(path) as reader:
+        assert len(reader) == 1
+
+
+def test_next_id_is_past_every_game(tmp_path):
+    path = tmp_path / "games.log"
+    log = GameLog(path)
+    assert log.next_id() == 0
+    with log:
+        log.record(7, 0, 0, 5)
+        log.record(8, 0, 0, 1)
+        # The newest game isn't the last to write
+        log.record(7, 1, 1, 9)
+        assert log.next_id() == 9
@@ -0,0 +1,24 @@
+from game_runner import GameRunner, simulate
+
+
+def test_every_game_gets_a_winner():
+    with GameRunner(workers=2, batch_size=16, max_in_flight=2) as runner:
+        simulate(runner, games=20, players=3, guesses=4)
+
+    assert runner.processed == 20 * (1 + 3 * 2 + 3 * 4)
+    assert runner.winners == {game_id: "player 0" for game_id in range(20)}
+
+
+def test_games_stay_on_their_shard():
+    with GameRunner(workers=3, batch_size=4) as runner:
+        for game_id in range(6):
+            runner.start_game(game_id, "pear")
+            runner.submit(game_id, "iris", "request")
+            runner.submit(game_id, "iris", "confirm")
+        # Only the odd games get the right answer
+        for game_id in range(6):
+            runner.submit(game_id, "iris", "guess", "pear" if game_id % 2 else "fig")
+        runner.wait()
+
+        assert runner.winners == {1: "iris", 3: "iris", 5: "iris"}
+        assert [runner.shard(game_id) for game_id in range(6)] == [0, 1, 2, 0, 1, 2]
@@ -0,0 +1,43 @@
+import asyncio
+from random import Random
+
+import pytest
+from load_generator import percentile, run, think_time
+from mnk_bits import TIC_TAC_TOE
+from tic_tac_toe_bits_async import Lobby
+from tic_tac_toe_bits_sockets import Rules
+
+
+def test_think_time():
+    rnd = Random(0)
+    assert think_time("none", rnd)() == 0.0
+    assert think_time("fixed:0.5", rnd)() == 0.5
+    assert 0.1 <= think_time("uniform:0.1,0.2", rnd)() <= 0.2
+    with pytest.raises(ValueError):
+        think_time("uniform:0.1", rnd)
+
+
+def test_percentile():
+    samples = [float(n) for n in range(1, 101)]
+    assert percentile(samples, 50) == 51.0
+    assert percentile(samples, 99) == 100.0
+    assert percentile([3.0], 95) == 3.0
+
+
+async def load_lobby(clients, games, invalid):
+    lobby = Lobby(Rules(winning_conditions=TIC_TAC_TOE.lines()), port=0)
+    server = await lobby.start()
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return await run("tic_tac_toe", clients, games, port=port, invalid=invalid)
+    finally:
+        server.close()
+
+
+def test_lobby_under_load():
+    summary = asyncio.run(load_lobby(clients=20, games=2, invalid=0.2))
+
+    assert summary["errors"] == 0
+    assert summary["games"] == 40
+    assert summary["invalid"] > 0
+    assert summary["latency"]["turn"]["n"] == summary["moves"] - summary["invalid"]
@@ -0,0 +1,48 @@
+from urllib.request import urlopen
+
+from metrics import Registry
+
+
+def test_histogram_buckets():
+    registry = Registry(prefix="test_")
+    histogram = registry.histogram("recv")
+    for value in (0.00001, 0.00005, 0.0003, 100):
+        histogram.observe(value)
+
+    text = registry.render()
+    assert 'test_recv_seconds_bucket{le="5e-05"} 2' in text
+    assert 'test_recv_seconds_bucket{le="0.0004"} 3' in text
+    assert 'test_recv_seconds_bucket{le="+Inf"} 4' in text
+    assert "test_recv_seconds_count 4" in text
+
+
+def test_timers_and_counters():
+    registry = Registry(prefix="test_")
+    with registry.time("move"):
+        pass
+    registry.inc("games")
+    registry.inc("games", 2)
+
+    assert registry.histogram("move").count == 1
+    assert "test_games_total 3" in registry.render()
+
+
+def test_disabled_records_nothing():
+    registry = Registry(enabled=False)
+    with registry.time("move"):
+        pass
+    registry.inc("games")
+
+    assert registry.render() == "\n"
+
+
+def test_endpoint():
+    registry = Registry(prefix="test_")
+    registry.inc("connections")
+    server = registry.serve(port=0)
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as resp:
+            assert "test_connections_total 1" in resp.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
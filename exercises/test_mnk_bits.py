@@ -0,0 +1,55 @@
+import pytest
+from mnk_bits import MNK, TIC_TAC_TOE
+
+
+def test_tic_tac_toe_lines():
+    assert sorted(TIC_TAC_TOE.lines()) == sorted(
+        [
+            0b111000000,
+            0b000111000,
+            0b000000111,
+            0b100100100,
+            0b010010010,
+            0b001001001,
+            0b100010001,
+            0b001010100,
+        ]
+    )
+
+
+@pytest.mark.parametrize("grid", [MNK(3, 3, 3), MNK(4, 3, 3), MNK(3, 4, 2)])
+def test_sweeps_match_lines(grid):
+    lines = grid.lines()
+    for board in range(1 << grid.size):
+        expected = any(board & line == line for line in lines)
+        # Small boards answer from the table, check the sweep it came from too
+        assert grid.won(board) == grid._swept(board) == expected
+
+
+def test_gomoku_lines():
+    assert len(MNK(15, 15, 5).lines()) == 572
+
+
+def test_gomoku_won():
+    grid = MNK(15, 15, 5)
+    diagonal = sum(1 << (row * 15 + row + 3) for row in range(5))
+    wrapped = sum(1 << position for position in range(12, 17))
+
+    assert grid.won(diagonal)
+    assert not grid.won(diagonal & ~(1 << 35))
+    assert not grid.won(wrapped)
+
+
+def test_move():
+    grid = MNK(15, 15, 5)
+
+    assert grid.move([0, 0], 225, 1) == [0, 1 << 224]
+    with pytest.raises(ValueError, match="Must be between 1 and 225."):
+        grid.move([0, 0], 226, 0)
+    with pytest.raises(ValueError, match="Position already taken."):
+        grid.move([0, 1], 1, 0)
+
+
+def test_impossible_k():
+    with pytest.raises(ValueError):
+        MNK(3, 3, 4)
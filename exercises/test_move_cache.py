@@ -0,0 +1,40 @@
+from move_cache import MoveCache, canonical
+
+
+def test_symmetric_boards_share_a_key():
+    corners = [0b000000001, 0b000000100, 0b001000000, 0b100000000]
+
+    assert len({canonical((corner, 0b000010000))[0] for corner in corners}) == 1
+
+
+def test_moves_are_mapped_back():
+    cache = MoveCache(path=None)
+    # a in the top left, b in the middle, a takes the opposite corner
+    cache.put([0b000000001, 0b000010000], 0, 9)
+
+    assert cache.get([0b000000100, 0b000010000], 0) == 7
+    assert cache.get([0b100000000, 0b000010000], 0) == 1
+    assert cache.get([0b000010000, 0b001000000], 1) == 3
+    assert cache.get([0b000000010, 0b000010000], 0) is None
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_evicts_oldest():
+    cache = MoveCache(path=None, maxsize=1)
+    cache.put([0b1, 0], 1, 5)
+    cache.put([0b10000, 0], 1, 1)
+
+    assert cache.get([0b1, 0], 1) is None
+    assert cache.get([0b10000, 0], 1) == 1
+
+
+def test_survives_restarts(tmp_path):
+    path = tmp_path / "moves.db"
+    cache = MoveCache(path)
+    cache.put([0b1, 0b10000], 0, 9)
+    cache.close()
+
+    cache = MoveCache(path)
+    assert cache.get([0b1, 0b10000], 0) == 9
+    cache.close()
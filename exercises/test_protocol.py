@@ -0,0 +1,163 @@
+import json
+from socket import socketpair
+from threading import Thread
+
+import pytest
+from protocol import (
+    MAGIC,
+    FrameDecoder,
+    Kind,
+    GAME_OVER,
+    HEADER,
+    MAX_LINE,
+    LineDecoder,
+    ProtocolError,
+    Status,
+    decode_board,
+    decode_move,
+    decode_state,
+    encode_board,
+    encode_move,
+    encode_state,
+    encode_text,
+    greet,
+    make_state,
+    negotiate,
+    sniff,
+)
+
+
+def test_fragmented_frames():
+    data = encode_text("hello") + encode_move(5) + encode_board([3, 24], 1)
+    decoder = FrameDecoder(8)
+    frames = []
+    for byte in data:
+        decoder.feed(bytes([byte]))
+        frames.extend(decoder)
+
+    assert [kind for kind, _ in frames] == [Kind.TEXT, Kind.MOVE, Kind.BOARD]
+    assert frames[0][1] == b"hello"
+    assert decode_move(frames[1]) == 5
+    assert decode_board(frames[2][1]) == ([3, 24], 1)
+
+
+def test_frames_bigger_than_the_buffer():
+    decoder = FrameDecoder(16)
+    decoder.feed(encode_text("x" * 1000) * 2)
+
+    assert [len(payload) for _, payload in decoder] == [1000, 1000]
+
+
+def test_board_is_two_uint16s():
+    assert len(encode_board([0b111000000, 0b000111000], 0)) == 3 + 2 + 4
+
+
+def test_state_round_trip():
+    state = make_state([0b000010001, 0b100000000], 1, Status.PLAYING)
+    decoder = FrameDecoder()
+    decoder.feed(encode_state(state))
+    kind, payload = decoder.next_frame()
+
+    assert kind == Kind.STATE
+    assert decode_state(payload) == state
+    assert state.moves() == [2, 3, 4, 6, 7, 8]
+
+
+def test_no_moves_when_over():
+    state = make_state([0b000000111, 0b000011000], GAME_OVER, Status.WON)
+
+    assert state.moves() == []
+    assert '"turn": null' in state.to_json()
+
+
+def test_state_says_who_won():
+    state = make_state([0b000011000, 0b000000111], GAME_OVER, Status.WON, winner=1)
+    decoder = FrameDecoder()
+    decoder.feed(encode_state(state))
+    _, payload = decoder.next_frame()
+
+    assert decode_state(payload).winner == 1
+    assert json.loads(state.to_json())["winner"] == 1
+    playing = make_state([0b1, 0b10], 0, Status.PLAYING)
+    decoder.feed(encode_state(playing))
+    assert decode_state(decoder.next_frame()[1]).winner is None
+
+
+def test_text_moves():
+    decoder = LineDecoder()
+    decoder.feed(b"5\r\n  7 \n8")
+
+    assert [decode_move(frame) for frame in decoder] == [5, 7]
+    assert decoder.next_frame() is None
+    decoder.feed(b"\n")
+    assert decode_move(decoder.next_frame()) == 8
+
+
+def test_not_a_move():
+    with pytest.raises(ValueError):
+        decode_move((Kind.BOARD, b""))
+
+
+def test_sniff():
+    assert sniff(MAGIC[:2]) is None
+    assert type(sniff(b"L")) is LineDecoder
+    assert type(sniff(b"Larry\n")) is LineDecoder
+    assert type(sniff(MAGIC + encode_text("Larry"))) is FrameDecoder
+
+
+def read_frame(decoder, conn):
+    while (frame := decoder.next_frame()) is None:
+        assert decoder.recv_into(conn)
+    return frame
+
+
+def test_negotiation():
+    server, client = socketpair()
+    names = []
+
+    def serve():
+        server.sendall(b"Welcome to Tic Tac Toe!\nWhat is your name?\n")
+        decoder = negotiate(server)
+        names.append(read_frame(decoder, server))
+        server.sendall(encode_move(3))
+
+    with server, client:
+        thread = Thread(target=serve)
+        thread.start()
+        decoder = greet(client, "Boty")
+        move = read_frame(decoder, client)
+        thread.join()
+
+    assert names == [(Kind.TEXT, b"Boty")]
+    assert decode_move(move) == 3
+
+
+def test_unknown_kinds_are_refused():
+    decoder = FrameDecoder()
+    decoder.feed(HEADER.pack(0, 9))
+    with pytest.raises(ProtocolError, match="kind 9"):
+        decoder.next_frame()
+    # The readers treat it like a hang up
+    assert issubclass(ProtocolError, ConnectionError)
+
+
+def test_frames_over_the_limit_are_refused():
+    decoder = FrameDecoder(limit=16)
+    decoder.feed(encode_text("x" * 16))
+    assert decoder.next_frame() == (Kind.TEXT, b"x" * 16)
+    # Refused from the header alone, before the payload arrives
+    decoder.feed(encode_text("x" * 17)[: HEADER.size])
+    with pytest.raises(ProtocolError):
+        decoder.next_frame()
+
+
+def test_lines_over_the_limit_are_refused():
+    decoder = LineDecoder()
+    decoder.feed(b"x" * MAX_LINE + b"\n")
+    assert decoder.next_frame() == (Kind.TEXT, b"x" * MAX_LINE)
+    decoder.feed(b"x" * MAX_LINE)
+    assert decoder.next_frame() is None
+    # Somebody who never sends a newline
+    decoder.feed(b"x")
+    with pytest.raises(ProtocolError):
+        decoder.next_frame()
@@ -0,0 +1,27 @@
+from render import delta, render_board, symbol
+
+
+def test_render_board():
+    assert render_board((0b000010001, 0b100000100)) == (
+        "\n a |   | b\n-----------\n   | a |  \n-----------\n   |   | b\n\n"
+    )
+
+
+def test_first_board_wins_a_shared_cell():
+    assert render_board((0b1, 0b1)).startswith("\n a |")
+
+
+def test_rendered_boards_are_cached():
+    render_board.cache_clear()
+    render_board((0b1, 0b10))
+    render_board((0b1, 0b10))
+    assert render_board.cache_info().hits == 1
+
+
+def test_custom_template():
+    assert render_board((0b101, 0b10), ("{}" * 9).format) == "aba      "
+
+
+def test_delta():
+    assert delta(0, 5) == "a took 5\n"
+    assert delta(2, 9) == f"{symbol(2)} took 9\n"
@@ -0,0 +1,120 @@
+import pytest
+
+from mnk_bits import MNK, TIC_TAC_TOE
+from snapshot import (
+    Checkpoint,
+    load_games,
+    load_word_game,
+    restore_games,
+    save_games,
+    snapshot_games,
+)
+from state_machine_game import Action, Game as WordGame, Message, Player as WordPlayer
+from tic_tac_toe_bits_sockets import Game, Player, Rules
+
+
+def in_progress(n, rules):
+    games = []
+    for game_id in range(n):
+        players = [
+            Player(None, None, f"x{game_id}", _board=0b1 | game_id % 2 << 4),
+            Player(None, None, f"o{game_id}", _board=0b100, skips=1),
+        ]
+        games.append(
+            Game(
+                rules,
+                _players=players,
+                game_id=game_id,
+                _turns=3,
+                _turn=1,
+                _last_move=(0, 5) if game_id % 2 else None,
+            )
+        )
+    return games
+
+
+def test_games_round_trip(tmp_path):
+    rules = Rules(TIC_TAC_TOE.lines())
+    games = in_progress(1000, rules)
+    save_games(games, tmp_path / "games.snap")
+    restored = load_games(rules, tmp_path / "games.snap")
+
+    assert len(restored) == 1000
+    for before, after in zip(games, restored):
+        assert after.game_id == before.game_id
+        assert (after._turns, after._turn) == (3, 1)
+        assert after._last_move == before._last_move
+        assert [(p.name, p.token, p.skips, p._board) for p in after._players] == [
+            (p.name, p.token, p.skips, p._board) for p in before._players
+        ]
+    assert str(restored[1]) == str(games[1])
+
+
+def test_games_need_the_same_grid():
+    data = snapshot_games(in_progress(1, Rules(TIC_TAC_TOE.lines())))
+    with pytest.raises(ValueError):
+        restore_games(data, Rules(grid=MNK(15, 15, 5)))
+
+
+def test_empty_snapshot_keeps_the_grid():
+    rules = Rules(grid=MNK(15, 15, 5))
+    assert restore_games(snapshot_games([], rules.grid), rules) == []
+
+
+def guess(game, player, word):
+    game.process(Action(player, Message.GUESS.with_data({"word": word})))
+
+
+def test_checkpoints_only_write_changes(tmp_path):
+    path = tmp_path / "word_game.ckpt"
+    game = WordGame("apple")
+    iris, dad = WordPlayer("Iris"), WordPlayer("Dad")
+    for player in (iris, dad):
+        game.process(Action(player, Message.REQUEST))
+        game.process(Action(player, Message.CONFIRM))
+    for n in range(1000):
+        guess(game, iris, f"word{n}")
+
+    with Checkpoint(path) as checkpoint:
+        full = checkpoint.write(game.state)
+        guess(game, dad, "pear")
+        delta = checkpoint.write(game.state)
+        guess(game, dad, "apple")
+        checkpoint.write(game.state)
+
+    # A new guess and one player's tries, not the thousand guesses before it
+    assert delta < 100 < full
+    restored = load_word_game(path)
+    state = restored.state
+    assert len(state.guesses) == 1001
+    assert "pear" in state.guesses
+    assert state.players["Iris"].tires == 10 - 1000
+    assert state.players["Dad"].tires == 9
+    assert state.confirmed == {"Iris", "Dad"}
+    assert state.winner.name == "Dad"
+    assert state.preformed == "Dad won!"
+
+
+def test_half_written_checkpoint(tmp_path):
+    path = tmp_path / "word_game.ckpt"
+    game = WordGame("apple")
+    iris = WordPlayer("Iris")
+    game.process(Action(iris, Message.REQUEST))
+    game.process(Action(iris, Message.CONFIRM))
+    with Checkpoint(path) as checkpoint:
+        checkpoint.write(game.state)
+        guess(game, iris, "pear")
+        checkpoint.write(game.state)
+
+    # Lose the end of the last chunk, the one before it still counts
+    path.write_bytes(path.read_bytes()[:-3])
+    state = load_word_game(path).state
+    assert "pear" not in state.guesses
+    assert state.confirmed == {"Iris"}
+
+    # The restored game carries on, its first checkpoint starts the file over
+    restored = load_word_game(path)
+    guess(restored, restored.state.players["Iris"], "plum")
+    with Checkpoint(path) as checkpoint:
+        checkpoint.write(restored.state)
+    assert list(load_word_game(path).state.guesses) == ["plum"]
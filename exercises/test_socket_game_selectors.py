@@ -0,0 +1,95 @@
+import logging
+import socket
+import time
+from threading import Event, Thread
+
+import pytest
+
+from socket_game_selectors import GuessServer
+
+# A line per guess at debug is more than the tests want to wait for
+logging.getLogger("socket_game_selectors").setLevel(logging.INFO)
+
+
+@pytest.fixture
+def server():
+    server = GuessServer(host="127.0.0.1", port=0)
+    server.start()
+    stop = Event()
+
+    def serve():
+        while not stop.is_set():
+            server.serve_once(0.01)
+
+    thread = Thread(target=serve, daemon=True)
+    thread.start()
+    yield server
+    stop.set()
+    thread.join(timeout=5)
+    server.close()
+
+
+def join(server):
+    conn = socket.create_connection(server._server.getsockname())
+    conn.settimeout(5)
+    assert read_until(conn, "\n") == "Guess a number between 1 and 10\n"
+    return conn
+
+
+def read_until(conn, text):
+    data = b""
+    while text.encode() not in data:
+        chunk = conn.recv(1024)
+        assert chunk, data
+        data += chunk
+    return data.decode()
+
+
+def test_guessing(server):
+    a, b = join(server), join(server)
+    answer = server.answer
+    wrong = answer % 10 + 1
+
+    a.sendall(b"ten\n")
+    assert read_until(a, "\n") == "That's not a number\n"
+    a.sendall(f"{wrong}\n".encode())
+    assert read_until(a, "\n") == "Nope, try again\n"
+
+    b.sendall(f"{answer}\n".encode())
+    assert read_until(b, "You win!\n").startswith("You win!")
+    lost = read_until(a, "Guess a number")
+    assert f"Someone else guessed {answer} first, you lose!" in lost
+    assert "New round!" in lost
+    # Winner and loser both get the next round's prompt
+    assert "Guess a number" in read_until(b, "\n")
+    assert server.rounds == 2
+    a.close()
+    b.close()
+
+
+def test_readers_that_fall_behind_are_dropped(server):
+    server.outbox_limit = 1024
+    slow = socket.create_connection(server._server.getsockname())
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    while len(server._players) < 1:
+        time.sleep(0.01)
+    [guesser] = server._players.values()
+    guesser.conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+    wrong = server.answer % 10 + 1
+    deadline = time.monotonic() + 5
+    try:
+        while server._players and time.monotonic() < deadline:
+            slow.sendall(f"{wrong}\n".encode() * 50)
+            time.sleep(0.001)
+    except ConnectionError:
+        pass
+    assert len(guesser.outbox) <= 1024
+    assert not server._players
+
+    # Nobody else minds
+    fine = join(server)
+    fine.sendall(b"0\n")
+    assert read_until(fine, "\n") == "Nope, try again\n"
+    slow.close()
+    fine.close()
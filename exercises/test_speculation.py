@@ -0,0 +1,45 @@
+from threading import Event
+
+from speculation import Speculator
+
+
+def test_take_keeps_only_the_right_guess():
+    release = Event()
+
+    def think(situation):
+        release.wait(5)
+        return situation * 2
+
+    speculator = Speculator(think, max_outstanding=1)
+    speculator.speculate({1: 1, 2: 2, 3: 3})
+    futures = dict(speculator._pending)
+    future = speculator.take(2)
+    release.set()
+
+    assert future.result(timeout=5) == 4
+    # Queued behind the one running, so it never ran
+    assert futures[3].cancelled()
+    assert speculator._pending == {}
+    speculator.close()
+
+
+def test_guessing_wrong_takes_nothing():
+    speculator = Speculator(lambda situation: situation)
+    speculator.speculate({1: 1})
+    assert speculator.take(2) is None
+    assert speculator._pending == {}
+    speculator.close()
+
+
+def test_speculating_again_drops_the_last_guesses():
+    release = Event()
+    speculator = Speculator(lambda situation: release.wait(5), max_outstanding=1)
+    speculator.speculate({1: 1, 2: 2})
+    old = dict(speculator._pending)
+    speculator.speculate({3: 3})
+    release.set()
+
+    assert old[2].cancelled()
+    assert list(speculator._pending) == [3]
+    assert speculator.take(3).result(timeout=5)
+    speculator.close()
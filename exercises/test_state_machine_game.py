@@ -1,5 +1,7 @@
 import pytest
-from state_machine_game import Message
+import state_machine_game
+from state_machine_game import Action, Game, Message, Player, get_word
+from word_index import WordIndex, build_index
 
 
 def test_smokem_if_you_got_em():
@@ -11,3 +13,90 @@ def test_guess_message_with_data():
 
     assert guess_message == Message.GUESS
     assert guess_message.data["word"] == "apple"
+
+
+def test_actions_keep_their_own_data():
+    iris = Player("Iris")
+    first = Action(iris, Message.GUESS.with_data({"word": "apple"}))
+    second = Action(iris, Message.GUESS.with_data({"word": "pear"}))
+    third = Action(iris, Message.GUESS, {"word": "plum"})
+
+    assert first.data == {"word": "apple"}
+    assert second.data == {"word": "pear"}
+    assert third.data == {"word": "plum"}
+
+
+def test_guesses_must_be_words(tmp_path):
+    path = str(tmp_path / "words.idx")
+    build_index(["apple", "pear"], path)
+    with WordIndex(path) as words:
+        game = Game("pear", words)
+        iris = Player("Iris")
+        game.process(Action(iris, Message.REQUEST))
+        game.process(Action(iris, Message.CONFIRM))
+
+        game.process(Action(iris, Message.GUESS.with_data({"word": "aple"})))
+        assert game.state.preformed == "aple is not a word, try again"
+        assert iris.tires == 10
+
+        game.process(Action(iris, Message.GUESS.with_data({"word": "pear"})))
+        assert game.state.winner is iris
+
+
+def test_joining_twice():
+    game = Game("pear")
+    iris = Player("Iris")
+    game.process(Action(iris, Message.REQUEST))
+    game.process(Action(iris, Message.REQUEST))
+
+    assert game.state.preformed == "Iris already joined, skipping turn"
+    assert list(game.state.players) == ["Iris"]
+
+
+def test_repeated_guess_is_penalized():
+    game = Game("pear")
+    iris, dad = Player("Iris"), Player("Dad")
+    for player in (iris, dad):
+        game.process(Action(player, Message.REQUEST))
+        game.process(Action(player, Message.CONFIRM))
+
+    game.process(Action(iris, Message.GUESS.with_data({"word": "apple"})))
+    game.process(Action(dad, Message.GUESS.with_data({"word": "apple"})))
+
+    assert game.state.preformed == "Dad already guessed this word"
+    assert "Dad" in game.state._penalty
+    assert (iris.tires, dad.tires) == (9, 9)
+
+
+def test_penalty_wears_off():
+    now = [0.0]
+    game = Game("pear", clock=lambda: now[0])
+    iris, dad = Player("Iris"), Player("Dad")
+    for player in (iris, dad):
+        game.process(Action(player, Message.REQUEST))
+        game.process(Action(player, Message.CONFIRM))
+    game.process(Action(iris, Message.GUESS.with_data({"word": "apple"})))
+    game.process(Action(dad, Message.GUESS.with_data({"word": "apple"})))
+
+    now[0] += 0.5
+    game.process(Action(dad, Message.GUESS.with_data({"word": "fig"})))
+    assert game.state.preformed == "Dad penalized, skipping turn"
+    assert dad.tires == 9
+
+    now[0] += 0.5
+    game.process(Action(dad, Message.GUESS.with_data({"word": "pear"})))
+    assert game.state.winner is dad
+
+
+def test_get_word_closes_the_index_it_opened(tmp_path, monkeypatch):
+    path = str(tmp_path / "words.idx")
+    build_index(["apple", "pear"], path)
+    opened = []
+
+    def load_or_build():
+        opened.append(WordIndex(path))
+        return opened[-1]
+
+    monkeypatch.setattr(state_machine_game.WordIndex, "load_or_build", load_or_build)
+    assert get_word() in ("apple", "pear")
+    assert opened[0]._map.closed
@@ -0,0 +1,30 @@
+import numpy as np
+from tic_tac_toe_batch import cat_many, legal_moves_many, won_many
+from tic_tac_toe_bits import cat, won
+
+
+def test_won_many_matches_won():
+    boards = np.arange(512, dtype=np.uint16)
+
+    assert won_many(boards).tolist() == [won(b) for b in range(512)]
+
+
+def test_won_many_keeps_shape():
+    boards = np.arange(512, dtype=np.uint16).reshape(32, 16)
+
+    assert won_many(boards).shape == (32, 16)
+
+
+def test_cat_many_matches_cat():
+    games = np.array(
+        [[a, b] for a in range(0, 512, 7) for b in range(512) if not a & b],
+        dtype=np.uint16,
+    )
+
+    assert cat_many(games).tolist() == [cat(g) for g in games.tolist()]
+
+
+def test_legal_moves_many():
+    games = np.array([[0, 0], [0b000000011, 0b000011000], [0b101010101, 0b010101010]])
+
+    assert legal_moves_many(games).tolist() == [0b111111111, 0b111100100, 0]
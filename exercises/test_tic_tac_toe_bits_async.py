@@ -0,0 +1,413 @@
+import asyncio
+import socket
+import time
+
+from fanout import SlowConsumer
+from game_log import GameLog, GameLogReader
+from mnk_bits import TIC_TAC_TOE
+from protocol import HEADER, MAGIC, MAX_LINE, encode_text
+from tic_tac_toe_bits_async import Lobby, StreamFanout
+from snapshot import load_games, save_games
+from tic_tac_toe_bits_sockets import Game, OnTimeout, Player, Rules
+
+
+async def read_until(reader, text):
+    data = b""
+    while text.encode() not in data:
+        chunk = await reader.read(1024)
+        assert chunk, data
+        data += chunk
+    return data.decode()
+
+
+async def player(port, name, moves):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(reader, "What is your name?")
+    writer.write(f"{name}\n".encode())
+    for move in moves:
+        await read_until(reader, f"{name}'s turn")
+        writer.write(f"{move}\n".encode())
+    result = await read_until(reader, "Thanks for playing!")
+    writer.close()
+    return result
+
+
+async def play_games(games):
+    lobby = Lobby(Rules(winning_conditions=TIC_TAC_TOE.lines()), port=0)
+    server = await lobby.start()
+    port = server.sockets[0].getsockname()[1]
+
+    results = []
+    for n in range(games):
+        # Join one pair at a time so they're matched with each other
+        first = asyncio.create_task(player(port, f"a{n}", [1, 2, 3]))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(player(port, f"b{n}", [4, 5]))
+        results.append(asyncio.gather(first, second))
+    results = await asyncio.gather(*results)
+
+    server.close()
+    return results
+
+
+def test_concurrent_games():
+    for n, (first, second) in enumerate(asyncio.run(play_games(5))):
+        assert f"Game over! a{n} won!" in first
+        assert f"Game over! a{n} won!" in second
+
+
+async def idle_opponent(port):
+    lobby_game = asyncio.create_task(player(port, "slow", []))
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(reader, "What is your name?")
+    writer.write(b"quitter\n")
+    await read_until(reader, "quitter's turn")
+    writer.close()
+    return await lobby_game
+
+
+def test_disconnect_forfeits():
+    async def run():
+        lobby = Lobby(Rules(winning_conditions=TIC_TAC_TOE.lines()), port=0)
+        server = await lobby.start()
+        result = await idle_opponent(server.sockets[0].getsockname()[1])
+        server.close()
+        return result
+
+    assert "Game over! slow won!" in asyncio.run(run())
+
+
+async def stalled_opponent():
+    lobby = Lobby(
+        Rules(winning_conditions=TIC_TAC_TOE.lines()),
+        port=0,
+        turn_timeout=0.1,
+        handshake_timeout=0.1,
+    )
+    server = await lobby.start()
+    port = server.sockets[0].getsockname()[1]
+
+    silent_reader, _ = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(silent_reader, "What is your name?")
+    waiting = asyncio.create_task(player(port, "waiting", []))
+    await asyncio.sleep(0.01)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(reader, "What is your name?")
+    writer.write(b"staller\n")
+    result = await waiting
+    writer.close()
+    server.close()
+    return await silent_reader.read(), result
+
+
+def test_stalled_players_are_dropped():
+    silent, result = asyncio.run(stalled_opponent())
+    assert silent == b""
+    assert "waiting ran out of time, skipping their turn" in result
+    assert "staller ran out of time, skipping their turn" in result
+    assert "Game over! staller won!" in result
+
+
+def test_lobby_games_forfeit_on_timeout():
+    async def run():
+        lobby = Lobby(
+            Rules(winning_conditions=TIC_TAC_TOE.lines()),
+            port=0,
+            turn_timeout=0.1,
+            on_timeout=OnTimeout.FORFEIT,
+        )
+        server = await lobby.start()
+        port = server.sockets[0].getsockname()[1]
+        first = asyncio.create_task(player(port, "idle", []))
+        await asyncio.sleep(0.01)
+        result = await player(port, "patient", [])
+        await first
+        server.close()
+        return result
+
+    result = asyncio.run(run())
+    assert "idle ran out of time and forfeits" in result
+    assert "skipping" not in result
+    assert "Game over! patient won!" in result
+
+
+async def stuffed_writer(rcvbuf=4096):
+    # A server side writer whose client never reads
+    accepted = asyncio.get_running_loop().create_future()
+    server = await asyncio.start_server(
+        lambda r, w: accepted.set_result(w), "127.0.0.1", 0
+    )
+    client = socket.create_connection(server.sockets[0].getsockname())
+    if rcvbuf:
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    writer = await accepted
+    writer.get_extra_info("socket").setsockopt(
+        socket.SOL_SOCKET, socket.SO_SNDBUF, 4096
+    )
+    server.close()
+    return client, writer
+
+
+def test_stream_outbox_drops_old_boards():
+    async def run():
+        client, writer = await stuffed_writer()
+        fanout = StreamFanout(limit=4096)
+        outbox = fanout.attach(writer)
+        for n in range(1000):
+            fanout.send(writer, b"board %4d\n" % n + b"." * 500, droppable=True)
+            await asyncio.sleep(0)
+        fanout.send(writer, b"the end\n")
+        assert outbox.queued <= 4096
+        assert not outbox.closed
+
+        client.setblocking(False)
+        data = b""
+        while not data.endswith(b"the end\n"):
+            try:
+                data += client.recv(65536)
+            except BlockingIOError:
+                await asyncio.sleep(0.01)
+        client.close()
+        writer.close()
+        return outbox.dropped, data
+
+    dropped, data = asyncio.run(run())
+    assert dropped > 0
+    assert data.count(b"board") == 1000 - dropped
+    assert data.endswith(b"board  999\n" + b"." * 500 + b"the end\n")
+
+
+def test_slow_reader_gets_everything_queued():
+    def read_slowly(client, size):
+        data = b""
+        while len(data) < size:
+            data += client.recv(2048)
+            time.sleep(0.001)
+        return data
+
+    async def run():
+        # A tiny receive window only adds delayed ACKs, the send side is
+        # still small enough to back up
+        client, writer = await stuffed_writer(rcvbuf=None)
+        fanout = StreamFanout(limit=128 * 1024)
+        outbox = fanout.attach(writer)
+        sent = b"".join(b"line %5d\n" % n + b"." * 80 for n in range(700))
+        for n in range(0, len(sent), 1000):
+            fanout.send(writer, sent[n : n + 1000])
+        # Well past high_water, the drainer has to keep going on its own
+        assert outbox.queued > 16 * 1024
+        reader = asyncio.create_task(asyncio.to_thread(read_slowly, client, len(sent)))
+        started = asyncio.get_running_loop().time()
+        await fanout.drain(timeout=10.0)
+        elapsed = asyncio.get_running_loop().time() - started
+        received = await asyncio.wait_for(reader, 10)
+        client.close()
+        writer.close()
+        return sent, received, elapsed, outbox
+
+    sent, received, elapsed, outbox = asyncio.run(run())
+    assert received == sent
+    assert elapsed < 5
+    assert not outbox.pending
+
+
+def test_stream_outbox_disconnects_slow_readers():
+    async def run():
+        client, writer = await stuffed_writer()
+        fanout = StreamFanout(limit=4096, policy=SlowConsumer.DISCONNECT)
+        outbox = fanout.attach(writer)
+        while not outbox.closed:
+            fanout.send(writer, b"x" * 1024)
+            await asyncio.sleep(0)
+        await fanout.drain(timeout=1.0)
+        client.settimeout(5)
+        data = b""
+        try:
+            while chunk := client.recv(65536):
+                data += chunk
+        except ConnectionResetError:
+            pass
+        client.close()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert outbox.closed
+    assert outbox.queued == 0
+
+
+async def spectated_game():
+    lobby = Lobby(Rules(winning_conditions=TIC_TAC_TOE.lines()), port=0)
+    server = await lobby.start()
+    port = server.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(reader, "What is your name?")
+    writer.write(b"fan /watch\n")
+    waiting = await read_until(reader, "Waiting for a game to start")
+    first = asyncio.create_task(player(port, "a", [1, 2, 3]))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(player(port, "b", [4, 5]))
+    watched = await read_until(reader, "Thanks for playing!")
+    await asyncio.gather(first, second)
+    # Only the spectator ever connected who wasn't matched with anybody
+    assert lobby._waiting.empty()
+    assert await reader.read() == b""
+    server.close()
+    return waiting, watched
+
+
+def test_spectators_watch_lobby_games():
+    waiting, watched = asyncio.run(spectated_game())
+    assert "Waiting for an opponent" not in waiting
+    assert "You're watching a, b" in watched
+    assert "a's turn" in watched
+    assert "Game over! a won!" in watched
+
+
+async def joined(port, line):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(reader, "What is your name?")
+    writer.write(f"{line}\n".encode())
+    return reader, writer
+
+
+async def restarted_lobby(path):
+    rules = Rules(winning_conditions=TIC_TAC_TOE.lines())
+    lobby = Lobby(rules, port=0, snapshot_path=path, snapshot_every=3600)
+    server = await lobby.start()
+    port = server.sockets[0].getsockname()[1]
+    a_reader, a_writer = await joined(port, "a")
+    text = await read_until(a_reader, ")\n")
+    a_token = text.split("your token is ")[1].split(")")[0]
+    b_reader, b_writer = await joined(port, "b")
+    await read_until(a_reader, "a's turn")
+    a_writer.write(b"1\n")
+    text = await read_until(b_reader, "b's turn")
+    b_token = text.split("your token is ")[1].split(")")[0]
+    # Crash right after saving, before anybody notices them going
+    lobby.save()
+    lobby._snapshots.cancel()
+    server.close()
+
+    lobby = Lobby(rules, port=0, snapshot_path=path)
+    server = await lobby.start()
+    port = server.sockets[0].getsockname()[1]
+    assert set(lobby._suspended) == {a_token, b_token}
+    b_reader, b_writer = await joined(port, f"bee /resume {b_token}")
+    await read_until(b_reader, "Welcome back b!")
+    a_reader, a_writer = await joined(port, f"/resume {a_token}")
+    for reader, writer, move in [
+        (b_reader, b_writer, 4),
+        (a_reader, a_writer, 2),
+        (b_reader, b_writer, 5),
+        (a_reader, a_writer, 3),
+    ]:
+        await read_until(reader, "turn")
+        writer.write(f"{move}\n".encode())
+    result = await read_until(b_reader, "Thanks for playing!")
+    server.close()
+    return result
+
+
+def test_games_survive_a_restart(tmp_path):
+    result = asyncio.run(restarted_lobby(str(tmp_path / "games.snap")))
+    assert "Game over! a won!" in result
+
+
+def test_lobby_ids_carry_on_from_the_log(tmp_path):
+    path = tmp_path / "games.log"
+    with GameLog(path) as log:
+        log.end(41, 0, None)
+
+    async def run():
+        with GameLog(path) as log:
+            lobby = Lobby(Rules(TIC_TAC_TOE.lines()), port=0, log=log)
+            server = await lobby.start()
+            port = server.sockets[0].getsockname()[1]
+            first = asyncio.create_task(player(port, "a", [1, 2, 3]))
+            await asyncio.sleep(0.01)
+            await player(port, "b", [4, 5])
+            await first
+            server.close()
+
+    asyncio.run(run())
+    with GameLogReader(path) as reader:
+        assert [game.game_id for game in reader.replay()] == [41, 42]
+
+
+async def misbehaving_clients():
+    lobby = Lobby(Rules(TIC_TAC_TOE.lines()), port=0, handshake_timeout=5)
+    server = await lobby.start()
+    port = server.sockets[0].getsockname()[1]
+
+    # Never finishes its name
+    rambler_reader, rambler = await joined(port, "x" * (MAX_LINE + 1))
+    rambled = await rambler_reader.read()
+
+    # A binary client that sends a frame kind that doesn't exist, against
+    # somebody whose name isn't UTF-8
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(MAGIC + encode_text("bad"))
+    await reader.readuntil(MAGIC)
+    other_reader, other = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(other_reader, "What is your name?")
+    other.write(b"\xff\xfe\n")
+    data = b""
+    while b"bad's turn" not in data:
+        data += await reader.read(1024)
+    writer.write(HEADER.pack(0, 9))
+    result = await asyncio.wait_for(read_until(other_reader, "Thanks for playing!"), 5)
+    closed = await asyncio.wait_for(reader.read(), 5)
+    server.close()
+    return rambled, result, closed
+
+
+def test_misbehaving_clients_are_dropped():
+    rambled, result, closed = asyncio.run(misbehaving_clients())
+    assert rambled == b""
+    assert "Game over! \ufffd\ufffd won!" in result
+    # read() only returns at EOF, after the final board
+    assert closed.endswith(b" won!\n")
+
+
+def saved_games(path, n):
+    games = []
+    for game_id in range(n):
+        players = [Player(None, None, "a", 0b1), Player(None, None, "b", 0b1000)]
+        games.append(Game(Rules(), _players=players, game_id=game_id, _turns=2))
+    save_games(games, path)
+    return [[p.token for p in game._players] for game in games]
+
+
+async def abandoned_games(path, log_path):
+    # Game 0 gets a back, game 1 nobody
+    [[a_token, _], _] = saved_games(path, 2)
+    with GameLog(log_path) as log:
+        lobby = Lobby(
+            Rules(TIC_TAC_TOE.lines()),
+            port=0,
+            log=log,
+            snapshot_path=path,
+            resume_timeout=0.2,
+        )
+        server = await lobby.start()
+        port = server.sockets[0].getsockname()[1]
+        reader, _ = await joined(port, f"/resume {a_token}")
+        result = await asyncio.wait_for(reader.read(), 5)
+        await asyncio.sleep(0.1)
+        assert lobby._suspended == {}
+        lobby.save()
+        server.close()
+    return result
+
+
+def test_abandoned_games_expire(tmp_path):
+    path, log_path = str(tmp_path / "games.snap"), tmp_path / "games.log"
+    result = asyncio.run(abandoned_games(path, log_path))
+    assert b"Welcome back a!" in result
+    assert result.endswith(b"Game over! a won!\nThanks for playing!\n")
+    # Neither is saved again
+    assert load_games(Rules(TIC_TAC_TOE.lines()), path) == []
+    with GameLogReader(log_path) as reader:
+        ended = {game.game_id: game.winner for game in reader.replay()}
+    assert ended == {0: 0, 1: None}
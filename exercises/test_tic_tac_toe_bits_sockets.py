@@ -0,0 +1,234 @@
+import json
+import socket
+import time
+from threading import Thread
+
+from mnk_bits import MNK, TIC_TAC_TOE
+from protocol import HEADER, MAX_LINE, greet
+from test_fanout import connect, read_until
+from tic_tac_toe_bits_sockets import Conditions, Game, OnTimeout, Player, Rules
+
+
+def start(**kwargs):
+    game = Game(Rules(TIC_TAC_TOE.lines()), host="127.0.0.1", port=0, **kwargs)
+    thread = Thread(target=game.init, daemon=True)
+    thread.start()
+    while game._server is None:
+        time.sleep(0.01)
+    return game, thread, game._server.getsockname()[1]
+
+
+def test_silent_handshake_is_dropped():
+    game, thread, port = start(handshake_timeout=0.2, turn_timeout=0.2)
+    silent = socket.create_connection(("127.0.0.1", port))
+    a = connect(port, "a")
+    b = connect(port, "b")
+
+    # Still waiting on a name, until they gave up on us
+    assert silent.recv(1024).startswith(b"Welcome")
+    assert silent.recv(1024) == b""
+
+    # a never moves, so a gets skipped twice and forfeits
+    b.sendall(b"5\n")
+    text = read_until(b, "Thanks for playing!")
+    assert "a ran out of time, skipping their turn" in text
+    assert "a ran out of time and forfeits" in text
+    assert "Game over! b won!" in text
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert game._server is None
+
+
+def test_trickling_handshake_is_dropped():
+    game, thread, port = start(
+        handshake_timeout=0.3, turn_timeout=0.1, on_timeout=OnTimeout.FORFEIT
+    )
+    slow = socket.create_connection(("127.0.0.1", port))
+    assert slow.recv(1024).startswith(b"Welcome")
+
+    # Every byte comes well within the timeout, the whole name doesn't
+    slow.settimeout(0.1)
+    started = time.monotonic()
+    dropped = False
+    for byte in b"slowpoke\n":
+        try:
+            slow.sendall(bytes([byte]))
+            dropped = slow.recv(1024) == b""
+        except TimeoutError:
+            continue
+        except ConnectionError:
+            dropped = True
+        break
+    assert dropped
+    assert time.monotonic() - started < 0.6
+    assert game._players == []
+
+    a = connect(port, "a")
+    b = connect(port, "b")
+    assert "Game over! b won!" in read_until(b, "Thanks for playing!")
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    slow.close()
+    a.close()
+
+
+def test_forfeit_on_first_timeout():
+    game, thread, port = start(turn_timeout=0.1, on_timeout=OnTimeout.FORFEIT)
+    a = connect(port, "a")
+    b = connect(port, "b")
+
+    assert "Game over! b won!" in read_until(b, "Thanks for playing!")
+    thread.join(timeout=5)
+    assert a.recv(1024)
+
+
+def test_hanging_up_out_of_turn_ends_the_game():
+    game, thread, port = start()
+    a = connect(port, "a")
+    b = connect(port, "b")
+    read_until(a, "a's turn")
+
+    started = time.monotonic()
+    b.close()
+    assert "Game over! a won!" in read_until(a, "Thanks for playing!")
+    assert time.monotonic() - started < 5
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_bad_frames_forfeit():
+    game, thread, port = start()
+    a = connect(port, "a")
+    b = socket.create_connection(("127.0.0.1", port))
+    greet(b, "b")
+    a.sendall(b"5\n")
+    data = b""
+    while b"b's turn" not in data:
+        data += b.recv(1024)
+    b.sendall(HEADER.pack(0, 9))
+
+    assert "Game over! a won!" in read_until(a, "Thanks for playing!")
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    a.close()
+    b.close()
+
+
+def test_endless_lines_are_dropped_before_they_join():
+    game, thread, port = start(turn_timeout=0.1, on_timeout=OnTimeout.FORFEIT)
+    rambler = socket.create_connection(("127.0.0.1", port))
+    rambler.recv(1024)
+    rambler.sendall(b"x" * (MAX_LINE + 1))
+    try:
+        assert rambler.recv(1024) == b""
+    except ConnectionResetError:
+        pass
+
+    a = connect(port, "a")
+    b = connect(port, "b")
+    assert "Game over! b won!" in read_until(b, "Thanks for playing!")
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    for conn in (rambler, a, b):
+        conn.close()
+
+
+def test_json_players_hear_who_won():
+    game, thread, port = start()
+    a = connect(port, "a/json")
+    b = connect(port, "b")
+    for player, move in [(a, 1), (b, 4), (a, 2), (b, 5), (a, 3)]:
+        player.sendall(f"{move}\n".encode())
+
+    # Every line is JSON, the last one is the final state
+    data = b""
+    while chunk := a.recv(4096):
+        data += chunk
+    final = json.loads(data.decode().splitlines()[-1])
+    assert final["status"] == "won"
+    assert final["winner"] == 0
+    assert game._players[0].name == "a"
+    thread.join(timeout=5)
+    a.close()
+    b.close()
+
+
+def test_deltas_players_only_hear_the_moves():
+    game, thread, port = start()
+    a = connect(port, "a /deltas")
+    b = connect(port, "b")
+    for player, move in [(a, 1), (b, 4), (a, 2), (b, 5), (a, 3)]:
+        player.sendall(f"{move}\n".encode())
+
+    data = b""
+    while chunk := a.recv(4096):
+        data += chunk
+    text = data.decode()
+    # The whole board once, before anybody has moved, then only the moves
+    assert text.count("-----------") == 2
+    for line in ["a took 1", "b took 4", "a took 2", "b took 5", "a took 3"]:
+        assert line in text
+    assert text.endswith("a took 3\nGame over! a won!\n")
+    assert "b's turn" in read_until(b, "Thanks for playing!")
+    thread.join(timeout=5)
+    b.close()
+
+
+def test_cat_games_have_no_winner():
+    game = seated(Rules(TIC_TAC_TOE.lines()), 0b011100101, 0b100011010)
+    assert game._resolve(0, game._players[0]) == Conditions.CAT
+    assert (game._winner, game._winning_seat) == ("Cat", None)
+
+
+def seated(rules, *boards):
+    players = [Player(None, None, name, board) for name, board in zip("xo", boards)]
+    return Game(rules, _players=players)
+
+
+def test_compiled_rules_match_the_lines():
+    rules = Rules(TIC_TAC_TOE.lines())
+    for board in range(512):
+        assert rules.won(board) == TIC_TAC_TOE.won(board)
+    assert rules.drawn(0b111111111)
+    assert not rules.drawn(0b011111111)
+
+
+def test_winning_on_the_last_square_is_a_win():
+    game = seated(Rules(TIC_TAC_TOE.lines()), 0b010010111, 0b101101000)
+    assert game._won_or_cat(game._players[0]) == Conditions.WON
+
+
+def test_custom_rules_are_only_called_while_compiling():
+    calls = []
+
+    def corners(board):
+        calls.append(board)
+        return board & 0b101000101 == 0b101000101
+
+    # Three in a row loses, unless you get all four corners first
+    rules = Rules(
+        None,
+        lose=[TIC_TAC_TOE.won],
+        win=[corners],
+        draw=[lambda taken: taken.bit_count() >= 7],
+    )
+    compiled = len(calls)
+
+    game = seated(rules, 0b000000111, 0b000011000)
+    assert game._won_or_cat(game._players[0]) == Conditions.LOST
+    game._resolve(0, game._players[0])
+    assert game._winner == "o"
+    game = seated(rules, 0b101000101, 0b000010000)
+    assert game._won_or_cat(game._players[0]) == Conditions.WON
+    game = seated(rules, 0b100000001, 0b000010000)
+    assert game._won_or_cat(game._players[0]) is None
+    game = seated(rules, 0b100101001, 0b001010010)
+    assert game._won_or_cat(game._players[0]) == Conditions.CAT
+    assert len(calls) == compiled
+
+
+def test_big_grids_check_as_they_go():
+    rules = Rules(grid=MNK(15, 15, 5), lose=[lambda board: board == 1])
+    assert rules._outcomes is None
+    assert rules.won(0b11111)
+    assert rules.outcome(1) == Conditions.LOST
@@ -0,0 +1,58 @@
+import pytest
+from tic_tac_toe_solver import Solver, TABLE_SIZE
+
+
+@pytest.fixture(scope="module")
+def solver():
+    return Solver.build()
+
+
+def test_every_reachable_position_is_solved(solver):
+    assert len(solver.table) == TABLE_SIZE
+    assert sum(1 for entry in solver.table if entry) == 5478
+
+
+def test_perfect_play_is_a_draw(solver):
+    assert solver.score([0, 0]) == 0
+
+
+def test_takes_the_win(solver):
+    # a a .
+    # b b .
+    # . . .
+    assert solver.best_move([0b000000011, 0b000011000]) == 3
+
+
+def test_blocks_the_win(solver):
+    # a . .
+    # b b .
+    # . . a
+    assert solver.best_move([0b100000001, 0b000011000]) == 6
+
+
+def test_finished_games_have_no_move(solver):
+    assert solver.best_move([0b000000111, 0b000011000]) is None
+
+
+def test_lookup_for_either_player(solver):
+    # b moved first, so a is to move and must block
+    assert solver.best_move([0b000010000, 0b000000011], player=0) == 3
+
+
+def test_unreachable_position(solver):
+    with pytest.raises(ValueError):
+        solver.lookup([0b111, 0b111000])
+
+
+def test_roundtrip(solver, tmp_path):
+    path = tmp_path / "solver.bin"
+    solver.save(path)
+
+    assert Solver.from_file(path) == solver
+
+
+def test_load_or_build(solver, tmp_path):
+    path = tmp_path / "data" / "solver.bin"
+    assert Solver.load_or_build(path) == solver
+    assert path.stat().st_size == TABLE_SIZE
+    assert Solver.load_or_build(path) == solver
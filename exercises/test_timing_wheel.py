@@ -0,0 +1,73 @@
+import pytest
+from timing_wheel import TimingWheel
+
+
+class Clock:
+    def __init__(self, now: float = 100.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_cooldown_expires(clock):
+    wheel = TimingWheel(resolution=0.1, slots=8, clock=clock)
+    wheel.schedule("iris", 1.0)
+
+    assert "iris" in wheel
+    clock.now += 0.95
+    assert "iris" in wheel
+    clock.now += 0.05
+    assert "iris" not in wheel
+    assert len(wheel) == 0
+
+
+def test_advance_returns_expired(clock):
+    wheel = TimingWheel(resolution=0.1, slots=8, clock=clock)
+    wheel.schedule("iris", 0.2)
+    wheel.schedule("dad", 0.5)
+
+    clock.now += 0.3
+    assert wheel.advance() == ["iris"]
+    assert wheel.advance() == []
+    clock.now += 0.3
+    assert wheel.advance() == ["dad"]
+
+
+def test_longer_than_the_wheel(clock):
+    # 8 slots of 0.1s only cover 0.8s, this has to go round a few times
+    wheel = TimingWheel(resolution=0.1, slots=8, clock=clock)
+    wheel.schedule("iris", 2.5)
+
+    for _ in range(24):
+        clock.now += 0.1
+        assert wheel.active("iris")
+    clock.now += 0.11
+    assert not wheel.active("iris")
+
+
+def test_long_nap(clock):
+    wheel = TimingWheel(resolution=0.1, slots=8, clock=clock)
+    wheel.schedule("iris", 0.3)
+    wheel.schedule("dad", 30.0)
+
+    clock.now += 10
+    assert wheel.advance() == ["iris"]
+    assert wheel.remaining("dad") == pytest.approx(20.0)
+
+
+def test_reschedule_and_cancel(clock):
+    wheel = TimingWheel(resolution=0.1, slots=8, clock=clock)
+    wheel.schedule("iris", 0.2)
+    wheel.schedule("iris", 1.0)
+
+    clock.now += 0.5
+    assert "iris" in wheel
+    wheel.cancel("iris")
+    assert "iris" not in wheel
+    wheel.cancel("iris")
@@ -0,0 +1,40 @@
+from tournament import free_positions, load_policy, play_chunk, run
+
+
+def first_free(boards):
+    return free_positions(boards)[0]
+
+
+def always_centre(boards):
+    return 5
+
+
+def test_perfect_play_never_loses():
+    _, _, wins, losses, draws, times = play_chunk(("perfect", "random", 200))
+
+    assert losses == 0
+    assert wins + draws == 200
+    assert times["perfect"].count > 0
+
+
+def test_greedy_blocks():
+    # Somebody who only ever takes the first free square never beats greedy
+    _, _, wins, losses, draws, _ = play_chunk(
+        ("greedy", "test_tournament:first_free", 10)
+    )
+    assert losses == 0
+
+
+def test_illegal_moves_lose():
+    assert load_policy("test_tournament:first_free")([0b1, 0]) == 2
+    _, _, wins, _, _, _ = play_chunk(("random", "test_tournament:always_centre", 4))
+    assert wins == 4
+
+
+def test_run_across_processes():
+    results = run(["random", "perfect"], games=300, processes=2, chunk_size=100)
+
+    assert results.games == 900
+    assert results.table["perfect"]["perfect"] == [0, 0, 300]
+    assert results.table["random"]["perfect"][0] == 0
+    assert results.standings()[0][0] == "perfect"
@@ -0,0 +1,113 @@
+import asyncio
+
+from state_machine_game import Message
+from word_game_server import Client, Command, WordGameServer, parse
+
+
+def test_parse():
+    client = Client(writer=None)
+    assert parse("guess apple", client) == "join <name> first\n"
+
+    join = parse("join Iris\n", client)
+    assert isinstance(join, Command)
+    assert join.action.message == Message.REQUEST
+    assert client.player.name == "Iris"
+    assert parse("join Dad", client) == "You're already Iris\n"
+
+    guess = parse("GUESS Apple", client)
+    assert guess.action.message == Message.GUESS
+    assert guess.action.data == {"word": "apple"}
+    # Queued guesses don't share the Message.GUESS singleton's data
+    assert parse("guess pear", client).action.data == {"word": "pear"}
+    assert guess.action.data == {"word": "apple"}
+    assert parse("guess", client) == "guess needs a word\n"
+    assert parse("dance", client).startswith("Commands:")
+
+
+async def read_until(reader, text):
+    data = b""
+    while text.encode() not in data:
+        chunk = await reader.read(4096)
+        assert chunk, data
+        data += chunk
+    return data.decode()
+
+
+async def read_lines(reader, n):
+    return "".join([(await reader.readline()).decode() for _ in range(n)])
+
+
+async def connect(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await read_until(reader, "Commands:")
+    return reader, writer
+
+
+async def play(queue_size, guesses):
+    server = WordGameServer(
+        answer="apple", host="127.0.0.1", port=0, queue_size=queue_size
+    )
+    listening = await server.start()
+    port = listening.sockets[0].getsockname()[1]
+
+    iris, iris_writer = await connect(port)
+    dad, dad_writer = await connect(port)
+    iris_writer.write(b"join Iris\nconfirm\n")
+    await read_until(iris, "Iris confirmed")
+    dad_writer.write(b"join Iris\n")
+    taken = await read_until(dad, "pick another name")
+    dad_writer.write(b"join Dad\nconfirm\n")
+    await read_until(dad, "Dad confirmed")
+
+    # Far more than fits in the queue, all of it gets an answer
+    iris_writer.write(b"".join(b"guess pear\n" for _ in range(guesses)))
+    repeats = await read_lines(iris, guesses)
+    dad_writer.write(b"guess apple\n")
+    won = await read_until(iris, "New round!")
+
+    processed = server.processed
+    for writer in (iris_writer, dad_writer):
+        writer.close()
+    listening.close()
+    return taken, repeats, won, processed
+
+
+def test_play_through_a_small_queue():
+    taken, repeats, won, processed = asyncio.run(play(queue_size=2, guesses=200))
+
+    assert "Iris is taken" in taken
+    assert "Iris guessed pear, 9 tries left" in repeats
+    assert "Iris already guessed this word" in repeats
+    assert "Iris penalized, skipping turn" in repeats
+    assert "Dad won! The word was apple" in won
+    assert processed == 5 + 200 + 1
+
+
+async def survive_a_bad_command():
+    server = WordGameServer(answer="apple", host="127.0.0.1", port=0)
+    listening = await server.start()
+    port = listening.sockets[0].getsockname()[1]
+    process = server.game.process
+    broken = []
+
+    def process_once_broken(action):
+        if not broken:
+            broken.append(action)
+            raise RuntimeError("boom")
+        return process(action)
+
+    server.game.process = process_once_broken
+    iris, writer = await connect(port)
+    writer.write(b"join Iris\n")
+    text = await read_until(iris, "Something went wrong")
+    writer.write(b"join Iris\nconfirm\nguess apple\n")
+    text += await read_until(iris, "Iris won!")
+    writer.close()
+    listening.close()
+    return text
+
+
+def test_engine_survives_a_bad_command():
+    text = asyncio.run(survive_a_bad_command())
+    assert "Something went wrong, try again" in text
+    assert "Iris confirmed" in text
@@ -0,0 +1,52 @@
+from random import Random
+
+import pytest
+from word_index import WordIndex, build_index
+
+WORDS = ["pear", "apple", "Zebra", "fig", "apple", "crème", "x-ray", "banana"]
+
+
+@pytest.fixture
+def words(tmp_path):
+    path = tmp_path / "words.idx"
+    build_index(WORDS, str(path))
+    with WordIndex(str(path)) as words:
+        yield words
+
+
+def test_only_lowercase_words_sorted(words):
+    assert list(words) == ["apple", "banana", "crème", "fig", "pear"]
+
+
+def test_membership(words):
+    assert "fig" in words
+    assert "crème" in words
+    assert "figs" not in words
+    assert "Zebra" not in words
+    assert "" not in words
+    assert "zzz" not in words
+
+
+def test_same_choice_as_a_sorted_list(words):
+    expected = sorted({w for w in WORDS if w.isalpha() and w.islower()})
+    assert Random(0).choice(words) == Random(0).choice(expected)
+
+
+def test_load_or_build(tmp_path):
+    source = tmp_path / "words"
+    source.write_text("pear\napple\n")
+    path = str(tmp_path / "words.idx")
+
+    assert list(WordIndex.load_or_build(str(source), path)) == ["apple", "pear"]
+    # Without the dictionary the index we already have is fine
+    source.unlink()
+    assert len(WordIndex.load_or_build(str(source), path)) == 2
+
+
+@pytest.mark.parametrize("data", [b"nope" * 4, b"", b"WRD", b"WRD\x01\xff\0\0\0"])
+def test_not_an_index(tmp_path, data):
+    path = tmp_path / "words.idx"
+    path.write_bytes(data)
+
+    with pytest.raises(ValueError):
+        WordIndex(str(path))
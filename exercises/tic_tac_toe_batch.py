@@ -0,0 +1,83 @@
+from timeit import timeit
+from typing import List
+
+import numpy as np
+
+from tic_tac_toe_bits import cat, won, winning_positions
+
+FULL_BOARD = np.uint16(0b111111111)
+WINNING_MASKS = np.array(winning_positions, dtype=np.uint16)
+
+# (n, masks) intermediates are chunked so millions of boards don't blow up
+# memory.
+CHUNK = 1 << 16
+
+
+def _as_boards(boards) -> np.ndarray:
+    return np.asarray(boards, dtype=np.uint16)
+
+
+def won_many(boards, masks: np.ndarray = WINNING_MASKS) -> np.ndarray:
+    boards = _as_boards(boards)
+    masks = _as_boards(masks)
+    flat = boards.reshape(-1)
+    result = np.empty(flat.shape, dtype=bool)
+
+    for start in range(0, len(flat), CHUNK):
+        chunk = flat[start : start + CHUNK, np.newaxis]
+        result[start : start + CHUNK] = ((chunk & masks) == masks).any(axis=1)
+
+    return result.reshape(boards.shape)
+
+
+def occupied_many(boards) -> np.ndarray:
+    # boards is (n, players), one row of bitboards per game
+    return np.bitwise_or.reduce(_as_boards(boards), axis=-1)
+
+
+def cat_many(boards) -> np.ndarray:
+    return occupied_many(boards) == FULL_BOARD
+
+
+def legal_moves_many(boards) -> np.ndarray:
+    return ~occupied_many(boards) & FULL_BOARD
+
+
+def _random_games(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    owners = rng.integers(0, 3, size=(n, 9))
+    bits = (1 << np.arange(9)).astype(np.uint16)
+    return np.stack(
+        [((owners == 1) * bits).sum(axis=1), ((owners == 2) * bits).sum(axis=1)],
+        axis=1,
+    ).astype(np.uint16)
+
+
+def benchmark(n: int = 1_000_000) -> List[tuple]:
+    games = _random_games(n)
+    boards = games[:, 0]
+    scalar_boards = boards.tolist()
+    scalar_games = games.tolist()
+
+    return [
+        (
+            "won",
+            timeit(lambda: [won(b) for b in scalar_boards], number=1),
+            timeit(lambda: won_many(boards), number=1),
+        ),
+        (
+            "cat",
+            timeit(lambda: [cat(g) for g in scalar_games], number=1),
+            timeit(lambda: cat_many(games), number=1),
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    n = 1_000_000
+    print(f"Classifying {n:,} boards")
+    for name, loop, vectorized in benchmark(n):
+        print(
+            f"{name:>4}: loop {loop:.3f}s, numpy {vectorized:.3f}s "
+            f"({loop / vectorized:.0f}x)"
+        )
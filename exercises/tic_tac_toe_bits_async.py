@@ -0,0 +1,380 @@
+import asyncio
+import logging
+from asyncio import StreamReader, StreamWriter
+from dataclasses import dataclass, field
+from itertools import count
+from pathlib import Path
+from typing import Dict, List
+
+from fanout import Fanout, Outbox, SlowConsumer
+from game_log import GameLog
+from metrics import registry
+from mnk_bits import TIC_TAC_TOE
+from protocol import MAGIC, Frame, LineDecoder, sniff
+from snapshot import SNAPSHOT_PATH, load_games, save_games
+from tic_tac_toe_bits_sockets import Game, OnTimeout, Player, Rules
+
+
+@dataclass
+class StreamPlayer(Player):
+    # conn is the StreamWriter, reads go through the reader
+    reader: StreamReader | None = None
+
+    @classmethod
+    def from_streams(cls, reader: StreamReader, writer: StreamWriter):
+        return cls(writer, writer.get_extra_info("peername"), reader=reader)
+
+    async def negotiate(self) -> None:
+        data = b""
+        while (decoder := sniff(data)) is None:
+            chunk = await self.reader.read(len(MAGIC) - len(data))
+            if not chunk:
+                raise ConnectionResetError("Disconnected before saying anything.")
+            data += chunk
+
+        if not isinstance(decoder, LineDecoder):
+            self.conn.write(MAGIC)
+        self._decoder = decoder
+
+    async def read(self) -> Frame:
+        while (frame := self._decoder.next_frame()) is None:
+            data = await self.reader.read(4096)
+            if not data:
+                raise ConnectionResetError(f"{self.name} disconnected")
+            self._decoder.feed(data)
+        return frame
+
+
+@dataclass
+class StreamOutbox(Outbox):
+    # conn is the StreamWriter. The transport gets at most high_water bytes,
+    # the rest waits here where boards can still be dropped, and a task feeds
+    # it in as the client reads.
+    high_water: int = 16 * 1024
+    _drainer: asyncio.Task | None = None
+
+    def __post_init__(self):
+        self.conn.transport.set_write_buffer_limits(high=self.high_water)
+
+    def flush(self) -> bool:
+        self._write_some()
+        if self._queue and not self._draining:
+            self._drainer = asyncio.create_task(self._drain())
+        return not self._queue
+
+    @property
+    def _draining(self) -> bool:
+        return self._drainer is not None and not self._drainer.done()
+
+    def _write_some(self) -> None:
+        # Up to high_water into the transport, never waits
+        writer = self.conn
+        if writer.is_closing():
+            self.close("connection closed")
+            return
+        transport = writer.transport
+        while (
+            self._queue
+            and not self.closed
+            and transport.get_write_buffer_size() <= self.high_water
+        ):
+            data, _ = self._queue.popleft()
+            self.queued -= len(data)
+            writer.write(data)
+
+    async def _drain(self) -> None:
+        # Keeps going until the queue is empty, put only starts one of these
+        # when none is running
+        while self._queue and not self.closed:
+            try:
+                await self.conn.drain()
+            except ConnectionError as e:
+                self.close(str(e))
+                return
+            self._write_some()
+
+    async def flushed(self) -> None:
+        if self._draining:
+            await self._drainer
+        if not self.closed and not self.conn.is_closing():
+            await self.conn.drain()
+
+    def close(self, reason: str) -> None:
+        if self.closed:
+            return
+        logging.info(f"Dropping slow connection, {reason}")
+        self.closed = True
+        self._queue.clear()
+        self.queued = 0
+        # Whatever's still buffered isn't worth sending, the reader sees EOF
+        self.conn.transport.abort()
+
+
+@dataclass
+class StreamFanout(Fanout):
+    def attach(self, conn: StreamWriter, policy: SlowConsumer | None = None):
+        if conn not in self._outboxes:
+            outbox = StreamOutbox(conn, self.limit, policy or self.policy)
+            self._outboxes[conn] = outbox
+        return self._outboxes[conn]
+
+    async def drain(self, timeout: float) -> None:
+        # Last chance for everybody to get the final board
+        flushed = [outbox.flushed() for outbox in self._outboxes.values()]
+        try:
+            await asyncio.wait_for(asyncio.gather(*flushed), timeout)
+        except (TimeoutError, ConnectionError):
+            pass
+
+
+@dataclass
+class AsyncGame(Game):
+    # Writes go through a bounded outbox per connection, nobody waits on a
+    # slow reader and a slow reader can't pile up our memory
+    fanout: StreamFanout = field(default_factory=StreamFanout)
+
+    async def play(self) -> None:
+        registry.inc("games")
+        try:
+            self._seat()
+            for pn in self._seats():
+                player = self._players[pn]
+                self._prompt(pn, player)
+
+                try:
+                    with registry.time("recv"):
+                        frame = await asyncio.wait_for(player.read(), self.turn_timeout)
+                except TimeoutError:
+                    if self._timed_out(player):
+                        break
+                    continue
+                except ConnectionResetError:
+                    registry.inc("disconnects")
+                    self._forfeit(player)
+                    break
+
+                try:
+                    with registry.time("move"):
+                        self._take_turn(player, frame)
+                except Exception as e:
+                    self._invalid_move(player, e)
+                    continue
+
+                if self._resolve(pn, player):
+                    break
+        except ConnectionError as e:
+            logging.info(f"Game {self.game_id} lost a connection: {e}")
+            self._declare(None)
+
+        await self.end_game()
+
+    async def end_game(self) -> None:
+        logging.info(f"Game {self.game_id} is over")
+        self._announce_result()
+        await self.fanout.drain(timeout=1.0)
+
+        everybody = [*self._players, *self.spectators]
+        for p in everybody:
+            p.conn.close()
+        await asyncio.gather(
+            *(p.conn.wait_closed() for p in everybody), return_exceptions=True
+        )
+
+
+@dataclass
+class Lobby:
+    rules: Rules
+    players_per_game: int = 2
+    host: str = "0.0.0.0"
+    port: int = 4227
+    log: GameLog | None = None
+    turn_timeout: float | None = 60.0
+    handshake_timeout: float | None = 10.0
+    on_timeout: OnTimeout = OnTimeout.SKIP
+    max_skips: int = 2
+    # Games still going are saved here every snapshot_every seconds, and
+    # picked up again on start. Players get back in with "name /resume token".
+    snapshot_path: str | None = None
+    snapshot_every: float = 5.0
+    # Seconds a restored game waits for its players. Whoever came back wins
+    # once it's up, a game nobody came back to is dropped.
+    resume_timeout: float = 300.0
+    _waiting: asyncio.Queue = field(default_factory=asyncio.Queue)
+    _games: set = field(default_factory=set)
+    _running: Dict[int, AsyncGame] = field(default_factory=dict)
+    _watchers: List[StreamPlayer] = field(default_factory=list)
+    # Restored games waiting for their players, by each player's token
+    _suspended: Dict[str, AsyncGame] = field(default_factory=dict)
+    _ids: count = field(default_factory=count)
+    _matchmaker: asyncio.Task | None = None
+    _snapshots: asyncio.Task | None = None
+
+    async def join(self, reader: StreamReader, writer: StreamWriter) -> None:
+        player = StreamPlayer.from_streams(reader, writer)
+        registry.inc("connections")
+        try:
+            name = await asyncio.wait_for(
+                self._handshake(player), self.handshake_timeout
+            )
+        except (TimeoutError, ConnectionError) as e:
+            if isinstance(e, TimeoutError):
+                registry.inc("timeouts")
+            logging.info(f"Dropping {player.addr} before they joined: {e}")
+            writer.close()
+            return
+
+        player.introduce(name)
+        if player.spectator:
+            self.watch(player)
+            return
+        if player.resume is not None and self._reclaim(player):
+            return
+        logging.info(f"{player.name} joined the lobby from {player.addr}")
+        writer.write(
+            player.encode(
+                f"Waiting for an opponent... (your token is {player.token})\n"
+            )
+        )
+        await self._waiting.put(player)
+
+    async def _handshake(self, player: StreamPlayer) -> bytes:
+        player.conn.write(b"Welcome to Tic Tac Toe!\nWhat is your name?\n")
+        await player.conn.drain()
+        await player.negotiate()
+        _, name = await player.read()
+        return name
+
+    def _reclaim(self, player: StreamPlayer) -> bool:
+        # Back into the seat their token was for, the game starts again once
+        # everybody's back
+        game = self._suspended.pop(player.resume, None)
+        if game is None:
+            return False
+        seat = next(n for n, p in enumerate(game._players) if p.token == player.resume)
+        old = game._players[seat]
+        player.name, player.token = old.name, old.token
+        player._board, player.skips = old._board, old.skips
+        game._players[seat] = player
+        logging.info(f"{player.name} is back for game {game.game_id}")
+        player.conn.write(player.encode(f"Welcome back {player.name}!\n"))
+        if all(p.conn is not None for p in game._players):
+            self._launch(game)
+        return True
+
+    def watch(self, spectator: StreamPlayer) -> None:
+        # The newest game still going, or the next one to start
+        playing = [g for g in self._running.values() if g._winner is None]
+        if playing:
+            playing[-1].watch(spectator)
+            return
+        self._watchers.append(spectator)
+        spectator.conn.write(spectator.encode("Waiting for a game to start...\n"))
+
+    async def matchmake(self) -> None:
+        while True:
+            players = []
+            while len(players) < self.players_per_game:
+                player = await self._waiting.get()
+                # They may have given up while waiting
+                if player.conn.is_closing() or player.reader.at_eof():
+                    continue
+                players.append(player)
+
+            game = self._new_game(self.rules, _players=players, game_id=next(self._ids))
+            self._launch(game)
+
+    def _new_game(self, *args, **kwargs) -> AsyncGame:
+        return AsyncGame(
+            *args,
+            log=self.log,
+            turn_timeout=self.turn_timeout,
+            on_timeout=self.on_timeout,
+            max_skips=self.max_skips,
+            **kwargs,
+        )
+
+    def _launch(self, game: AsyncGame) -> None:
+        for spectator in self._watchers:
+            if not spectator.conn.is_closing():
+                game.watch(spectator)
+        self._watchers.clear()
+        logging.info(f"Starting game {game.game_id} with {len(game._players)} players")
+        task = asyncio.create_task(game.play())
+        self._games.add(task)
+        self._running[game.game_id] = game
+        task.add_done_callback(self._games.discard)
+        task.add_done_callback(lambda _, n=game.game_id: self._running.pop(n))
+
+    def resume(self, games: List[AsyncGame]) -> None:
+        loop = asyncio.get_running_loop()
+        for game in games:
+            for player in game._players:
+                self._suspended[player.token] = game
+            loop.call_later(self.resume_timeout, self._expire, game)
+        if games:
+            # New games mustn't reuse their ids
+            first = max(next(self._ids), *(g.game_id + 1 for g in games))
+            self._ids = count(first)
+        logging.info(f"Waiting on players for {len(games)} restored games")
+
+    def _expire(self, game: AsyncGame) -> None:
+        tokens = [token for token, g in self._suspended.items() if g is game]
+        if not tokens:
+            return  # everybody made it back
+        for token in tokens:
+            del self._suspended[token]
+        back = [p for p in game._players if p.conn is not None]
+        game._declare(game._players.index(back[0]) if len(back) == 1 else None)
+        logging.info(f"Game {game.game_id} expired, {game._winner} won")
+        registry.inc("games_expired")
+        if self.log is not None:
+            self.log.end(game.game_id, game._turns, game._winning_seat)
+            self.log.flush()
+        for player in back:
+            msg = f"Game over! {game._winner} won!\nThanks for playing!\n"
+            player.conn.write(player.encode(msg))
+            player.conn.close()
+
+    def save(self) -> int:
+        # Every game still going, and every restored one nobody's back for yet
+        games = {id(g): g for g in self._suspended.values()}
+        for game in self._running.values():
+            if game._winner is None:
+                games[id(game)] = game
+        return save_games(games.values(), self.snapshot_path, self.rules.grid)
+
+    async def snapshots(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_every)
+            with registry.time("snapshot"):
+                self.save()
+
+    async def start(self) -> asyncio.Server:
+        if self.log is not None:
+            self._ids = count(self.log.next_id())
+        if self.snapshot_path is not None:
+            if Path(self.snapshot_path).exists():
+                games = load_games(self.rules, self.snapshot_path, self._new_game)
+                self.resume(games)
+            self._snapshots = asyncio.create_task(self.snapshots())
+        server = await asyncio.start_server(self.join, self.host, self.port)
+        self._matchmaker = asyncio.create_task(self.matchmake())
+        logging.info(f"Lobby open on {self.host}:{self.port}")
+        return server
+
+    async def serve(self) -> None:
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    # nc localhost 4227 to play, as many times as you like. Answer
+    # "Larry /deltas" to only see the moves, or "Larry /watch" to watch.
+    # Games in progress survive a restart, "Larry /resume <token>" gets
+    # Larry's seat back.
+    rules = Rules(winning_conditions=TIC_TAC_TOE.lines())
+    registry.serve()
+    with GameLog() as log:
+        lobby = Lobby(rules, log=log, snapshot_path=SNAPSHOT_PATH)
+        asyncio.run(lobby.serve())
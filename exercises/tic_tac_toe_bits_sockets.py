@@ -1,13 +1,33 @@
+import json
 import logging
+import secrets
+import time
 from dataclasses import dataclass, field
 from enum import Enum
-from itertools import cycle
-from socket import AF_INET, SOCK_STREAM, socket
-from string import ascii_lowercase
-from typing import List
+from socket import AF_INET, MSG_DONTWAIT, MSG_PEEK, SOCK_STREAM, socket
+from typing import Callable, List
 
 from rich.logging import RichHandler
 
+from fanout import Fanout, SlowConsumer
+from game_log import GameLog
+from metrics import registry
+from mnk_bits import MNK, TIC_TAC_TOE
+from protocol import (
+    GAME_OVER,
+    Frame,
+    FrameDecoder,
+    LineDecoder,
+    Status,
+    decode_move,
+    encode_seat,
+    encode_state,
+    encode_text,
+    make_state,
+    negotiate,
+)
+from render import delta, render_board
+
 level = logging.DEBUG
 
 logging.basicConfig(
@@ -17,42 +37,144 @@ logging.basicConfig(
     handlers=[RichHandler(rich_tracebacks=True)],
 )
 
-BOARD_TEMPLATE = """
- {0} | {1} | {2}
------------
- {3} | {4} | {5}
------------
- {6} | {7} | {8}\n
-""".format
-
 
 class Conditions(Enum):
     WON = "won"
+    LOST = "lost"
     CAT = "cat"
 
     def __str__(self):
         return self.value
 
 
+class OnTimeout(Enum):
+    SKIP = "skip"  # they lose the turn, and the game after max_skips in a row
+    FORFEIT = "forfeit"
+
+    def __str__(self):
+        return self.value
+
+
+class Disconnected(ConnectionResetError):
+    # Whoever hung up, not necessarily the player we were waiting on
+    def __init__(self, player):
+        super().__init__(f"{player.name} disconnected")
+        self.player = player
+
+
 @dataclass
-class Rules:
-    winning_conditions: list = field(default_factory=list)
-    # XXX: We could get weird and have losing conditions maybe?
+class Deadline:
+    # A socket that gives every call what's left of one timeout, so trickling
+    # a byte at a time doesn't buy anybody any more time
+    conn: socket
+    timeout: float | None
+    _at: float | None = None
 
-    def won(self, board: int) -> bool:
+    def __post_init__(self):
+        if self.timeout is not None:
+            self._at = time.monotonic() + self.timeout
+
+    def _arm(self) -> None:
+        if self._at is None:
+            self.conn.settimeout(None)
+            return
+        remaining = self._at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("timed out")
+        self.conn.settimeout(remaining)
+
+    def recv(self, size: int) -> bytes:
+        self._arm()
+        return self.conn.recv(size)
+
+    def recv_into(self, buffer, size: int = 0) -> int:
+        self._arm()
+        return self.conn.recv_into(buffer, size)
+
+    def sendall(self, data: bytes) -> None:
+        self._arm()
+        self.conn.sendall(data)
+
+
+# Looks at one player's board, or for draws at every cell that's taken
+Predicate = Callable[[int], bool]
+
+# Boards up to this many cells get lookup tables, 2 ** 16 entries at most
+COMPILE_LIMIT = 16
+
+# What a byte in the outcome table means
+OUTCOMES = (None, Conditions.WON, Conditions.LOST)
+
+
+@dataclass
+class Rules:
+    # Empty sweeps the grid for k in a row, None is no lines at all
+    winning_conditions: list | None = field(default_factory=list)
+    grid: MNK = TIC_TAC_TOE
+    # Anything else that wins, loses or draws. They're only ever called while
+    # compiling, so they cost nothing once the game is going. Call compile()
+    # after changing any of these.
+    win: List[Predicate] = field(default_factory=list)
+    lose: List[Predicate] = field(default_factory=list)
+    draw: List[Predicate] = field(default_factory=list)
+    _outcomes: bytes | None = None
+    _draws: bytes | None = None
+
+    def __post_init__(self):
+        self.compile()
+
+    def compile(self) -> None:
+        # Every board a player could have and every way the board could be
+        # filled in, worked out once. Bigger grids check as they go.
+        self._outcomes = self._draws = None
+        if self.grid.size > COMPILE_LIMIT:
+            return
+        boards = range(1 << self.grid.size)
+        self._outcomes = bytes(map(self._outcome, boards))
+        self._draws = bytes(map(self._drawn, boards))
+
+    def _won(self, board: int) -> bool:
+        if self.winning_conditions is None:
+            return False
+        if not self.winning_conditions:
+            # Bigger boards have far too many lines to list, sweep instead
+            return self.grid.won(board)
         for pos in self.winning_conditions:
             if board & pos == pos:
                 return True
         return False
 
-    # XXX: It would be neat to be able to pass arbitrary function in that were
-    # part of the rules
+    def _outcome(self, board: int) -> int:
+        # Winning beats losing when a board manages both
+        if self._won(board) or any(won(board) for won in self.win):
+            return 1
+        if any(lost(board) for lost in self.lose):
+            return 2
+        return 0
+
+    def _drawn(self, taken: int) -> bool:
+        return taken == self.grid.full or any(drawn(taken) for drawn in self.draw)
+
+    def outcome(self, board: int) -> Conditions | None:
+        if self._outcomes is not None:
+            return OUTCOMES[self._outcomes[board]]
+        return OUTCOMES[self._outcome(board)]
+
+    def won(self, board: int) -> bool:
+        if self._outcomes is not None:
+            return self._outcomes[board] == 1
+        return self._outcome(board) == 1
+
+    def drawn(self, taken: int) -> bool:
+        if self._draws is not None:
+            return bool(self._draws[taken])
+        return self._drawn(taken)
+
     def cat(self, boards: List[int]) -> bool:
-        combined = 0
+        taken = 0
         for board in boards:
-            combined |= board
-
-        return combined == 0b111111111
+            taken |= board
+        return self.drawn(taken)
 
 
 @dataclass
@@ -61,16 +183,63 @@ class Player:
     addr: str
     name: str = "Larry"
     _board: int = 0
+    _decoder: FrameDecoder = field(default_factory=LineDecoder)
+    deltas: bool = False
+    json: bool = False
+    spectator: bool = False
+    skips: int = 0
+    # Gets them back into their seat, names needn't be unique
+    token: str = field(default_factory=lambda: secrets.token_hex(8))
+    resume: str | None = None
 
     @classmethod
     def from_socket(cls, client: tuple):
         conn, addr = client
         return cls(conn, addr)
 
-    def is_set(self, position: int) -> bool:
-        if position < 1 or position > 9:
-            raise ValueError("Must be between 1 and 9.")
-        return (self._board & (1 << (position - 1))) != 0
+    def introduce(self, line: bytes) -> None:
+        # "Larry /deltas" opts Larry into only hearing about each move,
+        # "Larry /json" into a line of JSON with the whole state every turn
+        # and "Larry /watch" makes Larry a spectator. "/resume <token>" asks
+        # for a seat back after a restart. "Larry/json" works too.
+        words = line.decode(errors="replace").replace("/", " /").split()
+        if "/resume" in words:
+            at = words.index("/resume")
+            self.resume = " ".join(words[at + 1 : at + 2]) or None
+            del words[at : at + 2]
+        options = {w for w in words if w.startswith("/")}
+        self.name = " ".join(w for w in words if w not in options) or self.name
+        self.deltas = "/deltas" in options
+        self.json = "/json" in options
+        self.spectator = "/watch" in options
+
+    @property
+    def binary(self) -> bool:
+        return not isinstance(self._decoder, LineDecoder)
+
+    @property
+    def style(self) -> str:
+        if self.binary:
+            return "binary"
+        if self.json:
+            return "json"
+        return "deltas" if self.deltas else "text"
+
+    def encode(self, msg: str) -> bytes:
+        match self.style:
+            case "binary":
+                return encode_text(msg)
+            case "json":
+                return (json.dumps({"message": msg}) + "\n").encode()
+            case _:
+                return msg.encode()
+
+    def read(self, conn: socket | Deadline | None = None) -> Frame:
+        conn = conn or self.conn
+        while (frame := self._decoder.next_frame()) is None:
+            if not self._decoder.recv_into(conn):
+                raise ConnectionResetError(f"{self.name} disconnected")
+        return frame
 
 
 @dataclass
@@ -79,15 +248,28 @@ class Game:
     min_players: int = 2
     max_players: int = 3  # XXX: Maybe for future games with more then 2 players
     _players: list = field(default_factory=list)
-    _winner: str | None = (
-        None  # XXX: We should probably use a Player & make Cat a player
-    )
+    _winner: str | None = None  # name for the announcement, or "Cat"
+    _winning_seat: int | None = None
+    _result: Conditions | None = None
+    game_id: int = 0
+    log: GameLog | None = None
+    _turns: int = 0
+    _turn: int = 0  # seat to move, which _turns can't tell after a skip
+    _last_move: tuple | None = None
+    # Nobody waits on a sendall, everybody has an outbox
+    fanout: Fanout = field(default_factory=Fanout)
+    spectators: list = field(default_factory=list)
+    host: str = "0.0.0.0"
+    port: int = 4227
+    _server: socket | None = None
+    # Seconds, None waits forever
+    turn_timeout: float | None = 60.0
+    handshake_timeout: float | None = 10.0
+    on_timeout: OnTimeout = OnTimeout.SKIP
+    max_skips: int = 2
 
     def _move(self, position: int, player_board: int) -> int:
-        if position < 1 or position > 9:
-            raise ValueError("Must be between 1 and 9.")
-
-        mask = 1 << (position - 1)
+        mask = self.rules.grid.mask(position)
 
         boards = [p._board for p in self._players]
         for board in boards:
@@ -100,101 +282,303 @@ class Game:
 
     def init(self) -> None:
         server = socket(AF_INET, SOCK_STREAM)
-        server.bind(("0.0.0.0", 4227))
+        server.bind((self.host, self.port))
         server.listen(self.max_players)
+        self._server = server
+
+        try:
+            while len(self._players) < self.max_players:
+                player = Player.from_socket(server.accept())
+                registry.inc("connections")
+                if not self._handshake(player):
+                    continue
+                if player.spectator:
+                    self.watch(player)
+                    continue
+                self._players.append(player)
+                logging.info(
+                    f"Player {len(self._players)} connected from {player.addr}"
+                )
+                if len(self._players) >= self.min_players:
+                    logging.info("Minimum number of players reached. Lets playn now.")
+                    break
 
-        while len(self._players) < self.max_players:
-            player = Player.from_socket(server.accept())
-            player.conn.sendall(b"Welcome to Tic Tac Toe!\nWhat is your name?\n")
-            player.name = player.conn.recv(1024).decode().strip()
-            self._players.append(player)
-            logging.info(f"Player {len(self._players)} connected from {player.addr}")
-            if len(self._players) >= self.min_players:
-                logging.info("Minimum number of players reached. Lets playn now.")
-                break
-
-        self.play()
-        server.close()
+            self.play()
+        finally:
+            # Nobody else gets in once the game is over, or if it blew up
+            server.close()
+            self._server = None
+
+    def _handshake(self, player) -> bool:
+        # Somebody who connects and never says anything can't hold up the
+        # lobby for longer than handshake_timeout, all of it together
+        conn = Deadline(player.conn, self.handshake_timeout)
+        try:
+            conn.sendall(b"Welcome to Tic Tac Toe!\nWhat is your name?\n")
+            player._decoder = negotiate(conn)
+            player.introduce(player.read(conn)[1])
+        except (TimeoutError, ConnectionError) as e:
+            if isinstance(e, TimeoutError):
+                registry.inc("timeouts")
+            logging.info(f"Dropping {player.addr} before they joined: {e}")
+            player.conn.close()
+            return False
+        player.conn.settimeout(None)
+        return True
 
     def play(self) -> None:
-        for pn in cycle(range(len(self._players))):
+        registry.inc("games")
+        self._seat()
+        for pn in self._seats():
             player = self._players[pn]
-            msg = f"{player.name}'s turn\nCurrent board:\n{self}"
-            logging.info(msg)
-            self.message(msg)
+            self._prompt(pn, player)
             try:
-                pos = int(player.conn.recv(1024).decode())
-                player._board = self._move(pos, player._board)
+                with registry.time("recv"):
+                    frame = self._read(player, self.turn_timeout)
+            except TimeoutError:
+                if self._timed_out(player):
+                    break
+                continue
+            except ConnectionResetError as e:
+                registry.inc("disconnects")
+                self._forfeit(getattr(e, "player", player))
+                break
+
+            try:
+                with registry.time("move"):
+                    self._take_turn(player, frame)
             except Exception as e:
-                # XXX: We could imrpove this error handling
-                msg = f"Invalid move by {player.name}: {e}"
-                self.message(msg)
-                logging.info(msg)
+                self._invalid_move(player, e)
                 continue
 
-            if resolved := self._won_or_cat(player):
-                match resolved:
-                    case Conditions.WON:
-                        logging.info(f"Player {pn} won!")
-                        self._winner = player.name
-                    case Conditions.CAT:
-                        logging.info(f"Meow the cat won!")
-                        self._winner = "Cat"
-                    case _:
-                        logging.info(f"Well, how did I get here?")
+            if self._resolve(pn, player):
                 break
 
         self.end_game()
 
+    def _seats(self):
+        # Round and round from whoever's turn it is, a restored game picks up
+        # where it left off
+        while True:
+            yield self._turn
+            self._turn = (self._turn + 1) % len(self._players)
+
+    def _read(self, player, timeout: float | None = None) -> Frame:
+        # Wait for the player's move while everybody else's output keeps
+        # moving and spectators keep arriving. The other players are watched
+        # too, so a game nobody can finish ends as soon as somebody hangs up.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        others = [p for p in self._players if p is not player]
+        while (frame := player._decoder.next_frame()) is None:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{player.name} ran out of time")
+            readers = [player.conn, *(p.conn for p in others)]
+            if self._server is not None:
+                readers.append(self._server)
+            ready = self.fanout.wait(readers, remaining)
+            if self._server in ready:
+                self._admit()
+            for other in [p for p in others if p.conn in ready]:
+                if self._hung_up(other):
+                    raise Disconnected(other)
+                # Typing ahead, it'll be read on their turn
+                others.remove(other)
+            if player.conn in ready and not player._decoder.recv_into(player.conn):
+                raise Disconnected(player)
+        return frame
+
+    @staticmethod
+    def _hung_up(player) -> bool:
+        try:
+            return not player.conn.recv(1, MSG_PEEK | MSG_DONTWAIT)
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def _timed_out(self, player) -> bool:
+        # True if that was the end of the game for them
+        registry.inc("timeouts")
+        player.skips += 1
+        if self.on_timeout == OnTimeout.FORFEIT or player.skips >= self.max_skips:
+            self.message(f"{player.name} ran out of time and forfeits\n")
+            self._forfeit(player)
+            return True
+        self.message(f"{player.name} ran out of time, skipping their turn\n")
+        logging.info(f"{player.name} skipped ({player.skips}/{self.max_skips})")
+        return False
+
+    def _admit(self) -> None:
+        # Anybody turning up once the game is going can only watch, as text
+        # since we're not going to wait around for a handshake
+        spectator = Player.from_socket(self._server.accept())
+        registry.inc("connections")
+        spectator.name = f"spectator {len(self.spectators) + 1}"
+        spectator.spectator = True
+        self.watch(spectator)
+
+    def watch(self, spectator) -> None:
+        self.spectators.append(spectator)
+        registry.inc("spectators")
+        self.fanout.attach(spectator.conn, SlowConsumer.DROP)
+        names = ", ".join(p.name for p in self._players) or "nobody yet"
+        self._write(spectator, spectator.encode(f"You're watching {names}\n"))
+
+    def _seat(self) -> None:
+        for seat, player in enumerate(self._players):
+            if player.binary:
+                self._write(player, encode_seat(seat))
+
+    def _prompt(self, pn: int, player) -> None:
+        with registry.time("render"):
+            board = str(self)
+        msg = f"{player.name}'s turn\nCurrent board:\n{board}"
+        logging.info(msg)
+        self._broadcast_board(pn, msg, f"{player.name}'s turn\n")
+
+    def _broadcast_board(
+        self, turn: int, text: str, short: str, status: Status = Status.PLAYING
+    ) -> None:
+        # Binary players get the state instead of the rendered board, JSON
+        # players get it as a line of JSON and players who asked for deltas
+        # only hear about the last move. Each variant is encoded once.
+        with registry.time("broadcast"):
+            self._send_board(turn, text, short, status)
+
+    def _send_board(
+        self, turn: int, text: str, short: str, status: Status = Status.PLAYING
+    ) -> None:
+        size = self.rules.grid.size
+        boards = [p._board for p in self._players]
+        winner = self._winning_seat if status == Status.WON else None
+        state = make_state(boards, turn, status, size, winner)
+        brief = text
+        if self._last_move is not None:
+            brief = delta(*self._last_move) + short
+        variants = {
+            "binary": lambda: encode_state(state, size) + encode_text(short),
+            "json": lambda: (state.to_json(brief) + "\n").encode(),
+            "deltas": lambda: brief.encode(),
+            "text": lambda: text.encode(),
+        }
+
+        encoded = {}
+        for player in [*self._players, *self.spectators]:
+            if player.style not in encoded:
+                encoded[player.style] = variants[player.style]()
+            # Only the latest board matters, unless all you get is the moves
+            droppable = player.style != "deltas"
+            self._write(player, encoded[player.style], droppable)
+
+    def _take_turn(self, player, frame: Frame) -> None:
+        pos = decode_move(frame)
+        player._board = self._move(pos, player._board)
+        if self.log is not None:
+            self.log.record(self.game_id, self._turns, self._players.index(player), pos)
+        self._turns += 1
+        self._last_move = (self._players.index(player), pos)
+        player.skips = 0
+
+    def _invalid_move(self, player, e: Exception) -> None:
+        # XXX: We could imrpove this error handling
+        msg = f"Invalid move by {player.name}: {e}"
+        registry.inc("invalid_moves")
+        self.message(msg)
+        logging.info(msg)
+
+    def _resolve(self, pn: int, player) -> Conditions | None:
+        if resolved := self._won_or_cat(player):
+            self._result = resolved
+            match resolved:
+                case Conditions.WON:
+                    logging.info(f"Player {pn} won!")
+                    self._declare(pn)
+                case Conditions.LOST:
+                    logging.info(f"Player {pn} lost!")
+                    self._declare(self._other(player))
+                case Conditions.CAT:
+                    logging.info(f"Meow the cat won!")
+                    self._winner = "Cat"
+                case _:
+                    logging.info(f"Well, how did I get here?")
+
+        return resolved
+
+    def _other(self, player) -> int | None:
+        # The seat left once player is out, if there's only the one
+        others = [n for n, p in enumerate(self._players) if p is not player]
+        return others[0] if len(others) == 1 else None
+
+    def _declare(self, seat: int | None) -> None:
+        self._winning_seat = seat
+        self._winner = "Nobody" if seat is None else self._players[seat].name
+
+    def _forfeit(self, player) -> None:
+        logging.info(f"{player.name} left the game")
+        self._declare(self._other(player))
+
     def _won_or_cat(self, player) -> Conditions | None:
-        if self.rules.cat([p._board for p in self._players]):
+        # Winning with the last free square is a win, not a draw
+        if resolved := self.rules.outcome(player._board):
+            return resolved
+        taken = 0
+        for p in self._players:
+            taken |= p._board
+        if self.rules.drawn(taken):
             return Conditions.CAT
-        if self.rules.won(player._board):
-            return Conditions.WON
 
         return None
 
     def __str__(self) -> str:
-        symbols = []
-        for pos in range(1, 10):
-            symbol = " "
-            for idx, player in enumerate([p for p in self._players]):
-                if player.is_set(pos):
-                    symbol = ascii_lowercase[idx]
-                    break
-            symbols.append(symbol)
+        boards = tuple(p._board for p in self._players)
+        grid = self.rules.grid
+        if grid != TIC_TAC_TOE:
+            return f"\n{grid.render(boards)}\n\n"
+
+        return render_board(boards)
 
-        return BOARD_TEMPLATE(*symbols)
+    def _write(self, player, data: bytes, droppable: bool = False) -> None:
+        self.fanout.send(player.conn, data, droppable)
 
     def message(self, msg: str) -> None:
-        for player in self._players:
-            player.conn.sendall(msg.encode())
+        with registry.time("message"):
+            for player in [*self._players, *self.spectators]:
+                self._write(player, player.encode(msg), player.spectator)
 
-    def end_game(self) -> None:
+    def _announce_result(self) -> None:
         msg = f"Game over! {self._winner} won!\n{self}\nThanks for playing!\n"
         logging.info(msg)
-        self.message(msg)
+        winner = self._winning_seat
+        if self._result == Conditions.CAT:
+            status = Status.CAT
+        else:
+            status = Status.OVER if winner is None else Status.WON
+        self._broadcast_board(
+            GAME_OVER, msg, f"Game over! {self._winner} won!\n", status
+        )
+
+        registry.inc("games_finished")
+        if self.log is not None:
+            self.log.end(self.game_id, self._turns, winner)
+            self.log.flush()
 
-        for p in self._players:
+    def end_game(self) -> None:
+        self._announce_result()
+        self.fanout.drain(timeout=1.0)
+
+        for p in [*self._players, *self.spectators]:
             p.conn.close()
 
 
 if __name__ == "__main__":
     # TODO: We should print out the rules, the board numbers, etc...
-    # nc localhost 4227 to play
-    winning_positions = [
-        # rows
-        0b111000000,
-        0b000111000,
-        0b000000111,
-        # columns
-        0b100100100,
-        0b010010010,
-        0b001001001,
-        # diagonals
-        0b100010001,
-        0b001010100,
-    ]
-    rules = Rules(winning_conditions=winning_positions)
-    game = Game(rules)
-    game.init()
+    # nc localhost 4227 to play, answer "Larry /deltas" to only see the moves
+    # or "Larry /json" to get the state as JSON
+    rules = Rules(winning_conditions=TIC_TAC_TOE.lines())
+    registry.serve()
+    with GameLog() as log:
+        game = Game(rules, log=log, game_id=log.next_id())
+        game.init()
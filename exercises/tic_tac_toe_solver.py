@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from tic_tac_toe_bits import cat, won
+
+TABLE_PATH = "./data/ttt_solver.bin"
+
+# Every reachable position fits in a base 3 index (empty, player 0, player 1)
+# so the whole table is 3**9 bytes.
+TABLE_SIZE = 3**9
+_TERNARY = [sum(3**bit for bit in range(9) if board >> bit & 1) for board in range(512)]
+
+# An entry packs the negamax score (from the point of view of the player to
+# move) in the high nibble and the best position (1-9, 0 if the game is over)
+# in the low nibble. Zero means we never reached that position.
+_SCORE_OFFSET = 8
+
+
+def index(boards: List[int]) -> int:
+    return _TERNARY[boards[0]] + 2 * _TERNARY[boards[1]]
+
+
+def to_move(boards: List[int]) -> int:
+    # Player 0 always goes first, like the __main__ loop in tic_tac_toe_bits
+    return 0 if boards[0].bit_count() == boards[1].bit_count() else 1
+
+
+def negamax(
+    boards: Tuple[int, int], seen: Dict[Tuple[int, int], Tuple[int, int]]
+) -> Tuple[int, int]:
+    if boards in seen:
+        return seen[boards]
+
+    player = to_move(boards)
+    empties = 9 - (boards[0] | boards[1]).bit_count()
+
+    if won(boards[1 - player]):
+        # Losing sooner is worse, so the score carries the squares left over
+        result = (-(empties + 1), 0)
+    elif cat(boards):
+        result = (0, 0)
+    else:
+        result = None
+        for position in range(1, 10):
+            mask = 1 << (position - 1)
+            if (boards[0] | boards[1]) & mask:
+                continue
+            child = list(boards)
+            child[player] |= mask
+            score = -negamax(tuple(child), seen)[0]
+            if result is None or score > result[0]:
+                result = (score, position)
+
+    seen[boards] = result
+    return result
+
+
+def build_table() -> bytes:
+    seen = {}
+    negamax((0, 0), seen)
+
+    table = bytearray(TABLE_SIZE)
+    for boards, (score, position) in seen.items():
+        table[index(boards)] = (score + _SCORE_OFFSET) << 4 | position
+
+    return bytes(table)
+
+
+@dataclass
+class Solver:
+    table: bytes
+
+    @classmethod
+    def build(cls):
+        return cls(build_table())
+
+    @classmethod
+    def from_file(cls, path: str = TABLE_PATH):
+        table = Path(path).read_bytes()
+        if len(table) != TABLE_SIZE:
+            raise ValueError(f"{path} is not a solver table.")
+        return cls(table)
+
+    @classmethod
+    def load_or_build(cls, path: str):
+        # No default, nothing should quietly write a table into the checkout
+        try:
+            return cls.from_file(path)
+        except FileNotFoundError:
+            solver = cls.build()
+            solver.save(path)
+            return solver
+
+    def save(self, path: str = TABLE_PATH) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(self.table)
+
+    def lookup(self, boards: List[int], player: int | None = None) -> Tuple[int, int]:
+        if player is not None and player != to_move(boards):
+            # The same position with the players swapped is in the table
+            boards = [boards[1], boards[0]]
+
+        entry = self.table[index(boards)]
+        if not entry:
+            raise ValueError("Position is not reachable.")
+
+        return (entry >> 4) - _SCORE_OFFSET, entry & 0b1111
+
+    def best_move(self, boards: List[int], player: int | None = None) -> int | None:
+        return self.lookup(boards, player)[1] or None
+
+    def score(self, boards: List[int], player: int | None = None) -> int:
+        return self.lookup(boards, player)[0]
+
+
+if __name__ == "__main__":
+    # python tic_tac_toe_solver.py to (re)build the table
+    solver = Solver.build()
+    solver.save()
+    reachable = sum(1 for entry in solver.table if entry)
+    print(f"Saved {reachable} positions to {TABLE_PATH}")
+    print(f"Best opening move: {solver.best_move([0, 0])}")
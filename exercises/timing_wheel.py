@@ -0,0 +1,70 @@
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Tuple
+
+
+@dataclass
+class TimingWheel:
+    # Cooldowns hashed into slots by the tick they end on, advancing only
+    # looks at the slots for ticks that went by since the last look, never at
+    # everybody who is cooling down. A wheel covers slots * resolution seconds,
+    # longer delays just go round more than once.
+    resolution: float = 0.1
+    slots: int = 512
+    clock: Callable[[], float] = time.monotonic
+    _wheel: List[Dict[Hashable, float]] = field(default_factory=list)
+    _deadlines: Dict[Hashable, Tuple[float, int]] = field(default_factory=dict)
+    _tick: int = 0
+
+    def __post_init__(self):
+        self._wheel = [{} for _ in range(self.slots)]
+        self._tick = self._tick_of(self.clock())
+
+    def _tick_of(self, when: float) -> int:
+        return math.floor(when / self.resolution)
+
+    def schedule(self, key: Hashable, delay: float) -> None:
+        # Scheduling again replaces whatever was there
+        self.cancel(key)
+        deadline = self.clock() + delay
+        slot = math.ceil(deadline / self.resolution) % self.slots
+        self._wheel[slot][key] = deadline
+        self._deadlines[key] = deadline, slot
+
+    def cancel(self, key: Hashable) -> None:
+        if (scheduled := self._deadlines.pop(key, None)) is not None:
+            del self._wheel[scheduled[1]][key]
+
+    def advance(self) -> List[Hashable]:
+        # Returns whatever expired since last time
+        now = self.clock()
+        tick = self._tick_of(now)
+        # After a long nap every slot is due, but only once
+        ticks = range(self._tick + 1, tick + 1)[-self.slots :]
+        self._tick = max(tick, self._tick)
+
+        expired = []
+        for due in ticks:
+            bucket = self._wheel[due % self.slots]
+            for key, deadline in list(bucket.items()):
+                if deadline <= now:
+                    del bucket[key]
+                    del self._deadlines[key]
+                    expired.append(key)
+        return expired
+
+    def active(self, key: Hashable) -> bool:
+        self.advance()
+        scheduled = self._deadlines.get(key)
+        return scheduled is not None and scheduled[0] > self.clock()
+
+    def remaining(self, key: Hashable) -> float:
+        scheduled = self._deadlines.get(key)
+        return max(scheduled[0] - self.clock(), 0.0) if scheduled else 0.0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.active(key)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
@@ -0,0 +1,236 @@
+import argparse
+import importlib
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import combinations_with_replacement
+from multiprocessing import Pool
+from random import Random
+from typing import Callable, Dict, List, Tuple
+
+import tic_tac_toe_bits as bits
+from tic_tac_toe_solver import Solver, to_move
+
+# A policy looks at the boards (seat 0 always moved first) and picks a position
+Choose = Callable[[List[int]], int]
+
+
+def free_positions(boards: List[int]) -> List[int]:
+    taken = 0
+    for board in boards:
+        taken |= board
+    return [pos for pos in range(1, 10) if not taken >> (pos - 1) & 1]
+
+
+@dataclass
+class RandomPolicy:
+    rnd: Random = field(default_factory=Random)
+
+    def choose(self, boards: List[int]) -> int:
+        return self.rnd.choice(free_positions(boards))
+
+
+@dataclass
+class GreedyPolicy:
+    # Win if we can, block if we must, otherwise the centre, a corner or whatever
+    rnd: Random = field(default_factory=Random)
+
+    def choose(self, boards: List[int]) -> int:
+        me = to_move(boards)
+        free = free_positions(boards)
+        for seat in (me, 1 - me):
+            for pos in free:
+                if bits.won(boards[seat] | 1 << (pos - 1)):
+                    return pos
+        for preferred in (5, 1, 3, 7, 9):
+            if preferred in free:
+                return preferred
+        return self.rnd.choice(free)
+
+
+@dataclass
+class PerfectPolicy:
+    # Built in memory, it only takes a few tens of milliseconds
+    solver: Solver = field(default_factory=Solver.build)
+
+    def choose(self, boards: List[int]) -> int:
+        return self.solver.best_move(boards)
+
+
+POLICIES = {"random": RandomPolicy, "greedy": GreedyPolicy, "perfect": PerfectPolicy}
+
+
+def load_policy(spec: str) -> Choose:
+    # A name from POLICIES, or module:attr for anything with a choose(boards),
+    # a class that makes one, or a plain function
+    if spec in POLICIES:
+        policy = POLICIES[spec]()
+    else:
+        module, _, attr = spec.partition(":")
+        policy = getattr(importlib.import_module(module), attr)
+        if isinstance(policy, type):
+            policy = policy()
+    return getattr(policy, "choose", policy)
+
+
+@dataclass
+class MoveTimes:
+    count: int = 0
+    total: float = 0.0
+    slowest: float = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        self.slowest = max(self.slowest, elapsed)
+
+    def merge(self, other) -> None:
+        self.count += other.count
+        self.total += other.total
+        self.slowest = max(self.slowest, other.slowest)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+def play(policies: List[Choose], times: List[MoveTimes]) -> int | None:
+    # Returns the winning seat, None for a draw. An illegal move loses.
+    boards = [0, 0]
+    for turn in range(9):
+        seat = turn % 2
+        started = time.perf_counter()
+        position = policies[seat](boards)
+        times[seat].add(time.perf_counter() - started)
+        try:
+            bits.move(boards, position, seat)
+        except (ValueError, TypeError):
+            return 1 - seat
+        if bits.won(boards[seat]):
+            return seat
+        if bits.cat(boards):
+            return None
+    return None
+
+
+# (first, second) policy specs and how many games they play
+Chunk = Tuple[str, str, int]
+
+# Each worker builds a policy once, the solver has a table to load
+_policies: Dict[str, Choose] = {}
+
+
+def _policy(spec: str) -> Choose:
+    if spec not in _policies:
+        _policies[spec] = load_policy(spec)
+    return _policies[spec]
+
+
+def play_chunk(chunk: Chunk) -> tuple:
+    first, second, games = chunk
+    a, b = _policy(first), _policy(second)
+    # Take turns going first, results are from first's point of view
+    wins = losses = draws = 0
+    times = {first: MoveTimes(), second: MoveTimes()}
+    in_order = [a, b], [times[first], times[second]]
+    swapped_order = [b, a], [times[second], times[first]]
+    for game in range(games):
+        swapped = game % 2
+        winner = play(*(swapped_order if swapped else in_order))
+        if winner is None:
+            draws += 1
+        elif (winner == 0) != bool(swapped):
+            wins += 1
+        else:
+            losses += 1
+    return first, second, wins, losses, draws, times
+
+
+@dataclass
+class Results:
+    # table[a][b] is a's (wins, losses, draws) against b
+    table: Dict[str, Dict[str, List[int]]] = field(
+        default_factory=lambda: defaultdict(lambda: defaultdict(lambda: [0, 0, 0]))
+    )
+    times: Dict[str, MoveTimes] = field(default_factory=lambda: defaultdict(MoveTimes))
+    games: int = 0
+    elapsed: float = 0.0
+
+    def _record(self, policy: str, opponent: str, *record: int) -> None:
+        row = self.table[policy][opponent]
+        for n, value in enumerate(record):
+            row[n] += value
+
+    def add(self, first, second, wins, losses, draws, times) -> None:
+        self._record(first, second, wins, losses, draws)
+        if first != second:
+            self._record(second, first, losses, wins, draws)
+        for spec, spent in times.items():
+            self.times[spec].merge(spent)
+        self.games += wins + losses + draws
+
+    def standings(self) -> List[tuple]:
+        rows = []
+        for policy, opponents in self.table.items():
+            wins, losses, draws = map(sum, zip(*opponents.values()))
+            rows.append((policy, wins, losses, draws))
+        return sorted(rows, key=lambda row: (row[1] - row[2], row[3]), reverse=True)
+
+    def report(self) -> str:
+        lines = [
+            f"{self.games:,} games in {self.elapsed:.1f}s "
+            f"({self.games / self.elapsed:,.0f} games/s)",
+            f"{'policy':>20} {'wins':>9} {'losses':>9} {'draws':>9} "
+            f"{'mean move':>10} {'slowest':>10}",
+        ]
+        for policy, wins, losses, draws in self.standings():
+            spent = self.times[policy]
+            lines.append(
+                f"{policy:>20} {wins:>9,} {losses:>9,} {draws:>9,} "
+                f"{spent.mean * 1e6:8.1f}µs {spent.slowest * 1e6:8.0f}µs"
+            )
+        lines.append("")
+        for policy, opponents in self.table.items():
+            for opponent, (wins, losses, draws) in opponents.items():
+                lines.append(
+                    f"{policy:>20} vs {opponent:<20} {wins:>9,} W {losses:>9,} L "
+                    f"{draws:>9,} D"
+                )
+        return "\n".join(lines)
+
+
+def chunks(policies: List[str], games: int, chunk_size: int):
+    # games per pairing, every pairing including each policy against itself
+    for first, second in combinations_with_replacement(policies, 2):
+        for start in range(0, games, chunk_size):
+            yield first, second, min(chunk_size, games - start)
+
+
+def run(
+    policies: List[str],
+    games: int,
+    processes: int | None = None,
+    chunk_size: int = 10_000,
+) -> Results:
+    results = Results()
+    started = time.perf_counter()
+    with Pool(processes) as pool:
+        for outcome in pool.imap_unordered(
+            play_chunk, chunks(policies, games, chunk_size)
+        ):
+            results.add(*outcome)
+    results.elapsed = time.perf_counter() - started
+    return results
+
+
+if __name__ == "__main__":
+    # python tournament.py random greedy perfect my_bot:choose --games 1000000
+    parser = argparse.ArgumentParser()
+    parser.add_argument("policies", nargs="+")
+    parser.add_argument("--games", type=int, default=100_000, help="per pairing")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    results = run(args.policies, args.games, args.processes, args.chunk_size)
+    print(results.report())
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from asyncio import StreamReader, StreamWriter
+from dataclasses import dataclass, field
+from random import Random
+from typing import Set
+
+from rich.logging import RichHandler
+
+from metrics import registry
+from snapshot import Checkpoint
+from state_machine_game import Action, Game, Message, Player, State
+from word_index import WordIndex
+
+level = logging.INFO
+
+logging.basicConfig(
+    level=level,
+    format="%(message)s",
+    datefmt="[%X]",
+    handlers=[RichHandler(rich_tracebacks=True)],
+)
+
+logger = logging.getLogger(__name__)
+# The engine logs every action at debug, far too much for a server
+logging.getLogger("state_machine_game").setLevel(logging.INFO)
+
+# Commands waiting on the engine, past this the readers stop reading
+QUEUE_SIZE = 1024
+MAX_LINE = 256
+
+HELP = "Commands: join <name>, confirm, guess <word>\n"
+
+
+@dataclass(slots=True, eq=False)
+class Client:
+    writer: StreamWriter
+    player: Player | None = None
+
+    def send(self, text: str) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(text.encode())
+
+
+@dataclass(slots=True)
+class Command:
+    client: Client
+    action: Action
+
+
+def parse(line: str, client: Client) -> Command | str:
+    # A command for the engine, or what to tell them when it isn't one
+    verb, _, rest = line.strip().partition(" ")
+    rest = rest.strip()
+    match verb.lower():
+        case "join":
+            if not rest:
+                return "join needs a name\n"
+            if client.player is not None:
+                return f"You're already {client.player.name}\n"
+            # Theirs until the engine says the name was taken
+            client.player = Player(rest)
+            return Command(client, Action(client.player, Message.REQUEST))
+        case "confirm" | "guess" if client.player is None:
+            return "join <name> first\n"
+        case "confirm":
+            return Command(client, Action(client.player, Message.CONFIRM))
+        case "guess":
+            if not rest:
+                return "guess needs a word\n"
+            guess = Action(client.player, Message.GUESS, {"word": rest.lower()})
+            return Command(client, guess)
+        case _:
+            return HELP
+
+
+@dataclass
+class WordGameServer:
+    words: WordIndex | None = None
+    answer: str | None = None
+    host: str = "0.0.0.0"
+    port: int = 4227
+    queue_size: int = QUEUE_SIZE
+    rnd: Random = field(default_factory=lambda: Random(0))
+    rounds: int = 0
+    processed: int = 0
+    game: Game | None = None
+    checkpoint: Checkpoint | None = None
+    checkpoint_every: float = 1.0  # seconds
+    _queue: asyncio.Queue | None = None
+    _engine: asyncio.Task | None = None
+    _checkpoints: asyncio.Task | None = None
+    _clients: Set[Client] = field(default_factory=set)
+
+    def new_round(self) -> None:
+        # rnd starts at Random(0) so the first answer is the one get_word picks
+        if self.words is not None and (self.rounds or self.answer is None):
+            self.answer = self.rnd.choice(self.words)
+        self.game = Game(self.answer, self.words)
+        self.rounds += 1
+        registry.inc("rounds")
+        logger.info(f"Round {self.rounds}, answer is {self.answer} 🎉")
+
+    async def handle(self, reader: StreamReader, writer: StreamWriter) -> None:
+        client = Client(writer)
+        self._clients.add(client)
+        registry.inc("connections")
+        client.send(f"Welcome to the word game!\n{HELP}")
+        try:
+            while line := await reader.readline():
+                reply = parse(line.decode(errors="replace"), client)
+                if isinstance(reply, str):
+                    client.send(reply)
+                else:
+                    # Waits here whenever the engine falls behind
+                    await self._queue.put(reply)
+                # and here whenever they aren't reading what we send back
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            # ValueError is a line longer than MAX_LINE
+            logger.info(f"Dropping {writer.get_extra_info('peername')}: {e}")
+        finally:
+            self._clients.discard(client)
+            writer.close()
+
+    async def engine(self) -> None:
+        # The only place the game state changes, one command at a time. One
+        # bad command must not take the engine down, everybody's reader would
+        # be stuck behind a full queue.
+        simulate = self._simulate()
+        while True:
+            command = await self._queue.get()
+            try:
+                state = simulate.send(command.action)
+                self.processed += 1
+                self._reply(command, state)
+                if state.winner is not None:
+                    self._finish(state)
+                    simulate = self._simulate()
+            except Exception:
+                logger.exception(f"Failed to process {command.action}")
+                client, action = command.client, command.action
+                client.send("Something went wrong, try again\n")
+                if action.message == Message.REQUEST and client.player is action.player:
+                    client.player = None  # they never joined
+                # The generator is finished once it raises, the game isn't
+                simulate = self._simulate()
+
+    def _simulate(self):
+        simulate = self.game.simulate()
+        next(simulate)
+        return simulate
+
+    async def checkpoints(self) -> None:
+        # Runs between engine steps so it always sees a whole action, and only
+        # writes what changed since last time
+        while True:
+            await asyncio.sleep(self.checkpoint_every)
+            self.checkpoint.write(self.game.state)
+
+    def _reply(self, command: Command, state: State) -> None:
+        client, action = command.client, command.action
+        player = action.player
+        if action.message == Message.REQUEST:
+            if state.players.get(player.name) is player:
+                # Everybody hears about new players
+                self.broadcast(f"{state.preformed}\n")
+                return
+            if client.player is player:
+                client.player = None
+            client.send(f"{player.name} is taken, pick another name\n")
+            return
+        if action.message == Message.GUESS and state.winner is None:
+            client.send(f"{state.preformed}, {player.tires} tries left\n")
+            return
+        client.send(f"{state.preformed}\n")
+
+    def _finish(self, state: State) -> None:
+        self.broadcast(f"{state.winner.name} won! The word was {state.answer}\n")
+        self.new_round()
+        # Everybody starts again from join
+        for client in self._clients:
+            client.player = None
+        self.broadcast(f"New round! {HELP}")
+
+    def broadcast(self, text: str) -> None:
+        data = text.encode()
+        for client in self._clients:
+            if not client.writer.is_closing():
+                client.writer.write(data)
+
+    async def start(self) -> asyncio.Server:
+        if self.game is None:
+            self.new_round()
+        self._queue = asyncio.Queue(self.queue_size)
+        self._engine = asyncio.create_task(self.engine())
+        if self.checkpoint is not None:
+            self._checkpoints = asyncio.create_task(self.checkpoints())
+        server = await asyncio.start_server(
+            self.handle, self.host, self.port, limit=MAX_LINE
+        )
+        logger.info(f"Listening on {self.host}:{self.port}")
+        return server
+
+    async def serve(self) -> None:
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    # nc localhost 4227, then join Iris, confirm and guess away
+    registry.serve()
+    server = WordGameServer(WordIndex.load_or_build(), checkpoint=Checkpoint())
+    asyncio.run(server.serve())
@@ -0,0 +1,91 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable
+
+WORDS_PATH = "/usr/share/dict/words"
+INDEX_PATH = "./data/words.idx"
+
+# Header, then count + 1 uint32 offsets, then every word back to back in order
+MAGIC = b"WRD\x01"
+HEADER = struct.Struct("<4sI")
+
+
+def build_index(words: Iterable[str], path: str = INDEX_PATH) -> int:
+    words = sorted({w for w in words if w.isalpha() and w.islower()})
+    encoded = [w.encode() for w in words]
+
+    offsets = array("I", [0])
+    for word in encoded:
+        offsets.append(offsets[-1] + len(word))
+    if offsets.itemsize != 4:
+        raise ValueError(f"Need 4 byte offsets, got {offsets.itemsize}.")
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(encoded)))
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded))
+    return len(encoded)
+
+
+class WordIndex:
+    # A sorted list of words that never gets read into memory, indexing is one
+    # seek and `in` is a binary search
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not a word index.")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or size < HEADER.size + 4 * (self._count + 1):
+            self._map.close()
+            raise ValueError(f"{path} is not a word index.")
+
+        self._start = HEADER.size + 4 * (self._count + 1)
+        self._offsets = memoryview(self._map)[HEADER.size : self._start].cast("I")
+
+    @classmethod
+    def build(cls, source: str = WORDS_PATH, path: str = INDEX_PATH):
+        with open(source) as f:
+            build_index((ln.strip() for ln in f), path)
+        return cls(path)
+
+    @classmethod
+    def load_or_build(cls, source: str = WORDS_PATH, path: str = INDEX_PATH):
+        # Rebuild whenever the dictionary is newer than our index of it
+        try:
+            stale = os.path.getmtime(path) < os.path.getmtime(source)
+        except FileNotFoundError:
+            stale = not os.path.exists(path)
+        return cls.build(source, path) if stale else cls(path)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, idx: int) -> str:
+        if not 0 <= idx < self._count:
+            raise IndexError(f"Must be between 0 and {self._count - 1}.")
+        start = self._start + self._offsets[idx]
+        end = self._start + self._offsets[idx + 1]
+        return self._map[start:end].decode()
+
+    def __contains__(self, word: str) -> bool:
+        idx = bisect_left(self, word)
+        return idx < self._count and self[idx] == word
+
+    def close(self) -> None:
+        self._offsets.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()